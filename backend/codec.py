@@ -0,0 +1,78 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Serialization
+========================================
+Fast paths for JSON encoding/decoding (orjson when installed, the standard
+library otherwise) and the on-disk dataset formats:
+
+- pretty:  indented JSON, the historical format (default)
+- compact: JSON without whitespace
+- msgpack: MessagePack (needs the msgpack package)
+
+`loads` detects the format from the content, so every format can be read
+regardless of the one configured for writing.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ("pretty", "compact", "msgpack")
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """UTF-8 JSON (compact unless `pretty`)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            # e.g. integers beyond 64 bits: the stdlib encoder handles those
+            pass
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(data) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def encode(obj: Any, fmt: str = "pretty") -> bytes:
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("The msgpack storage format needs the msgpack package")
+        return msgpack.packb(obj, use_bin_type=True)
+    return dumps(obj, pretty=fmt == "pretty")
+
+
+def loads(data: bytes) -> Any:
+    """Decode a dataset file in any of the supported formats"""
+    head = data.lstrip()[:1]
+    if head in (b"{", b"[") or not head:
+        return loads_json(data)
+    if msgpack is None:
+        raise ValueError("Not JSON, and msgpack is not installed to try it")
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through orjson when it is available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,387 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Columnar member store
+========================================
+Compact in-memory layout for the economy and levels datasets. A guild is a
+set of parallel typed arrays (one int64 column per numeric field) plus a
+uint64 array of user ids, looked up through a sorted index instead of a
+dict of strings. Non-numeric fields (e.g. the bot's `inventory: []`) are
+interned: rows with identical extra fields share one copy.
+
+ColumnarGuild is a MutableMapping user_id -> record view, so code written for
+the dict-of-dicts layout keeps working. Extra fields are stored by value:
+reassign them (`row["inventory"] = [...]`) rather than mutating in place.
+"""
+
+import copy
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, MutableMapping
+from operator import add
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import codec
+
+# Numeric fields stored as columns, in the order records are rebuilt
+MEMBER_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "economy": ("wallet", "bank"),
+    "levels": ("xp", "level", "totalXp"),
+}
+# Columns summed into the leaderboard score (same as storage.MEMBER_SCORES)
+SCORE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "economy": ("wallet", "bank"),
+    "levels": ("totalXp",),
+}
+
+ALIVE = 0x80
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+UINT64_LIMIT = 1 << 64
+
+
+def _user_key(user_id: str) -> Optional[int]:
+    """Snowflake as an integer, None for ids that would not round-trip"""
+    if user_id.isascii() and user_id.isdigit() and (user_id[0] != "0" or user_id == "0"):
+        key = int(user_id)
+        if key < UINT64_LIMIT:
+            return key
+    return None
+
+
+def _copy(value):
+    return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+
+class ColumnarGuild(MutableMapping):
+    """Members of one guild, stored column by column"""
+
+    def __init__(self, columns: Sequence[str], records: Optional[Mapping] = None):
+        if len(columns) > 7:
+            raise ValueError("At most 7 numeric columns")
+        self.columns = tuple(columns)
+        self._slot = {column: i for i, column in enumerate(self.columns)}
+        self._ids = array("Q")
+        self._cols = [array("q") for _ in self.columns]
+        # Bit i: column i present in the record; ALIVE: row not deleted
+        self._flags = array("B")
+        self._shape = array("I")
+        self._shapes: List[Dict[str, Any]] = [{}]
+        self._shape_ids: Dict[bytes, int] = {b"{}": 0}
+        # Rows whose user id is not a plain snowflake
+        self._names: Dict[int, str] = {}
+        self._odd: Dict[str, int] = {}
+        # Rows by user id: sorted index plus the rows appended since it was built
+        self._sorted = array("q")
+        self._pending: Dict[int, int] = {}
+        self._len = 0
+        self._dead = 0
+        # Bumped when rows are renumbered, so record views re-resolve
+        self.epoch = 0
+        for user_id, record in (records or {}).items():
+            self._append(user_id, record, index=False)
+        self._build_index()
+
+    # ---- encoding ----
+
+    def _intern(self, extra: Optional[Dict[str, Any]]) -> int:
+        if not extra:
+            return 0
+        key = codec.dumps(extra)
+        shape = self._shape_ids.get(key)
+        if shape is None:
+            shape = len(self._shapes)
+            self._shapes.append(copy.deepcopy(extra))
+            self._shape_ids[key] = shape
+        return shape
+
+    def _encode(self, record: Mapping) -> Tuple[List[int], int, int]:
+        values = [0] * len(self.columns)
+        flags = ALIVE
+        extra = None
+        for field, value in record.items():
+            i = self._slot.get(field)
+            if i is not None and type(value) is int and INT64_MIN <= value <= INT64_MAX:
+                values[i] = value
+                flags |= 1 << i
+            else:
+                if extra is None:
+                    extra = {}
+                extra[field] = value
+        return values, flags, self._intern(extra)
+
+    # ---- rows ----
+
+    def _row(self, user_id: str) -> int:
+        key = _user_key(user_id)
+        if key is None:
+            return self._odd.get(user_id, -1)
+        row = self._pending.get(key)
+        if row is not None:
+            return row
+        index = self._sorted
+        i = bisect_left(index, key, key=self._ids.__getitem__)
+        if i < len(index):
+            row = index[i]
+            if self._ids[row] == key and self._flags[row] & ALIVE:
+                return row
+        return -1
+
+    def _append(self, user_id: str, record: Mapping, index: bool = True):
+        values, flags, shape = self._encode(record)
+        row = len(self._flags)
+        key = _user_key(user_id)
+        self._ids.append(0 if key is None else key)
+        for column, value in zip(self._cols, values):
+            column.append(value)
+        self._flags.append(flags)
+        self._shape.append(shape)
+        if key is None:
+            self._names[row] = user_id
+            self._odd[user_id] = row
+        elif index:
+            self._pending[key] = row
+            if len(self._pending) > max(1024, len(self._sorted) >> 3):
+                self._build_index()
+        self._len += 1
+
+    def _write(self, row: int, record: Mapping):
+        values, flags, shape = self._encode(record)
+        for column, value in zip(self._cols, values):
+            column[row] = value
+        self._flags[row] = flags
+        self._shape[row] = shape
+
+    def _build_index(self):
+        flags = self._flags
+        names = self._names
+        rows = [row for row in range(len(flags)) if flags[row] & ALIVE and row not in names]
+        rows.sort(key=self._ids.__getitem__)
+        self._sorted = array("q", rows)
+        self._pending = {}
+
+    def _compact(self):
+        """Drop deleted rows (renumbers the remaining ones)"""
+        keep = [row for row in range(len(self._flags)) if self._flags[row] & ALIVE]
+        self._ids = array("Q", (self._ids[row] for row in keep))
+        self._cols = [array("q", (column[row] for row in keep)) for column in self._cols]
+        self._flags = array("B", (self._flags[row] for row in keep))
+        self._shape = array("I", (self._shape[row] for row in keep))
+        renumber = {old: new for new, old in enumerate(keep) if old in self._names}
+        self._names = {renumber[old]: name for old, name in self._names.items()}
+        self._odd = {name: row for row, name in self._names.items()}
+        self._dead = 0
+        self.epoch += 1
+        self._build_index()
+
+    def _dense(self):
+        if self._dead:
+            self._compact()
+
+    def _user_id(self, row: int) -> str:
+        name = self._names.get(row)
+        return str(self._ids[row]) if name is None else name
+
+    def _record(self, row: int, copy_extra: bool = True) -> Dict[str, Any]:
+        flags = self._flags[row]
+        record = {
+            column: self._cols[i][row] for i, column in enumerate(self.columns) if flags >> i & 1
+        }
+        for field, value in self._shapes[self._shape[row]].items():
+            record[field] = _copy(value) if copy_extra else value
+        return record
+
+    # ---- MutableMapping ----
+
+    def __getitem__(self, user_id: str) -> "MemberRow":
+        row = self._row(user_id)
+        if row < 0:
+            raise KeyError(user_id)
+        return MemberRow(self, user_id, row)
+
+    def __setitem__(self, user_id: str, record: Mapping):
+        if isinstance(record, MemberRow):
+            record = record.to_dict()
+        row = self._row(user_id)
+        if row < 0:
+            self._append(user_id, record)
+        else:
+            self._write(row, record)
+
+    def __delitem__(self, user_id: str):
+        row = self._row(user_id)
+        if row < 0:
+            raise KeyError(user_id)
+        self._flags[row] = 0
+        self._shape[row] = 0
+        # Deleted rows read as 0, so column sums stay exact
+        for column in self._cols:
+            column[row] = 0
+        key = _user_key(user_id)
+        if key is None:
+            del self._odd[user_id]
+            del self._names[row]
+        else:
+            self._pending.pop(key, None)
+        self._len -= 1
+        self._dead += 1
+        if self._dead > max(1024, self._len):
+            self._compact()
+
+    def __contains__(self, user_id) -> bool:
+        return isinstance(user_id, str) and self._row(user_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        flags = self._flags
+        for row in range(len(flags)):
+            if flags[row] & ALIVE:
+                yield self._user_id(row)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Plain dict-of-dicts copy for serialization (extra values are shared: read only)"""
+        flags = self._flags
+        return {
+            self._user_id(row): self._record(row, copy_extra=False)
+            for row in range(len(flags)) if flags[row] & ALIVE
+        }
+
+    def copy(self) -> "ColumnarGuild":
+        """Independent copy: the arrays are duplicated, interned extras shared (never mutated)"""
+        clone = ColumnarGuild.__new__(ColumnarGuild)
+        clone.__dict__.update(self.__dict__)
+        clone._ids = self._ids[:]
+        clone._cols = [column[:] for column in self._cols]
+        clone._flags = self._flags[:]
+        clone._shape = self._shape[:]
+        clone._shapes = list(self._shapes)
+        clone._shape_ids = dict(self._shape_ids)
+        clone._names = dict(self._names)
+        clone._odd = dict(self._odd)
+        clone._sorted = self._sorted[:]
+        clone._pending = dict(self._pending)
+        return clone
+
+    # ---- vectorized reads ----
+
+    def column(self, name: str) -> array:
+        """Values of one numeric column in insertion order (missing fields read as 0)"""
+        self._dense()
+        return self._cols[self._slot[name]]
+
+    def user_ids(self) -> List[str]:
+        self._dense()
+        if not self._names:
+            return list(map(str, self._ids))
+        return [self._user_id(row) for row in range(len(self._ids))]
+
+    def scores(self, columns: Sequence[str]) -> List[Tuple[str, int]]:
+        """(user_id, sum of `columns`) of every member, in insertion order"""
+        values = self.column(columns[0])
+        for name in columns[1:]:
+            values = map(add, values, self.column(name))
+        return list(zip(self.user_ids(), values))
+
+    def total(self, name: str) -> int:
+        return sum(self._cols[self._slot[name]])
+
+
+class MemberRow(MutableMapping):
+    """Live view of one member's record inside a ColumnarGuild"""
+
+    __slots__ = ("guild", "user_id", "_row", "_epoch")
+
+    def __init__(self, guild: ColumnarGuild, user_id: str, row: int):
+        self.guild = guild
+        self.user_id = user_id
+        self._row = row
+        self._epoch = guild.epoch
+
+    def _resolve(self) -> int:
+        guild = self.guild
+        row = self._row
+        if self._epoch != guild.epoch or not guild._flags[row] & ALIVE:
+            row = guild._row(self.user_id)
+            if row < 0:
+                raise KeyError(self.user_id)
+            self._row = row
+            self._epoch = guild.epoch
+        return row
+
+    def __getitem__(self, field: str):
+        row = self._resolve()
+        guild = self.guild
+        i = guild._slot.get(field)
+        if i is not None and guild._flags[row] >> i & 1:
+            return guild._cols[i][row]
+        extra = guild._shapes[guild._shape[row]]
+        if field in extra:
+            return _copy(extra[field])
+        raise KeyError(field)
+
+    def __setitem__(self, field: str, value):
+        row = self._resolve()
+        guild = self.guild
+        i = guild._slot.get(field)
+        if (
+            i is not None and type(value) is int and INT64_MIN <= value <= INT64_MAX
+            and field not in guild._shapes[guild._shape[row]]
+        ):
+            guild._cols[i][row] = value
+            guild._flags[row] |= 1 << i
+            return
+        record = self.to_dict()
+        record[field] = value
+        self.guild._write(self._resolve(), record)
+
+    def __delitem__(self, field: str):
+        record = self.to_dict()
+        del record[field]
+        self.guild._write(self._resolve(), record)
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.guild._record(self._resolve())
+
+    def __repr__(self) -> str:
+        return f"MemberRow({self.user_id!r}, {self.to_dict()!r})"
+
+
+class ColumnarDataset(MutableMapping):
+    """guild_id -> ColumnarGuild; plain guild dicts are converted on assignment"""
+
+    def __init__(self, columns: Sequence[str], data: Optional[Mapping] = None):
+        self.columns = tuple(columns)
+        self._guilds: Dict[str, Any] = {}
+        for guild_id, members in (data or {}).items():
+            self[guild_id] = members
+
+    def __getitem__(self, guild_id: str):
+        return self._guilds[guild_id]
+
+    def __setitem__(self, guild_id: str, members):
+        if isinstance(members, Mapping) and not isinstance(members, ColumnarGuild):
+            members = ColumnarGuild(self.columns, members)
+        self._guilds[guild_id] = members
+
+    def __delitem__(self, guild_id: str):
+        del self._guilds[guild_id]
+
+    def __iter__(self):
+        return iter(self._guilds)
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def __contains__(self, guild_id) -> bool:
+        return guild_id in self._guilds
+
+
+def plain(value):
+    """Dict-of-dicts form of a guild value, for serialization"""
+    return value.to_dict() if isinstance(value, ColumnarGuild) else value
@@ -0,0 +1,226 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Cooldowns
+========================================
+TTL store for command cooldowns (/work, /daily, ...), shared by every bot
+shard and dashboard worker through the API. It replaces the bot's
+cooldowns.json, which is read and rewritten whole on every use and never
+forgets a key.
+
+- acquire(key, ttl) checks and sets in one call: the cooldown starts only if
+  none is running, otherwise the time left is returned
+- expired keys are reclaimed by a timer wheel: keys are appended to the
+  bucket of their expiry (`resolution` seconds wide) and a heap orders the
+  non-empty buckets, so a sweep only visits the keys that are due
+- every change is one line appended to a journal (`cooldowns.log`); once it
+  holds `compact_ratio` times more lines than there are live keys it is
+  rewritten with the live keys only, so it follows the live set, not the
+  history (amortized O(1) per change)
+- shared=True (several processes on the same file): acquire and reset run
+  under a file lock after reading what the others appended, so the check and
+  the set stay atomic across processes; lookups read the new lines without
+  taking the lock
+- thread-safe within a process, so the server calls it from worker threads
+  (the journal writes and compactions stay off the event loop)
+"""
+
+import os
+import math
+import time
+import heapq
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import codec
+from storage import atomic_write, file_lock
+
+
+class CooldownStore:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        shared: bool = False,
+        resolution: float = 1.0,
+        compact_ratio: float = 2.0,
+        compact_min: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = Path(path) if path is not None else None
+        self.shared = shared
+        self.resolution = resolution
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        # Wall clock: expiry times are shared with other processes and restarts
+        self.clock = clock
+        self.expires: Dict[str, float] = {}
+        # Timer wheel: bucket number -> keys set to expire in it (a key reset
+        # since then is skipped by the sweep), plus a heap of bucket numbers
+        self._buckets: Dict[int, List[str]] = {}
+        self._due: List[int] = []
+        # Largest size of `expires` since it was last rebuilt
+        self._peak = 0
+        self._file = None
+        # Threads of this process; the file lock then covers the other processes
+        self._mutex = threading.RLock()
+        # Journal bytes applied and lines they hold
+        self._offset = 0
+        self._lines = 0
+        self.stats = {"acquired": 0, "rejected": 0, "lookups": 0, "resets": 0, "expired": 0, "compactions": 0}
+        if self.path is not None:
+            with self._lock():
+                self._open(repair=True)
+
+    @property
+    def lock_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".lock")
+
+    def __len__(self) -> int:
+        return len(self.expires)
+
+    def acquire(self, key: str, ttl: float) -> Tuple[bool, float]:
+        """Start the cooldown of `key` unless one is running: (acquired, seconds left)"""
+        with self._lock():
+            self._catch_up()
+            now = self.clock()
+            self.sweep(now)
+            expires = self.expires.get(key)
+            if expires is not None and expires > now:
+                self.stats["rejected"] += 1
+                return False, expires - now
+            self._change(key, round(now + ttl, 3))
+            self.stats["acquired"] += 1
+            return True, ttl
+
+    def lookup(self, keys: Iterable[str]) -> Dict[str, float]:
+        """Seconds left per key (0 when no cooldown is running)"""
+        with self._mutex:
+            self._catch_up()
+            now = self.clock()
+            self.sweep(now)
+            self.stats["lookups"] += 1
+            expires = self.expires
+            return {key: max(expires.get(key, 0) - now, 0.0) for key in keys}
+
+    def reset(self, key: str) -> bool:
+        """End the cooldown of `key`; False if none was running"""
+        with self._lock():
+            self._catch_up()
+            now = self.clock()
+            if self.expires.get(key, 0) <= now:
+                return False
+            self._change(key, 0)
+            self.stats["resets"] += 1
+            return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop the keys of every bucket that is due"""
+        now = self.clock() if now is None else now
+        expired = 0
+        with self._mutex:
+            due, buckets, expires = self._due, self._buckets, self.expires
+            self._peak = max(self._peak, len(expires))
+            while due and due[0] * self.resolution <= now:
+                for key in buckets.pop(heapq.heappop(due)):
+                    if expires.get(key, math.inf) <= now:
+                        del expires[key]
+                        expired += 1
+            if expired and len(expires) * 4 < self._peak:
+                # A dict never gives back the slots of deleted keys: rebuild it
+                self.expires = dict(expires)
+                self._peak = len(expires)
+            self.stats["expired"] += expired
+        return expired
+
+    def compact(self):
+        """Rewrite the journal with the live keys only"""
+        with self._lock():
+            self._catch_up()
+            self._compact()
+
+    def close(self):
+        with self._mutex:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _set(self, key: str, expires: float):
+        if expires <= 0:
+            self.expires.pop(key, None)
+            return
+        self.expires[key] = expires
+        number = math.ceil(expires / self.resolution)
+        bucket = self._buckets.get(number)
+        if bucket is None:
+            bucket = self._buckets[number] = []
+            heapq.heappush(self._due, number)
+        bucket.append(key)
+
+    def _change(self, key: str, expires: float):
+        self._set(key, expires)
+        if self._file is None:
+            return
+        self._file.write(codec.dumps([key, expires]) + b"\n")
+        self._file.flush()
+        self._offset = self._file.tell()
+        self._lines += 1
+        if self._lines > max(self.compact_min, self.compact_ratio * len(self.expires)):
+            self._compact()
+
+    @contextmanager
+    def _lock(self):
+        with self._mutex:
+            if self.shared and self.path is not None:
+                with file_lock(self.lock_path):
+                    yield
+            else:
+                yield
+
+    def _open(self, repair: bool = False):
+        self._file = open(self.path, "a+b")
+        self._offset = self._lines = 0
+        self._read_new()
+        if repair and self._file.seek(0, os.SEEK_END) > self._offset:
+            # Torn last line after a crash: the next append would extend it
+            self._file.truncate(self._offset)
+
+    def _read_new(self):
+        """Apply the complete lines appended since the last read"""
+        self._file.seek(self._offset)
+        chunk = self._file.read()
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return
+        now = self.clock()
+        for line in chunk[:end].splitlines():
+            try:
+                key, expires = codec.loads_json(line)
+            except ValueError:
+                continue
+            self._set(key, expires if expires > now else 0)
+        self._offset += end
+        self._lines += chunk.count(b"\n", 0, end)
+
+    def _catch_up(self):
+        if not self.shared or self._file is None:
+            return
+        if os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino:
+            # Compacted by another process: finish the old journal, then
+            # replay the new one (it holds the same live keys)
+            self._read_new()
+            self._file.close()
+            self._open()
+        else:
+            self._read_new()
+
+    def _compact(self):
+        now = self.clock()
+        self.sweep(now)
+        live = [(key, expires) for key, expires in self.expires.items() if expires > now]
+        atomic_write(self.path, b"".join(codec.dumps([key, expires]) + b"\n" for key, expires in live))
+        self._file.close()
+        self._file = open(self.path, "a+b")
+        self._offset = self._file.seek(0, os.SEEK_END)
+        self._lines = len(live)
+        self.stats["compactions"] += 1
@@ -0,0 +1,435 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Discord REST client
+========================================
+Shared httpx client for the Discord API: one keep-alive connection pool per
+worker, opened and closed by the app lifespan.
+
+Every call goes through a scheduler that follows Discord's rate limits
+(X-RateLimit-* buckets, 429 retry_after, global limit): requests that would
+exceed a bucket wait for its reset instead of failing. GETs can be cached
+with a TTL, and identical GETs issued concurrently share one upstream call.
+StaleWhileRevalidateCache keeps slower-changing data (guild metadata) served
+instantly while it is refreshed in the background.
+"""
+
+import time
+import asyncio
+import hashlib
+import logging
+import httpx
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DISCORD_API = "https://discord.com/api"
+
+# Path segments whose id Discord rate limits separately ("major parameters")
+MAJOR_PARAMETERS = ("channels", "guilds", "webhooks")
+
+
+def route_key(method: str, path: str) -> str:
+    """
+    Rate limit route of a request: the path without its query string, with
+    every id but the major parameter replaced, e.g. "GET /guilds/1/members/{id}"
+    """
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    major = 1 if parts[0] in MAJOR_PARAMETERS else None
+    return f"{method} /" + "/".join(
+        "{id}" if part.isdigit() and i != major else part for i, part in enumerate(parts)
+    )
+
+
+class DiscordAPIError(Exception):
+    def __init__(self, status_code: int, data: Any):
+        super().__init__(f"Discord API error {status_code}")
+        self.status_code = status_code
+        self.data = data if isinstance(data, dict) else {}
+
+
+class TTLCache:
+    """Bounded LRU of values that expire `ttl` seconds after being stored"""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable):
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Entries younger than `ttl` are fresh. Up to `max_stale` seconds after that
+    they are still returned immediately, while one background task reloads
+    them. Older or missing entries are loaded inline (concurrent callers
+    share the load). At most `maxsize` keys are kept (LRU).
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_stale: float = 3600.0,
+        maxsize: int = 512,
+        on_change: Optional[Callable[[Hashable], None]] = None,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.maxsize = maxsize
+        # Called with the key whenever its value is replaced or dropped
+        self.on_change = on_change
+        self.stats = {"hits": 0, "staleHits": 0, "misses": 0, "refreshes": 0, "refreshErrors": 0}
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, "asyncio.Task"] = {}
+        self._generation: Dict[Hashable, int] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            age = time.monotonic() - item[0]
+            if age < self.ttl + self.max_stale:
+                self._data.move_to_end(key)
+                if age < self.ttl:
+                    self.stats["hits"] += 1
+                else:
+                    self.stats["staleHits"] += 1
+                    self._load(key, loader)
+                return item[1]
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> "asyncio.Task":
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, loader))
+            self._loading[key] = task
+            task.add_done_callback(lambda t: self._loaded(key, t))
+        return task
+
+    async def _fetch(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation.get(key, 0)
+        value = await loader()
+        # An invalidation during the load means the value may predate it
+        if self._generation.get(key, 0) == generation:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if self.on_change is not None:
+                self.on_change(key)
+        self.stats["refreshes"] += 1
+        return value
+
+    def _loaded(self, key: Hashable, task: "asyncio.Task"):
+        if self._loading.get(key) is task:
+            del self._loading[key]
+            self._generation.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refreshErrors"] += 1
+            logger.warning("Loading %r failed: %s", key, task.exception())
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        if key in self._loading:
+            self._generation[key] = self._generation.get(key, 0) + 1
+        if self.on_change is not None:
+            self.on_change(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RateLimitBucket:
+    """
+    Remaining requests of one Discord bucket until its reset. While the limits
+    (or the reset of a new window) are unknown, requests wait for the next
+    response headers instead of all hitting a 429.
+    """
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.unlimited = False
+        self.lock = asyncio.Lock()
+        self._probing = False
+        self._updated = asyncio.Event()
+
+    async def _next_update(self):
+        await self._updated.wait()
+
+    async def acquire(self) -> float:
+        """Wait until a request may be sent; returns the seconds spent waiting"""
+        start = time.monotonic()
+        async with self.lock:
+            while not self.unlimited:
+                now = time.monotonic()
+                if self.remaining is None:
+                    # First request learns the limits, the rest wait for it
+                    if not self._probing:
+                        self._probing = True
+                        break
+                    await self._next_update()
+                elif self.remaining > 0:
+                    self.remaining -= 1
+                    break
+                elif self.reset_at == float("inf"):
+                    await self._next_update()
+                elif now < self.reset_at:
+                    await asyncio.sleep(self.reset_at - now)
+                else:
+                    # Window is over: the bucket is full again, and the next
+                    # response tells when the new window resets
+                    self.remaining = self.limit
+                    self.reset_at = float("inf")
+        return time.monotonic() - start
+
+    def update(self, headers: Optional[httpx.Headers]):
+        """Apply the headers of a response (None if the request failed)"""
+        if headers is not None:
+            if "X-RateLimit-Remaining" in headers:
+                remaining = int(headers["X-RateLimit-Remaining"])
+                now = time.monotonic()
+                reset_at = now + float(headers.get("X-RateLimit-Reset-After", 0))
+                if self.remaining is not None and now < self.reset_at:
+                    # Same window: responses arrive out of order, and requests
+                    # already let through are not counted by the header yet
+                    self.remaining = min(self.remaining, remaining)
+                    self.reset_at = min(self.reset_at, reset_at)
+                else:
+                    self.remaining = remaining
+                    self.reset_at = reset_at
+                self.limit = int(headers.get("X-RateLimit-Limit", remaining + 1))
+            elif self.remaining is None:
+                self.unlimited = True
+        elif self.reset_at == float("inf"):
+            # Failed request in a fresh window: forget the window, probe again
+            self.remaining = None
+        self._probing = False
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def block(self, retry_after: float):
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+
+    def idle(self, now: float) -> bool:
+        """Nothing waiting and the window over: a fresh bucket would behave the same"""
+        return not self.lock.locked() and not self._probing and self.reset_at <= now
+
+
+class DiscordClient:
+    def __init__(
+        self,
+        base_url: str = DISCORD_API,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        max_retries: int = 3,
+        cache_size: int = 4096,
+        max_buckets: int = 4096,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_retries = max_retries
+        self.cache = TTLCache(cache_size)
+        self.stats = {"requests": 0, "rateLimited": 0, "queuedSeconds": 0.0, "coalesced": 0}
+        # Called as observer(method, path, status, seconds) after every HTTP attempt
+        self.observer: Optional[Callable[[str, str, int, float], None]] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        # (route, identity) -> Discord bucket hash, (bucket, identity) -> state;
+        # one of each per token and guild, so both are LRUs of `max_buckets`
+        # (only buckets whose window is over are dropped)
+        self.max_buckets = max_buckets
+        self._routes: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._buckets: "OrderedDict[Tuple[str, str], RateLimitBucket]" = OrderedDict()
+        self._global_reset = 0.0
+        self._inflight: Dict[Hashable, "asyncio.Future"] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so requests outside the lifespan still work
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={"User-Agent": "DiscordBot (toothless-dashboard, 3.0.0)"},
+            )
+        return self._client
+
+    async def start(self):
+        self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def identity(authorization: str) -> str:
+        """Rate limits and cache entries are per token; never keep the token itself"""
+        return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+    def _bucket(self, route: str, identity: str) -> RateLimitBucket:
+        bucket_hash = self._routes.get((route, identity))
+        if bucket_hash is not None:
+            self._routes.move_to_end((route, identity))
+        key = (bucket_hash or route, identity)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = RateLimitBucket()
+            self._evict(key)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, keep: Tuple[str, str]):
+        """Drop the least recently used idle buckets (but `keep`) and routes beyond max_buckets"""
+        excess = len(self._buckets) - self.max_buckets
+        if excess > 0:
+            now = time.monotonic()
+            idle = [key for key, bucket in self._buckets.items() if key != keep and bucket.idle(now)]
+            for key in idle[:excess]:
+                del self._buckets[key]
+        while len(self._routes) > self.max_buckets:
+            self._routes.popitem(last=False)
+
+    async def request(self, method: str, path: str, *, authorization: str = "", **kwargs) -> httpx.Response:
+        """Send a request, queueing on rate limits and retrying 429s"""
+        route = route_key(method, path)
+        identity = self.identity(authorization) if authorization else ""
+        if authorization:
+            kwargs.setdefault("headers", {})["Authorization"] = authorization
+
+        for attempt in range(self.max_retries + 1):
+            now = time.monotonic()
+            if now < self._global_reset:
+                self.stats["queuedSeconds"] += self._global_reset - now
+                await asyncio.sleep(self._global_reset - now)
+            bucket = self._bucket(route, identity)
+            self.stats["queuedSeconds"] += await bucket.acquire()
+
+            self.stats["requests"] += 1
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except BaseException:
+                bucket.update(None)
+                if self.observer is not None:
+                    self.observer(method, path, 0, time.perf_counter() - start)
+                raise
+            if self.observer is not None:
+                self.observer(method, path, response.status_code, time.perf_counter() - start)
+
+            bucket.update(response.headers)
+            bucket_hash = response.headers.get("X-RateLimit-Bucket")
+            if bucket_hash and self._routes.get((route, identity)) != bucket_hash:
+                # Routes sharing a Discord bucket share its state from now on
+                self._routes[(route, identity)] = bucket_hash
+                bucket = self._buckets.setdefault((bucket_hash, identity), bucket)
+                self._evict((bucket_hash, identity))
+
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+            self.stats["rateLimited"] += 1
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                body = {}
+            retry_after = float(body.get("retry_after") or response.headers.get("Retry-After", 1))
+            if body.get("global") or response.headers.get("X-RateLimit-Global"):
+                self._global_reset = time.monotonic() + retry_after
+            else:
+                bucket.block(retry_after)
+        return response
+
+    async def get_json(self, path: str, authorization: str, ttl: float = 0) -> Any:
+        """
+        GET returning the decoded body. Concurrent identical calls share one
+        request; with a ttl, successful results are served from the cache.
+        """
+        key = (path, self.identity(authorization))
+        if ttl:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self.request("GET", path, authorization=authorization)
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if response.status_code != 200:
+                raise DiscordAPIError(response.status_code, data)
+            if ttl:
+                self.cache.set(key, data, ttl)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Waiters re-raise it; the creator does too, so mark it retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, path: str, authorization: str):
+        self.cache.pop((path, self.identity(authorization)))
+
+    async def exchange_code(self, data: Dict[str, Any]) -> httpx.Response:
+        """OAuth2 authorization code -> access token"""
+        return await self.request(
+            "POST",
+            "/oauth2/token",
+            data=data,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+
+    async def get_user(self, path: str, access_token: str, ttl: float = 0) -> Any:
+        """GET on behalf of the user owning `access_token`"""
+        return await self.get_json(path, f"Bearer {access_token}", ttl)
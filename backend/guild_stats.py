@@ -0,0 +1,307 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Guild statistics
+========================================
+Economy and levels aggregates of a guild, built with one scan on first use
+and then updated member by member from the storage change notifications:
+
+- member counts and running sums (exact)
+- level distribution, one counter per level (exact)
+- log-bucketed histogram of wealth and total XP (DDSketch-style), used for
+  the percentiles and the wealth Gini coefficient
+
+Accuracy: a histogram bucket spans values within a factor
+GAMMA = (1 + ALPHA) / (1 - ALPHA), so a percentile is within ALPHA (1%)
+relative error of the member value at that rank. The Gini coefficient is
+exact between buckets (each keeps the sum of its values) and only ignores
+the inequality inside a bucket, so it is never above the true value and at
+most (GAMMA - 1) / 2 ~= ALPHA below it. Negative balances count as 0 for the
+histogram (percentiles, Gini); the sums use the stored values.
+
+Reading walks the non-empty buckets: at most ~2200 for values up to 2**63,
+whatever the number of members. A columnar guild (MEMBER_STORE=columnar) is
+scanned column by column, without building a record per member.
+"""
+
+import math
+import asyncio
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from operator import add
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from columnar import ColumnarGuild
+
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(GAMMA)
+
+PERCENTILES = (50, 90, 99)
+
+ACCURACY = {
+    "percentileRelativeError": ALPHA,
+    "giniMaxUnderestimate": round((GAMMA - 1) / 2, 6),
+}
+
+
+class LogHistogram:
+    """Counts and sums of non-negative integers in geometric buckets, with deletions"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self._counts: Dict[int, int] = {}
+        self._sums: Dict[int, int] = {}
+        # Non-empty bucket keys, ascending
+        self._keys: List[int] = []
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        # Bucket i holds (GAMMA**(i-1), GAMMA**i]; -1 holds zero
+        return -1 if value <= 0 else math.ceil(math.log(value) / _LOG_GAMMA)
+
+    @staticmethod
+    def representative(key: int) -> int:
+        """Value with the smallest worst-case relative error over the bucket"""
+        return 0 if key < 0 else round(2 * GAMMA ** key / (GAMMA + 1))
+
+    def add(self, value: int, count: int = 1):
+        value = max(value, 0)
+        key = self.bucket(value)
+        remaining = self._counts.get(key, 0) + count
+        if remaining:
+            if key not in self._counts:
+                insort(self._keys, key)
+            self._counts[key] = remaining
+            self._sums[key] = self._sums.get(key, 0) + count * value
+        else:
+            del self._counts[key], self._sums[key]
+            del self._keys[bisect_left(self._keys, key)]
+        self.count += count
+        self.total += count * value
+
+    def remove(self, value: int):
+        self.add(value, -1)
+
+    def quantile(self, q: float) -> Optional[int]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in self._keys:
+            seen += self._counts[key]
+            if seen > rank:
+                return self.representative(key)
+        return self.representative(self._keys[-1])
+
+    def gini(self) -> float:
+        if not self.count or not self.total:
+            return 0.0
+        # Sum of |x_i - x_j| over pairs in different buckets, from counts and sums
+        pairs = 0
+        count_below = 0
+        sum_below = 0
+        for key in self._keys:
+            count, total = self._counts[key], self._sums[key]
+            pairs += count_below * total - count * sum_below
+            count_below += count
+            sum_below += total
+        return pairs / (self.count * self.total)
+
+    def percentiles(self) -> Dict[str, Optional[int]]:
+        return {f"p{p}": self.quantile(p / 100) for p in PERCENTILES}
+
+
+class EconomyStats:
+    def __init__(self):
+        # user_id -> (wallet, bank) as currently counted
+        self.members: Dict[str, Tuple[int, int]] = {}
+        self.wallet = 0
+        self.bank = 0
+        self.wealth = LogHistogram()
+
+    def update(self, user_id: str, record: Optional[Mapping[str, Any]]):
+        old = self.members.pop(user_id, None)
+        if old is not None:
+            self.wallet -= old[0]
+            self.bank -= old[1]
+            self.wealth.remove(old[0] + old[1])
+        if record is not None:
+            wallet, bank = record.get("wallet", 0), record.get("bank", 0)
+            self.members[user_id] = (wallet, bank)
+            self.wallet += wallet
+            self.bank += bank
+            self.wealth.add(wallet + bank)
+
+    def load_columns(self, guild: ColumnarGuild):
+        wallets, banks = guild.column("wallet"), guild.column("bank")
+        self.members = dict(zip(guild.user_ids(), zip(wallets, banks)))
+        self.wallet = guild.total("wallet")
+        self.bank = guild.total("bank")
+        for wealth, count in Counter(map(add, wallets, banks)).items():
+            self.wealth.add(wealth, count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        members = len(self.members)
+        total = self.wallet + self.bank
+        return {
+            "members": members,
+            "wallet": self.wallet,
+            "bank": self.bank,
+            "total": total,
+            "average": round(total / members, 2) if members else 0.0,
+            "gini": round(self.wealth.gini(), 4),
+            "wealthPercentiles": self.wealth.percentiles(),
+        }
+
+
+class LevelStats:
+    def __init__(self):
+        # user_id -> (level, totalXp) as currently counted
+        self.members: Dict[str, Tuple[int, int]] = {}
+        self.levels: Dict[int, int] = {}
+        self.level_sum = 0
+        self.total_xp = 0
+        self.xp = LogHistogram()
+
+    def update(self, user_id: str, record: Optional[Mapping[str, Any]]):
+        old = self.members.pop(user_id, None)
+        if old is not None:
+            level, total_xp = old
+            self.levels[level] -= 1
+            if not self.levels[level]:
+                del self.levels[level]
+            self.level_sum -= level
+            self.total_xp -= total_xp
+            self.xp.remove(total_xp)
+        if record is not None:
+            level, total_xp = record.get("level", 0), record.get("totalXp", 0)
+            self.members[user_id] = (level, total_xp)
+            self.levels[level] = self.levels.get(level, 0) + 1
+            self.level_sum += level
+            self.total_xp += total_xp
+            self.xp.add(total_xp)
+
+    def load_columns(self, guild: ColumnarGuild):
+        levels, total_xps = guild.column("level"), guild.column("totalXp")
+        self.members = dict(zip(guild.user_ids(), zip(levels, total_xps)))
+        self.levels = dict(Counter(levels))
+        self.level_sum = guild.total("level")
+        self.total_xp = guild.total("totalXp")
+        for total_xp, count in Counter(total_xps).items():
+            self.xp.add(total_xp, count)
+
+    def to_dict(self) -> Dict[str, Any]:
+        members = len(self.members)
+        return {
+            "members": members,
+            "totalXp": self.total_xp,
+            "averageXp": round(self.total_xp / members, 2) if members else 0.0,
+            "averageLevel": round(self.level_sum / members, 2) if members else 0.0,
+            "levelDistribution": [
+                {"level": level, "members": count} for level, count in sorted(self.levels.items())
+            ],
+            "xpPercentiles": self.xp.percentiles(),
+        }
+
+
+class GuildStats:
+    """
+    Aggregates of the most recently used guilds (LRU of `maxsize` per
+    dataset). Subscribe on_change to the storage engine to keep them current.
+    """
+
+    KINDS = {"economy": EconomyStats, "levels": LevelStats}
+
+    def __init__(self, storage, maxsize: int = 256):
+        self.storage = storage
+        self.maxsize = maxsize
+        self.stats = {"builds": 0, "updates": 0, "invalidations": 0}
+        self._guilds: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        # Builds running on a thread: (key, [members changed meanwhile, or
+        # None for the whole guild])
+        self._building: List[Tuple[Tuple[str, str], List[Optional[Set[str]]]]] = []
+
+    def get(self, name: str, guild_id: str):
+        key = (name, guild_id)
+        aggregate = self._guilds.get(key)
+        if aggregate is not None:
+            self._guilds.move_to_end(key)
+            return aggregate
+        members = self.storage.datasets[name].get(guild_id) if self.storage.columnar else None
+        if isinstance(members, ColumnarGuild):
+            aggregate = self.KINDS[name]()
+            aggregate.load_columns(members)
+        else:
+            aggregate = self._build(name, self.storage.member_chunks(name, guild_id, ranked=False))
+        return self._keep(key, aggregate)
+
+    async def load(self, name: str, guild_id: str):
+        """
+        Build the aggregate of a guild stored in the database on a thread
+        (get() builds the others on the spot). Members saved during the scan
+        are applied again once it is done.
+        """
+        key = (name, guild_id)
+        if key in self._guilds:
+            return
+        chunks = self.storage.stored_chunks(name, guild_id, ranked=False)
+        if chunks is None:
+            return
+        changed: List[Optional[Set[str]]] = [set()]
+        building = (key, changed)
+        self._building.append(building)
+        try:
+            aggregate = await asyncio.to_thread(self._build, name, chunks)
+        finally:
+            self._building.remove(building)
+        if changed[0] is None:
+            # Rebuilt by the next get()
+            return
+        if changed[0]:
+            members = self.storage.datasets[name].get(guild_id, {})
+            for user_id in changed[0]:
+                aggregate.update(user_id, members.get(user_id))
+        self._keep(key, aggregate)
+
+    def _build(self, name: str, chunks: Iterable[List[Tuple[str, Mapping[str, Any]]]]):
+        aggregate = self.KINDS[name]()
+        for chunk in chunks:
+            for user_id, record in chunk:
+                aggregate.update(user_id, record)
+        return aggregate
+
+    def _keep(self, key: Tuple[str, str], aggregate):
+        self.stats["builds"] += 1
+        self._guilds[key] = aggregate
+        while len(self._guilds) > self.maxsize * len(self.KINDS):
+            self._guilds.popitem(last=False)
+        return aggregate
+
+    def on_change(self, name: str, guild_id: Optional[str], user_ids: Optional[Iterable[str]]):
+        if name not in self.KINDS:
+            return
+        for key, changed in self._building:
+            if key[0] != name or guild_id not in (None, key[1]):
+                continue
+            if guild_id is None or user_ids is None or changed[0] is None:
+                changed[0] = None
+            else:
+                changed[0].update(user_ids)
+        if guild_id is None:
+            for key in [key for key in self._guilds if key[0] == name]:
+                del self._guilds[key]
+            self.stats["invalidations"] += 1
+            return
+        aggregate = self._guilds.get((name, guild_id))
+        if aggregate is None:
+            return
+        if user_ids is None:
+            # Unknown extent of the change: rebuild on next use
+            del self._guilds[(name, guild_id)]
+            self.stats["invalidations"] += 1
+            return
+        members = self.storage.datasets[name].get(guild_id, {})
+        for user_id in user_ids:
+            aggregate.update(user_id, members.get(user_id))
+        self.stats["updates"] += 1
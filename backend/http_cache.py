@@ -0,0 +1,67 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Conditional GET
+========================================
+Pre-serialized JSON responses with strong ETags. Every cached resource has a
+version built from change counters that are bumped when its data changes; an
+unchanged version reuses the stored bytes, and a matching If-None-Match is
+answered with 304 Not Modified.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi import Request, Response
+
+from codec import dumps as encode_json
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self.stats = {"hits": 0, "misses": 0, "notModified": 0}
+        self.versions: Dict[Hashable, int] = {}
+        # key -> (version, body, etag)
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, bytes, str]]" = OrderedDict()
+
+    def bump(self, resource: Hashable):
+        self.versions[resource] = self.versions.get(resource, 0) + 1
+
+    def version(self, *resources: Hashable) -> Tuple[int, ...]:
+        return tuple(self.versions.get(resource, 0) for resource in resources)
+
+    def respond(self, request: Request, key: Hashable, version: Hashable, build: Callable[[], Any]) -> Response:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.stats["misses"] += 1
+            body = encode_json(build())
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            entry = (version, body, etag)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self.stats["hits"] += 1
+        self._entries.move_to_end(key)
+
+        _, body, etag = entry
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.stats["notModified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
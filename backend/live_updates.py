@@ -0,0 +1,124 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Live updates
+========================================
+Per-guild fan-out of change events to Server-Sent Events streams. An event
+is serialized once and the same bytes are queued for every subscriber; each
+subscriber has a bounded queue, and one that falls behind has its backlog
+dropped and replaced by a single `resync` event telling it to refetch.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+_CLOSE = object()
+
+
+def sse_message(event: str, data: Any, event_id: Optional[int] = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Subscriber:
+    def __init__(self, guild_id: str, queue_size: int):
+        self.guild_id = guild_id
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def offer(self, message: Any) -> bool:
+        """Queue without blocking; False if the subscriber is lagging"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def resync(self, message: bytes):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class LiveHub:
+    def __init__(self, queue_size: int = 64, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.stats = {"published": 0, "delivered": 0, "resyncs": 0}
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._seq = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+
+    def close(self):
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.resync(_CLOSE)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def has_subscribers(self, guild_id: Optional[str] = None) -> bool:
+        if guild_id is None:
+            return bool(self._subscribers)
+        return guild_id in self._subscribers
+
+    def publish(self, guild_id: Optional[str], event: str, data: Any):
+        """Send an event to one guild's subscribers (guild_id None: everyone)"""
+        if not self.has_subscribers(guild_id):
+            return
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            # Changes applied off the event loop (e.g. by another thread)
+            self._loop.call_soon_threadsafe(self._publish, guild_id, event, data)
+        else:
+            self._publish(guild_id, event, data)
+
+    def _publish(self, guild_id: Optional[str], event: str, data: Any):
+        if guild_id is None:
+            targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+        else:
+            targets = list(self._subscribers.get(guild_id, ()))
+        if not targets:
+            return
+        self._seq += 1
+        self.stats["published"] += 1
+        message = sse_message(event, data, self._seq)
+        for subscriber in targets:
+            if subscriber.offer(message):
+                self.stats["delivered"] += 1
+            else:
+                self.stats["resyncs"] += 1
+                subscriber.resync(sse_message("resync", {"guildId": subscriber.guild_id}, self._seq))
+
+    async def stream(self, guild_id: str) -> AsyncIterator[bytes]:
+        subscriber = Subscriber(guild_id, self.queue_size)
+        self._subscribers.setdefault(guild_id, set()).add(subscriber)
+        try:
+            yield sse_message("ready", {"guildId": guild_id})
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from closing an idle stream
+                    yield b": ping\n\n"
+                    continue
+                if message is _CLOSE:
+                    return
+                yield message
+        finally:
+            subscribers = self._subscribers.get(guild_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[guild_id]
@@ -0,0 +1,128 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Metrics
+========================================
+Prometheus text-format metrics without extra dependencies: latency
+histograms fed by an ASGI middleware and by storage / Discord client hooks,
+plus gauges read from the existing stats dicts at scrape time (so cache hit
+counters cost nothing on the request path).
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set"""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels: str):
+        key = tuple(labels.items())
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += seconds
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = Histogram("toothless_http_request_duration_seconds", "API request latency by route")
+        self.storage = Histogram("toothless_storage_duration_seconds", "Storage operation time by dataset")
+        self.discord = Histogram("toothless_discord_request_duration_seconds", "Outbound Discord API call time")
+        # name -> (type, help, callback returning {labels: value})
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Dict[Labels, float]]]] = {}
+
+    def collector(self, name: str, kind: str, help: str, collect: Callable[[], Dict[Labels, float]]):
+        """Register values computed at scrape time (`kind`: counter or gauge)"""
+        self._collectors[name] = (kind, help, collect)
+
+    def observe_storage(self, operation: str, dataset: str, seconds: float):
+        self.storage.observe(seconds, operation=operation, dataset=dataset)
+
+    def observe_discord(self, method: str, path: str, status: int, seconds: float):
+        # Snowflakes would give every guild its own series
+        route = re.sub(r"\d{5,}", ":id", path.split("?", 1)[0])
+        self.discord.observe(seconds, method=method, route=route, status=str(status))
+
+    def render(self) -> str:
+        lines = self.requests.render() + self.storage.render() + self.discord.render()
+        for name, (kind, help, collect) in self._collectors.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in collect().items():
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled with the route template (not the raw path)"""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.metrics.requests.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
@@ -0,0 +1,146 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Leaderboard index
+========================================
+Order-statistic list used to serve leaderboards without sorting a guild on
+every request. Members are kept ordered by score (descending), ties in
+insertion order, exactly like the stable sort the endpoints used before.
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (-score, insertion sequence, user_id)
+Key = Tuple[int, int, str]
+
+
+class RankedList:
+    """
+    Sorted list split into buckets of ~LOAD keys, with a Fenwick tree over the
+    bucket sizes. update/remove/rank are O(log n) plus a memmove inside one
+    bucket; slice(offset, limit) is O(log n + limit).
+    """
+
+    LOAD = 512
+
+    def __init__(self, items: Iterable[Tuple[str, int]] = ()):
+        self._keys: Dict[str, Key] = {}
+        self._seq = 0
+        for user_id, score in items:
+            self._keys[user_id] = (-score, self._seq, user_id)
+            self._seq += 1
+        ordered = sorted(self._keys.values())
+        self._buckets: List[List[Key]] = [
+            ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)
+        ]
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._keys
+
+    def score(self, user_id: str) -> Optional[int]:
+        key = self._keys.get(user_id)
+        return None if key is None else -key[0]
+
+    def _rebuild(self):
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent <= len(self._buckets):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, index: int, delta: int):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index: int) -> int:
+        """Number of keys in buckets [0, index)"""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """(bucket, offset inside bucket) of the key at a global position"""
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= position:
+                index = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return index, position
+
+    def update(self, user_id: str, score: int):
+        """Insert a member or move it to its new score (keeps its tie order)"""
+        old = self._keys.get(user_id)
+        if old is not None:
+            if -old[0] == score:
+                return
+            self._discard(old)
+            key = (-score, old[1], user_id)
+        else:
+            key = (-score, self._seq, user_id)
+            self._seq += 1
+        self._keys[user_id] = key
+        if not self._buckets:
+            self._buckets.append([key])
+            self._rebuild()
+            return
+        i = bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            i -= 1
+        bucket = self._buckets[i]
+        insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[i:i + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._rebuild()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, user_id: str):
+        key = self._keys.pop(user_id, None)
+        if key is not None:
+            self._discard(key)
+
+    def _discard(self, key: Key):
+        i = bisect_left(self._maxes, key)
+        bucket = self._buckets[i]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self._buckets[i]
+            self._rebuild()
+        else:
+            self._maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """0-based position of a member, None if it is not ranked"""
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        i = bisect_left(self._maxes, key)
+        return self._prefix(i) + bisect_left(self._buckets[i], key)
+
+    def slice(self, offset: int, limit: int) -> List[str]:
+        """User ids at positions [offset, offset + limit)"""
+        if offset >= len(self._keys) or limit <= 0:
+            return []
+        i, j = self._locate(offset)
+        result: List[str] = []
+        while i < len(self._buckets) and len(result) < limit:
+            bucket = self._buckets[i]
+            result.extend(key[2] for key in bucket[j:j + limit - len(result)])
+            i, j = i + 1, 0
+        return result
@@ -5,22 +5,69 @@
 FastAPI backend per la dashboard del bot Discord Toothless
 """
 
+import io
 import os
-import json
+import csv
+import gc
 import uuid
-import httpx
+import zlib
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Request, APIRouter
+from fastapi import FastAPI, HTTPException, Request, APIRouter, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, List, Dict, Any, Iterable, Literal
 from dotenv import load_dotenv
 
+from discord_client import DiscordAPIError, DiscordClient, StaleWhileRevalidateCache
+from guild_stats import ACCURACY, GuildStats
+from cooldowns import CooldownStore
+from codec import FORMATS, FastJSONResponse, dumps as codec_dumps
+from http_cache import ResponseCache
+from live_updates import LiveHub
+from metrics import Metrics, MetricsMiddleware
+from snapshots import SnapshotManager, load_snapshot
+from storage import DATASETS, BackgroundWriter, ChangeFeed, DatasetReloader, JsonEngine, SqliteEngine, create_engine
+
+try:
+    from watchfiles import awatch
+except ImportError:  # fall back to stat polling
+    awatch = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-app = FastAPI(title="Toothless Dashboard API", version="3.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await discord.start()
+    live.start()
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_bot_data(stop)) if reloader is not None else None
+    snapshotter = asyncio.create_task(snapshots.run(SNAPSHOT_INTERVAL, stop)) if SNAPSHOT_INTERVAL > 0 else None
+    yield
+    live.close()
+    stop.set()
+    if watcher is not None:
+        await watcher
+    if snapshotter is not None:
+        await snapshotter
+    await discord.close()
+    # Flush pending writes before the worker exits
+    await asyncio.to_thread(storage.close)
+    cooldowns.close()
+
+
+app = FastAPI(
+    title="Toothless Dashboard API",
+    version="3.0.0",
+    lifespan=lifespan,
+    # orjson-backed when installed
+    default_response_class=FastJSONResponse
+)
 api_router = APIRouter(prefix="/api")
 
 # CORS
@@ -32,37 +79,157 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics on /api/metrics (METRICS_ENABLED=0 removes the endpoint
+# and every timer)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+metrics = Metrics() if METRICS_ENABLED else None
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Configurazione Discord
 CLIENT_ID = os.environ.get("CLIENT_ID", "")
 CLIENT_SECRET = os.environ.get("CLIENT_SECRET", "")
 TOKEN = os.environ.get("TOKEN", "")
 DASHBOARD_URL = os.environ.get("DASHBOARD_URL", "")
 
-# Data storage (JSON files)
-DATA_PATH = ROOT_DIR / "data"
-DATA_PATH.mkdir(exist_ok=True)
+# Shared Discord REST client (keep-alive pool, opened by the lifespan)
+discord = DiscordClient(
+    base_url=os.environ.get("DISCORD_API_URL", "https://discord.com/api"),
+    timeout=float(os.environ.get("DISCORD_TIMEOUT", "10")),
+    max_connections=int(os.environ.get("DISCORD_MAX_CONNECTIONS", "100")),
+    max_keepalive=int(os.environ.get("DISCORD_MAX_KEEPALIVE", "20")),
+    # Rate limit buckets kept per worker (one per token and guild route)
+    max_buckets=int(os.environ.get("DISCORD_MAX_BUCKETS", "4096"))
+)
+# Seconds a user's /users/@me and /users/@me/guilds stay cached per token
+DISCORD_CACHE_TTL = float(os.environ.get("DISCORD_CACHE_TTL", "60"))
 
-# Load/Save JSON helpers
-def load_json(filename: str, default=None):
-    filepath = DATA_PATH / filename
-    if filepath.exists():
-        try:
-            return json.loads(filepath.read_text())
-        except:
-            pass
-    return default if default is not None else {}
+# Data storage (JSON files; DATA_PATH overrides the folder, e.g. for benchmarks)
+DATA_PATH = Path(os.environ.get("DATA_PATH", ROOT_DIR / "data"))
+DATA_PATH.mkdir(parents=True, exist_ok=True)
 
-def save_json(filename: str, data):
-    filepath = DATA_PATH / filename
-    filepath.write_text(json.dumps(data, indent=2))
+# Storage engine: "json" rewrites a dataset file on every save, "log" appends
+# per-guild change records and compacts them in the background, "sqlite" keeps
+# everything in an indexed database (migrate with `python storage.py migrate-sqlite`),
+# "sharded" keeps one file per guild and dataset, read on first access
+# (migrate with `python storage.py migrate-sharded`)
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "json")
+LOG_COMPACT_BYTES = int(os.environ.get("LOG_COMPACT_BYTES", str(1 << 20)))
+# Saves are written by a background thread at most this many seconds later
+# (set PERSIST_MAX_STALENESS=-1 to write synchronously inside the request)
+PERSIST_MAX_STALENESS = float(os.environ.get("PERSIST_MAX_STALENESS", "0.5"))
+# On-disk format of the json/log/sharded engine files: "pretty" (indented JSON, the
+# default), "compact" or "msgpack"; any of them is recognised when loading
+STORAGE_FORMAT = os.environ.get("STORAGE_FORMAT", "pretty")
+if STORAGE_FORMAT not in FORMATS:
+    raise ValueError(f"Unknown STORAGE_FORMAT '{STORAGE_FORMAT}' (available: {', '.join(FORMATS)})")
+# In-memory layout of economy/levels for the json/log/sharded engines: "dict" (one
+# dict per member) or "columnar" (typed arrays, several times smaller)
+MEMBER_STORE = os.environ.get("MEMBER_STORE", "dict")
+# Guilds per dataset kept in memory by the lazily loading engines (sqlite, sharded)
+CACHE_GUILDS = int(os.environ.get("CACHE_GUILDS", "256"))
+
+# Economy and levels are written by the bot: point BOT_DATA_PATH at its data
+# folder to read them from there (json engine only)
+BOT_DATA_PATH = os.environ.get("BOT_DATA_PATH", "")
+# Seconds between checks of the bot-written files (0 disables hot reload);
+# with watchfiles installed, inotify events trigger the check instead
+RELOAD_INTERVAL = float(os.environ.get("RELOAD_INTERVAL", "2"))
+# Several workers on the same data (uvicorn --workers N, one per core): json
+# saves merge into the files under a lock, sqlite records every write in a
+# change table, and each worker applies the others' changes every
+# RELOAD_INTERVAL seconds (json and sqlite engines only)
+STORAGE_SHARED = os.environ.get("STORAGE_SHARED", "0") == "1"
+if STORAGE_SHARED and STORAGE_ENGINE not in ("json", "sqlite"):
+    raise ValueError("STORAGE_SHARED needs the json or sqlite storage engine")
+
+storage_options = {"compact_bytes": LOG_COMPACT_BYTES} if STORAGE_ENGINE == "log" else {}
+if STORAGE_ENGINE in ("json", "log", "sharded"):
+    storage_options["file_format"] = STORAGE_FORMAT
+    storage_options["columnar"] = MEMBER_STORE == "columnar"
+if STORAGE_ENGINE in ("sqlite", "sharded"):
+    storage_options["cache_guilds"] = CACHE_GUILDS
+if STORAGE_SHARED:
+    storage_options["shared"] = True
+if STORAGE_ENGINE == "json" and BOT_DATA_PATH:
+    storage_options["paths"] = {name: Path(BOT_DATA_PATH) / f"{name}.json" for name in ("economy", "levels")}
+if PERSIST_MAX_STALENESS >= 0:
+    storage_options["writer"] = BackgroundWriter(max_staleness=PERSIST_MAX_STALENESS)
+storage = create_engine(STORAGE_ENGINE, DATA_PATH, **storage_options)
+if metrics is not None:
+    storage.observer = metrics.observe_storage
+    discord.observer = metrics.observe_discord
+
+
+def flush_storage():
+    """Write all pending saves now (flush-now hook for tests)"""
+    storage.flush()
+
+
+# Start from a snapshot zip instead of the data files: its datasets replace
+# the stored ones (json/log take them as is, without reading their files) and
+# are persisted, so unset it once the server is up
+SNAPSHOT_RESTORE = os.environ.get("SNAPSHOT_RESTORE", "")
+if SNAPSHOT_RESTORE and STORAGE_SHARED:
+    raise ValueError("SNAPSHOT_RESTORE needs a single worker (STORAGE_SHARED=0)")
+restored = load_snapshot(Path(SNAPSHOT_RESTORE)) if SNAPSHOT_RESTORE else {}
+
+def load_dataset(name: str):
+    if name in restored:
+        return storage.restore(name, restored.pop(name))
+    return storage.load(name)
 
 # Initialize data
-welcome_data = load_json("welcome.json")
-log_data = load_json("log.json")
-tickets_data = load_json("tickets.json")
-level_settings_data = load_json("levelSettings.json")
-economy_data = load_json("economy.json")
-levels_data = load_json("levels.json")
+welcome_data = load_dataset("welcome")
+log_data = load_dataset("log")
+tickets_data = load_dataset("tickets")
+level_settings_data = load_dataset("levelSettings")
+economy_data = load_dataset("economy")
+levels_data = load_dataset("levels")
+# The loaded datasets live as long as the worker: out of the collector's
+# tracked generations, so a full collection no longer walks every member
+gc.freeze()
+
+# Pre-serialized GET responses with ETags; a resource's version is bumped
+# whenever the data behind it changes
+response_cache = ResponseCache(maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", "2048")))
+
+def bump_response_versions(name: str, guild_id: Optional[str], user_ids):
+    response_cache.bump(name if guild_id is None else (name, guild_id))
+
+storage.subscribe(bump_response_versions)
+
+def dataset_version(name: str, guild_id: str):
+    return response_cache.version(name, (name, guild_id))
+
+# Hot reload of the bot-written datasets (and, in shared mode, of whatever the
+# other workers wrote)
+reloader = None
+if isinstance(storage, SqliteEngine) and STORAGE_SHARED and RELOAD_INTERVAL > 0:
+    reloader = ChangeFeed(storage)
+elif isinstance(storage, JsonEngine) and RELOAD_INTERVAL > 0:
+    reloader = DatasetReloader(storage, DATASETS if STORAGE_SHARED else ("economy", "levels"))
+
+async def reload_bot_data():
+    """Read changes off the event loop, apply them on it"""
+    global economy_data, levels_data
+    changed = await asyncio.to_thread(reloader.poll)
+    if changed:
+        reloader.apply(changed)
+        economy_data = storage.datasets["economy"]
+        levels_data = storage.datasets["levels"]
+
+async def watch_bot_data(stop: asyncio.Event):
+    if awatch is not None and isinstance(reloader, DatasetReloader):
+        folders = {str(storage.path(name).parent) for name in reloader.names}
+        async for _ in awatch(*folders, debounce=int(RELOAD_INTERVAL * 1000), stop_event=stop):
+            await reload_bot_data()
+        return
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), RELOAD_INTERVAL)
+        except asyncio.TimeoutError:
+            await reload_bot_data()
 
 # Pydantic models
 class WelcomerSettings(BaseModel):
@@ -94,6 +261,19 @@ class LevelSettings(BaseModel):
 async def health_check():
     return {"status": "healthy", "service": "toothless-dashboard", "version": "3.0.0"}
 
+# Hot reload statistics of the bot-written (or other workers') datasets
+@api_router.get("/storage/reloads")
+async def get_reload_stats():
+    if reloader is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "interval": RELOAD_INTERVAL,
+        "shared": STORAGE_SHARED,
+        "inotify": awatch is not None and isinstance(reloader, DatasetReloader),
+        **reloader.stats()
+    }
+
 # Discord OAuth2
 @api_router.get("/auth/discord")
 async def get_discord_auth_url(request: Request):
@@ -118,62 +298,52 @@ async def auth_callback(request: Request):
     frontend_url = DASHBOARD_URL or str(request.base_url).rstrip('/')
     redirect_uri = f"{frontend_url}/callback"
     
-    async with httpx.AsyncClient() as client:
-        # Exchange code for token
-        token_response = await client.post(
-            "https://discord.com/api/oauth2/token",
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": redirect_uri
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        
-        if token_response.status_code != 200:
-            error_data = token_response.json()
-            raise HTTPException(status_code=400, detail=error_data.get("error_description", "Token exchange failed"))
-        
-        token_data = token_response.json()
-        access_token = token_data.get("access_token")
-        
-        # Get user info
-        user_response = await client.get(
-            "https://discord.com/api/users/@me",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        user = user_response.json()
-        
-        # Get user guilds
-        guilds_response = await client.get(
-            "https://discord.com/api/users/@me/guilds",
-            headers={"Authorization": f"Bearer {access_token}"}
+    # Exchange code for token
+    token_response = await discord.exchange_code({
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": redirect_uri
+    })
+
+    if token_response.status_code != 200:
+        error_data = token_response.json()
+        raise HTTPException(status_code=400, detail=error_data.get("error_description", "Token exchange failed"))
+
+    token_data = token_response.json()
+    access_token = token_data.get("access_token")
+
+    # User info and guilds are independent: fetch them concurrently
+    try:
+        user, guilds = await asyncio.gather(
+            discord.get_user("/users/@me", access_token, ttl=DISCORD_CACHE_TTL),
+            discord.get_user("/users/@me/guilds", access_token, ttl=DISCORD_CACHE_TTL)
         )
-        guilds = guilds_response.json()
-        
-        # Filter admin guilds (permission 0x8 = Administrator)
-        admin_guilds = [g for g in guilds if (int(g.get("permissions", 0)) & 0x8) == 0x8]
-        
-        return {
-            "user": {
-                "id": user.get("id"),
-                "username": user.get("username"),
-                "discriminator": user.get("discriminator"),
-                "avatar": user.get("avatar")
-            },
-            "guilds": [
-                {
-                    "id": g.get("id"),
-                    "name": g.get("name"),
-                    "icon": g.get("icon"),
-                    "hasBot": True  # In demo mode, show all
-                }
-                for g in admin_guilds
-            ],
-            "accessToken": access_token
-        }
+    except DiscordAPIError as e:
+        raise HTTPException(status_code=502, detail=e.data.get("message", "Discord API request failed"))
+
+    # Filter admin guilds (permission 0x8 = Administrator)
+    admin_guilds = [g for g in guilds if (int(g.get("permissions", 0)) & 0x8) == 0x8]
+    
+    return {
+        "user": {
+            "id": user.get("id"),
+            "username": user.get("username"),
+            "discriminator": user.get("discriminator"),
+            "avatar": user.get("avatar")
+        },
+        "guilds": [
+            {
+                "id": g.get("id"),
+                "name": g.get("name"),
+                "icon": g.get("icon"),
+                "hasBot": True  # In demo mode, show all
+            }
+            for g in admin_guilds
+        ],
+        "accessToken": access_token
+    }
 
 # Command categories with exact counts
 COMMAND_CATEGORIES = {
@@ -193,8 +363,8 @@ def get_total_commands():
 
 # Bot info
 @api_router.get("/bot/info")
-async def get_bot_info():
-    return {
+async def get_bot_info(request: Request):
+    return response_cache.respond(request, "bot/info", 0, lambda: {
         "name": "Toothless",
         "avatar": None,
         "guilds": 10,
@@ -202,15 +372,15 @@ async def get_bot_info():
         "commands": get_total_commands(),
         "commandCategories": COMMAND_CATEGORIES,
         "uptime": 86400000  # 24h in ms
-    }
+    })
 
 # Get command categories
 @api_router.get("/bot/commands")
-async def get_bot_commands():
-    return {
+async def get_bot_commands(request: Request):
+    return response_cache.respond(request, "bot/commands", 0, lambda: {
         "total": get_total_commands(),
         "categories": COMMAND_CATEGORIES
-    }
+    })
 
 # Bot invite URL
 @api_router.get("/bot/invite")
@@ -219,100 +389,599 @@ async def get_invite_url():
     url = f"https://discord.com/api/oauth2/authorize?client_id={CLIENT_ID}&permissions={permissions}&scope=bot%20applications.commands"
     return {"url": url}
 
-# Guild info - Get guild data
-@api_router.get("/guild/{guild_id}")
-async def get_guild(guild_id: str):
+# Guild metadata (channels, roles, categories) from Discord, served from a
+# stale-while-revalidate cache so page views never wait on the REST API
+guild_cache = StaleWhileRevalidateCache(
+    ttl=float(os.environ.get("GUILD_CACHE_TTL", "60")),
+    max_stale=float(os.environ.get("GUILD_CACHE_MAX_STALE", "3600")),
+    maxsize=int(os.environ.get("GUILD_CACHE_SIZE", "512")),
+    on_change=lambda guild_id: response_cache.bump(("guildMeta", guild_id))
+)
+
+# Demo metadata when no bot token is configured
+DEMO_GUILD = {
+    "name": "Server Demo",
+    "icon": None,
+    "memberCount": 150,
+    "channels": [
+        {"id": "1", "name": "generale"},
+        {"id": "2", "name": "benvenuto"},
+        {"id": "3", "name": "annunci"},
+        {"id": "4", "name": "moderazione-log"},
+        {"id": "5", "name": "ticket-support"}
+    ],
+    "roles": [
+        {"id": "r1", "name": "Admin", "color": "#ED4245"},
+        {"id": "r2", "name": "Moderatore", "color": "#FEE75C"},
+        {"id": "r3", "name": "VIP", "color": "#9B59B6"},
+        {"id": "r4", "name": "Membro", "color": "#57F287"},
+        {"id": "r5", "name": "Support Team", "color": "#3498DB"}
+    ],
+    "categories": [
+        {"id": "c1", "name": "GENERALE"},
+        {"id": "c2", "name": "TICKET"},
+        {"id": "c3", "name": "ADMIN"}
+    ]
+}
+
+# Discord channel types
+TEXT_CHANNEL_TYPES = (0, 5)  # text, announcement
+CATEGORY_CHANNEL_TYPE = 4
+
+async def fetch_guild_metadata(guild_id: str) -> Dict[str, Any]:
+    """Channels, roles and categories of a guild via the bot token"""
+    auth = f"Bot {TOKEN}"
+    try:
+        guild, channels = await asyncio.gather(
+            discord.get_json(f"/guilds/{guild_id}?with_counts=true", auth),
+            discord.get_json(f"/guilds/{guild_id}/channels", auth)
+        )
+    except DiscordAPIError as e:
+        if e.status_code in (403, 404):
+            raise HTTPException(status_code=404, detail="Guild not found or bot not in guild")
+        raise HTTPException(status_code=502, detail=e.data.get("message", "Discord API request failed"))
+
+    channels = sorted(channels, key=lambda c: c.get("position", 0))
+    roles = sorted(
+        (r for r in guild.get("roles", []) if r.get("id") != guild_id),  # skip @everyone
+        key=lambda r: r.get("position", 0),
+        reverse=True
+    )
     return {
-        "id": guild_id,
-        "name": "Server Demo",
-        "icon": None,
-        "memberCount": 150,
+        "name": guild.get("name"),
+        "icon": guild.get("icon"),
+        "memberCount": guild.get("approximate_member_count", 0),
         "channels": [
-            {"id": "1", "name": "generale"},
-            {"id": "2", "name": "benvenuto"},
-            {"id": "3", "name": "annunci"},
-            {"id": "4", "name": "moderazione-log"},
-            {"id": "5", "name": "ticket-support"}
+            {"id": c["id"], "name": c.get("name")} for c in channels if c.get("type") in TEXT_CHANNEL_TYPES
         ],
         "roles": [
-            {"id": "r1", "name": "Admin", "color": "#ED4245"},
-            {"id": "r2", "name": "Moderatore", "color": "#FEE75C"},
-            {"id": "r3", "name": "VIP", "color": "#9B59B6"},
-            {"id": "r4", "name": "Membro", "color": "#57F287"},
-            {"id": "r5", "name": "Support Team", "color": "#3498DB"}
+            {"id": r["id"], "name": r.get("name"), "color": f"#{r.get('color', 0):06X}"} for r in roles
         ],
         "categories": [
-            {"id": "c1", "name": "GENERALE"},
-            {"id": "c2", "name": "TICKET"},
-            {"id": "c3", "name": "ADMIN"}
-        ],
+            {"id": c["id"], "name": c.get("name")} for c in channels if c.get("type") == CATEGORY_CHANNEL_TYPE
+        ]
+    }
+
+# Guild info - Get guild data
+@api_router.get("/guild/{guild_id}")
+async def get_guild(guild_id: str, request: Request):
+    if TOKEN:
+        metadata = await guild_cache.get(guild_id, lambda: fetch_guild_metadata(guild_id))
+    else:
+        metadata = DEMO_GUILD
+    version = (
+        response_cache.version(("guildMeta", guild_id)),
+        *(dataset_version(name, guild_id) for name in ("welcome", "log", "tickets", "levelSettings"))
+    )
+    return response_cache.respond(request, ("guild", guild_id), version, lambda: {
+        "id": guild_id,
+        **metadata,
         "settings": {
             "welcome": welcome_data.get(guild_id),
             "log": log_data.get(guild_id),
             "tickets": tickets_data.get(guild_id),
             "levels": level_settings_data.get(guild_id)
         }
-    }
+    })
+
+# Drop cached guild metadata (e.g. after channels or roles changed)
+@api_router.delete("/guild/{guild_id}/cache")
+async def invalidate_guild_cache(guild_id: str):
+    guild_cache.invalidate(guild_id)
+    return {"success": True}
 
 # Welcomer settings
 @api_router.post("/guild/{guild_id}/welcomer")
 async def update_welcomer(guild_id: str, settings: WelcomerSettings):
     welcome_data[guild_id] = settings.dict()
-    save_json("welcome.json", welcome_data)
+    storage.save("welcome", guild_id)
     return {"success": True, "data": welcome_data[guild_id]}
 
 # Log settings
 @api_router.post("/guild/{guild_id}/log")
 async def update_log(guild_id: str, settings: LogSettings):
     log_data[guild_id] = settings.dict()
-    save_json("log.json", log_data)
+    storage.save("log", guild_id)
     return {"success": True, "data": log_data[guild_id]}
 
 # Ticket settings
 @api_router.post("/guild/{guild_id}/tickets")
 async def update_tickets(guild_id: str, settings: TicketSettings):
     tickets_data[guild_id] = settings.dict()
-    save_json("tickets.json", tickets_data)
+    storage.save("tickets", guild_id)
     return {"success": True, "data": tickets_data[guild_id]}
 
 # Level settings
 @api_router.post("/guild/{guild_id}/levels")
 async def update_levels(guild_id: str, settings: LevelSettings):
     level_settings_data[guild_id] = settings.dict()
-    save_json("levelSettings.json", level_settings_data)
+    storage.save("levelSettings", guild_id)
     return {"success": True, "data": level_settings_data[guild_id]}
 
+# Bulk settings update: every item is validated first, then all of them are
+# applied and each touched dataset is persisted once
+SETTINGS_SECTIONS = {
+    "welcomer": (WelcomerSettings, "welcome"),
+    "log": (LogSettings, "log"),
+    "tickets": (TicketSettings, "tickets"),
+    "levels": (LevelSettings, "levelSettings"),
+}
+SETTINGS_BATCH_MAX = int(os.environ.get("SETTINGS_BATCH_MAX", "1000"))
+
+class SettingsBatchItem(BaseModel):
+    guild_id: str
+    section: Literal["welcomer", "log", "tickets", "levels"]
+    settings: Dict[str, Any]
+
+class SettingsBatch(BaseModel):
+    items: List[SettingsBatchItem]
+
+@api_router.post("/guilds/settings/batch")
+async def update_settings_batch(batch: SettingsBatch):
+    if len(batch.items) > SETTINGS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {SETTINGS_BATCH_MAX} items per batch")
+
+    results = []
+    validated = []
+    for index, item in enumerate(batch.items):
+        model, name = SETTINGS_SECTIONS[item.section]
+        result = {"index": index, "guildId": item.guild_id, "section": item.section}
+        try:
+            settings = model(**item.settings)
+        except ValidationError as e:
+            results.append({**result, "success": False, "errors": e.errors(include_url=False)})
+            continue
+        results.append({**result, "success": True, "data": settings.dict()})
+        validated.append((name, item.guild_id, result["index"]))
+    if len(validated) < len(batch.items):
+        # All or nothing: one invalid item rejects the whole batch
+        for result in results:
+            if result["success"]:
+                result.pop("data")
+                result["success"] = False
+                result["skipped"] = True
+        raise HTTPException(status_code=422, detail={"success": False, "results": results})
+
+    touched: Dict[str, List[str]] = {}
+    for name, guild_id, index in validated:
+        storage.datasets[name][guild_id] = results[index]["data"]
+        touched.setdefault(name, []).append(guild_id)
+    for name, guild_ids in touched.items():
+        storage.save_many(name, guild_ids)
+    return {
+        "success": True,
+        "results": results,
+        "saved": {name: len(set(guild_ids)) for name, guild_ids in touched.items()}
+    }
+
+# Batched XP / economy events: what the bot does per message (getLevels +
+# setLevels, one full levels.json rewrite each), applied many at a time with
+# one save per touched guild. The deltas are applied to the stored members
+# (storage.update_members), so workers sharing the data add up their events.
+INGEST_BATCH_MAX = int(os.environ.get("INGEST_BATCH_MAX", "10000"))
+
+class IngestEvent(BaseModel):
+    guild_id: str
+    user_id: str
+    xp_delta: int = Field(0, ge=0)
+    wallet_delta: int = 0
+    bank_delta: int = 0
+
+class IngestBatch(BaseModel):
+    events: List[IngestEvent]
+
+def xp_needed(level: int) -> int:
+    # Same formula as bot/events/messageCreate.js
+    return 100 * (level + 1)
+
+MEMBER_DEFAULTS = {
+    "levels": {"xp": 0, "level": 0, "totalXp": 0},
+    "economy": {"wallet": 0, "bank": 0, "inventory": []},
+}
+
+@api_router.post("/ingest/events")
+async def ingest_events(batch: IngestBatch):
+    if len(batch.events) > INGEST_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {INGEST_BATCH_MAX} events per batch")
+
+    # Event indexes per dataset, guild and member (in batch order)
+    touched: Dict[str, Dict[str, Dict[str, List[int]]]] = {"levels": {}, "economy": {}}
+    for index, event in enumerate(batch.events):
+        if event.xp_delta:
+            touched["levels"].setdefault(event.guild_id, {}).setdefault(event.user_id, []).append(index)
+        if event.wallet_delta or event.bank_delta:
+            touched["economy"].setdefault(event.guild_id, {}).setdefault(event.user_id, []).append(index)
+
+    level_ups = []
+
+    # Records are replaced, never modified in place, so snapshots can share them
+    def add_xp(guild_id: str, user_id: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        record = dict(MEMBER_DEFAULTS["levels"] if record is None else record)
+        for index in touched["levels"][guild_id][user_id]:
+            delta = batch.events[index].xp_delta
+            xp = record.get("xp", 0) + delta
+            level = previous = record.get("level", 0)
+            # Loops only for deltas above 100 XP: a message (15-25 XP)
+            # levels up at most once, as in the bot
+            while xp >= xp_needed(level):
+                xp -= xp_needed(level)
+                level += 1
+            record["xp"] = xp
+            record["level"] = level
+            record["totalXp"] = record.get("totalXp", 0) + delta
+            if level != previous:
+                level_ups.append({
+                    "index": index,
+                    "guildId": guild_id,
+                    "userId": user_id,
+                    "previousLevel": previous,
+                    "level": level
+                })
+        return record
+
+    def add_money(guild_id: str, user_id: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        record = dict(MEMBER_DEFAULTS["economy"] if record is None else record)
+        for index in touched["economy"][guild_id][user_id]:
+            record["wallet"] = record.get("wallet", 0) + batch.events[index].wallet_delta
+            record["bank"] = record.get("bank", 0) + batch.events[index].bank_delta
+        return record
+
+    # One read-modify-write per dataset: in shared mode it runs on the stored
+    # records under the engine's cross-process lock, so increments sent to
+    # different workers add up
+    for name, update in (("levels", add_xp), ("economy", add_money)):
+        if touched[name]:
+            storage.update_members(name, touched[name], update)
+
+    level_ups.sort(key=lambda level_up: level_up["index"])
+    return {
+        "success": True,
+        "events": len(batch.events),
+        "levelUps": level_ups,
+        "updated": {name: sum(map(len, guilds.values())) for name, guilds in touched.items()}
+    }
+
+# Command cooldowns (/work, /daily, ...) for every bot shard: check-and-set
+# in one call instead of the bot's cooldowns.json load + full rewrite. The
+# journal is shared by the workers in STORAGE_SHARED mode.
+COOLDOWN_PATH = Path(os.environ.get("COOLDOWN_PATH", DATA_PATH / "cooldowns.log"))
+COOLDOWN_BATCH_MAX = int(os.environ.get("COOLDOWN_BATCH_MAX", "1000"))
+cooldowns = CooldownStore(COOLDOWN_PATH, shared=STORAGE_SHARED)
+
+class CooldownAcquire(BaseModel):
+    key: str = Field(..., min_length=1, max_length=256)
+    ttl: float = Field(..., gt=0, le=366 * 86400)
+
+class CooldownLookup(BaseModel):
+    keys: List[str]
+
+@api_router.post("/cooldowns/acquire")
+async def acquire_cooldown(request: CooldownAcquire):
+    # On a thread: the journal append (file lock and compaction included)
+    acquired, remaining = await asyncio.to_thread(cooldowns.acquire, request.key, request.ttl)
+    return {"key": request.key, "acquired": acquired, "remaining": round(remaining, 3)}
+
+@api_router.post("/cooldowns/lookup")
+async def lookup_cooldowns(request: CooldownLookup):
+    if len(request.keys) > COOLDOWN_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {COOLDOWN_BATCH_MAX} keys per lookup")
+    remaining = await asyncio.to_thread(cooldowns.lookup, request.keys)
+    return {"cooldowns": {key: round(left, 3) for key, left in remaining.items()}}
+
+@api_router.delete("/cooldowns/{key:path}")
+async def reset_cooldown(key: str):
+    return {"key": key, "reset": await asyncio.to_thread(cooldowns.reset, key)}
+
+@api_router.get("/cooldowns/stats")
+async def get_cooldown_stats():
+    return {"active": len(cooldowns), "shared": STORAGE_SHARED, **cooldowns.stats}
+
+# Leaderboard entries
+def economy_entry(uid: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "userId": uid,
+        "total": data.get("wallet", 0) + data.get("bank", 0),
+        "wallet": data.get("wallet", 0),
+        "bank": data.get("bank", 0)
+    }
+
+def levels_entry(uid: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "userId": uid,
+        "level": data.get("level", 0),
+        "xp": data.get("xp", 0),
+        "totalXp": data.get("totalXp", 0)
+    }
+
+LEADERBOARD_ENTRIES = {"economy": economy_entry, "levels": levels_entry}
+
 # Economy leaderboard
 @api_router.get("/guild/{guild_id}/economy/leaderboard")
-async def get_economy_leaderboard(guild_id: str):
-    guild_economy = economy_data.get(guild_id, {})
-    leaderboard = [
-        {
-            "userId": uid,
-            "total": data.get("wallet", 0) + data.get("bank", 0),
-            "wallet": data.get("wallet", 0),
-            "bank": data.get("bank", 0)
-        }
-        for uid, data in guild_economy.items()
-    ]
-    leaderboard.sort(key=lambda x: x["total"], reverse=True)
-    return {"leaderboard": leaderboard[:20]}
+async def get_economy_leaderboard(
+    guild_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    return response_cache.respond(
+        request, ("economy", guild_id, offset, limit), dataset_version("economy", guild_id),
+        lambda: {"leaderboard": [economy_entry(uid, data) for uid, data in storage.top("economy", guild_id, limit, offset)]}
+    )
 
 # Levels leaderboard
 @api_router.get("/guild/{guild_id}/levels/leaderboard")
-async def get_levels_leaderboard(guild_id: str):
-    guild_levels = levels_data.get(guild_id, {})
-    leaderboard = [
-        {
-            "userId": uid,
-            "level": data.get("level", 0),
-            "xp": data.get("xp", 0),
-            "totalXp": data.get("totalXp", 0)
+async def get_levels_leaderboard(
+    guild_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    return response_cache.respond(
+        request, ("levels", guild_id, offset, limit), dataset_version("levels", guild_id),
+        lambda: {"leaderboard": [levels_entry(uid, data) for uid, data in storage.top("levels", guild_id, limit, offset)]}
+    )
+
+# Member rank (economy or levels)
+@api_router.get("/guild/{guild_id}/{board}/rank/{user_id}")
+async def get_member_rank(
+    guild_id: str,
+    board: Literal["economy", "levels"],
+    user_id: str,
+    neighbours: int = Query(1, ge=0, le=10)
+):
+    index = storage.ranking(board, guild_id)
+    position = index.rank(user_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="User not ranked in this guild")
+
+    members = storage.datasets[board].get(guild_id, {})
+    entry = LEADERBOARD_ENTRIES[board]
+    start = max(position - neighbours, 0)
+    around = index.slice(start, position - start + neighbours + 1)
+    ranked = [dict(entry(uid, members[uid]), rank=start + i + 1) for i, uid in enumerate(around)]
+    total = len(index)
+
+    return {
+        "userId": user_id,
+        "rank": position + 1,
+        "members": total,
+        # Share of the guild ranked below this member (top = 100, last = 0)
+        "percentile": round(100 * (total - position - 1) / (total - 1), 2) if total > 1 else 100.0,
+        "entry": ranked[position - start],
+        "above": ranked[:position - start],
+        "below": ranked[position - start + 1:]
+    }
+
+# Guild statistics: aggregates kept up to date on every economy/levels change
+# (percentiles and Gini are approximate, see guild_stats.py for the bounds)
+guild_stats = GuildStats(storage, maxsize=int(os.environ.get("STATS_GUILDS", "256")))
+storage.subscribe(guild_stats.on_change)
+
+@api_router.get("/guild/{guild_id}/stats")
+async def get_guild_stats(guild_id: str, request: Request):
+    version = (dataset_version("economy", guild_id), dataset_version("levels", guild_id))
+    # Aggregates of guilds stored in the database are built on a thread
+    await guild_stats.load("economy", guild_id)
+    await guild_stats.load("levels", guild_id)
+    return response_cache.respond(request, ("stats", guild_id), version, lambda: {
+        "guildId": guild_id,
+        "economy": guild_stats.get("economy", guild_id).to_dict(),
+        "levels": guild_stats.get("levels", guild_id).to_dict(),
+        "accuracy": ACCURACY
+    })
+
+# Streaming export of a guild's members: rows are produced one chunk at a
+# time, so memory does not grow with the guild
+EXPORT_CHUNK = 1000
+
+def export_lines(board: str, chunks, fmt: str, ranked: bool):
+    entry = LEADERBOARD_ENTRIES[board]
+    rank = 0
+    header = False
+    for chunk in chunks:
+        rows = []
+        for uid, data in chunk:
+            row = entry(uid, data)
+            if ranked:
+                rank += 1
+                row["rank"] = rank
+            rows.append(row)
+        if not rows:
+            continue
+        if fmt == "ndjson":
+            yield b"".join(codec_dumps(row) + b"\n" for row in rows)
+            continue
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]), lineterminator="\n")
+        if not header:
+            writer.writeheader()
+            header = True
+        writer.writerows(rows)
+        yield out.getvalue().encode("utf-8")
+
+async def export_stream(board: str, guild_id: str, fmt: str, ranked: bool, compress: bool):
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    # Rows read from the database are fetched and formatted on a thread;
+    # in-memory guilds are read on the loop, one chunk at a time
+    chunks = storage.stored_chunks(board, guild_id, ranked, EXPORT_CHUNK)
+    on_thread = chunks is not None
+    if chunks is None:
+        chunks = storage.member_chunks(board, guild_id, ranked, EXPORT_CHUNK)
+    lines = export_lines(board, chunks, fmt, ranked)
+    while True:
+        data = await asyncio.to_thread(next, lines, None) if on_thread else next(lines, None)
+        if data is None:
+            break
+        if gzipper is not None:
+            data = gzipper.compress(data)
+        if data:
+            yield data
+        # Let other requests run between chunks
+        await asyncio.sleep(0)
+    if gzipper is not None:
+        yield gzipper.flush()
+
+@api_router.get("/guild/{guild_id}/{board}/export")
+async def export_members(
+    guild_id: str,
+    board: Literal["economy", "levels"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    sort: Literal["rank", "none"] = "rank",
+    gzip: bool = False
+):
+    filename = f"{board}-{guild_id}.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("application/x-ndjson" if format == "ndjson" else "text/csv")
+    return StreamingResponse(
+        export_stream(board, guild_id, format, sort == "rank", gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Live updates: change events pushed to dashboards over Server-Sent Events
+live = LiveHub(
+    queue_size=int(os.environ.get("LIVE_QUEUE_SIZE", "64")),
+    heartbeat=float(os.environ.get("LIVE_HEARTBEAT", "15"))
+)
+# Above this many changed members a leaderboard event just asks for a refetch
+LIVE_MAX_MEMBERS = 100
+
+def publish_change(name: str, guild_id: Optional[str], user_ids):
+    if not live.has_subscribers(guild_id):
+        return
+    if guild_id is None:
+        live.publish(None, "reload", {"dataset": name})
+    elif name in LEADERBOARD_ENTRIES:
+        if user_ids is None or len(user_ids) > LIVE_MAX_MEMBERS:
+            live.publish(guild_id, "reload", {"dataset": name, "guildId": guild_id})
+            return
+        members = storage.datasets[name].get(guild_id, {})
+        index = storage.ranking(name, guild_id)
+        entry = LEADERBOARD_ENTRIES[name]
+        changed = []
+        removed = []
+        for uid in user_ids:
+            if uid in members:
+                changed.append(dict(entry(uid, members[uid]), rank=index.rank(uid) + 1))
+            else:
+                removed.append(uid)
+        live.publish(guild_id, name, {"guildId": guild_id, "members": changed, "removed": removed})
+    else:
+        live.publish(guild_id, "settings", {
+            "guildId": guild_id,
+            "section": name,
+            "data": storage.datasets[name].get(guild_id)
+        })
+
+storage.subscribe(publish_change)
+
+@api_router.get("/guild/{guild_id}/events")
+async def guild_events(guild_id: str):
+    return StreamingResponse(
+        live.stream(guild_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/live/stats")
+async def get_live_stats():
+    return {"subscribers": live.subscribers, **live.stats}
+
+# Snapshots: compressed point-in-time backups of every dataset, taken every
+# SNAPSHOT_INTERVAL seconds (0 disables them) and on POST /api/snapshots;
+# restore one with SNAPSHOT_RESTORE (see above) or `python snapshots.py restore`
+# while the server is stopped
+SNAPSHOT_PATH = Path(os.environ.get("SNAPSHOT_PATH", DATA_PATH / "snapshots"))
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", "0"))
+snapshots = SnapshotManager(
+    storage,
+    SNAPSHOT_PATH,
+    keep=int(os.environ.get("SNAPSHOT_KEEP", "5")),
+    level=int(os.environ.get("SNAPSHOT_LEVEL", "6"))
+)
+
+@api_router.get("/snapshots")
+async def list_snapshots():
+    return {"interval": SNAPSHOT_INTERVAL, "last": snapshots.last, "snapshots": snapshots.list()}
+
+@api_router.post("/snapshots")
+async def take_snapshot():
+    return await snapshots.take()
+
+# Metrics
+def register_metrics(metrics: Metrics):
+    # Monotonic values are exported as *_total counters, current state as gauges
+    def stats(values: Dict[str, Any], keys: Optional[Iterable[str]] = None):
+        return {
+            (("stat", key),): value for key, value in values.items()
+            if isinstance(value, (int, float)) and (keys is None or key in keys)
         }
-        for uid, data in guild_levels.items()
-    ]
-    leaderboard.sort(key=lambda x: x["totalXp"], reverse=True)
-    return {"leaderboard": leaderboard[:20]}
+
+    metrics.collector("toothless_response_cache_total", "counter", "ETag response cache (hits, misses, notModified)",
+                      lambda: stats(response_cache.stats))
+    metrics.collector("toothless_guild_cache_total", "counter", "Guild metadata stale-while-revalidate cache",
+                      lambda: stats(guild_cache.stats))
+    metrics.collector("toothless_discord_client_total", "counter", "Discord client requests, 429s, coalescing and cache",
+                      lambda: stats({**discord.stats, "cacheHits": discord.cache.hits,
+                                     "cacheMisses": discord.cache.misses},
+                                    ("requests", "rateLimited", "coalesced", "cacheHits", "cacheMisses")))
+    metrics.collector("toothless_discord_queued_seconds_total", "counter", "Time spent waiting for Discord rate limits",
+                      lambda: {(): discord.stats["queuedSeconds"]})
+    metrics.collector("toothless_storage", "gauge", "Storage writer backlog and leaderboard index state",
+                      lambda: stats({
+                          "pendingWrites": storage.writer.pending if storage.writer else 0,
+                          "rankedGuilds": len(storage.rankings),
+                      }))
+    metrics.collector("toothless_storage_writes_total", "counter", "Storage writes and saves coalesced into them",
+                      lambda: stats({
+                          "writes": storage.writer.writes if storage.writer else 0,
+                          "coalescedWrites": storage.writer.coalesced if storage.writer else 0,
+                      }))
+    metrics.collector("toothless_guild_stats_total", "counter", "Guild statistics builds and incremental updates",
+                      lambda: stats(guild_stats.stats))
+    metrics.collector("toothless_cooldowns_active", "gauge", "Cooldowns currently running",
+                      lambda: {(): len(cooldowns)})
+    metrics.collector("toothless_cooldowns_total", "counter", "Cooldown checks, expiries and journal compactions",
+                      lambda: stats(cooldowns.stats))
+    metrics.collector("toothless_live_subscribers", "gauge", "Open live update streams",
+                      lambda: {(): live.subscribers})
+    metrics.collector("toothless_live_events_total", "counter", "Live update events published, delivered and resyncs",
+                      lambda: stats(live.stats))
+    metrics.collector("toothless_snapshot", "gauge", "Last snapshot size and timings",
+                      lambda: stats({key: snapshots.last[key] for key in ("bytes", "rawBytes", "captureMs", "durationMs")}
+                                    if snapshots.last else {}))
+    if reloader is not None:
+        counters = ("checks", "reloads", "failedParses", "changes", "resets")
+        metrics.collector("toothless_reloader", "gauge", "Last reload of datasets changed by other processes",
+                          lambda: stats({key: value for key, value in reloader.stats().items() if key not in counters}))
+        metrics.collector("toothless_reloader_total", "counter", "Checks and reloads of datasets changed by other processes",
+                          lambda: stats(reloader.stats(), counters))
+
+if metrics is not None:
+    register_metrics(metrics)
+
+    @api_router.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Include router
 app.include_router(api_router)
@@ -0,0 +1,189 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Snapshots
+========================================
+Compressed point-in-time backups of every dataset. A snapshot is captured by
+the storage engine without holding up requests (see StorageEngine.capture:
+the guilds are copied on a thread and the ones saved meanwhile copied again
+on the event loop, or one read transaction / a paused writer for the sqlite
+and sharded engines), then encoded and compressed on a worker thread into a
+single zip:
+
+    snapshot-<UTC timestamp>.zip
+        manifest.json      engine, creation time, guilds per dataset
+        <dataset>.json     compact JSON, one member per dataset
+
+Only the newest `keep` snapshots are kept. Restoring replaces the datasets
+(guilds missing from the snapshot are deleted) and must run with the server
+stopped: either with the command below, or by starting the server with
+SNAPSHOT_RESTORE pointing at the snapshot, which loads it straight into the
+json/log engines instead of reading their files (StorageEngine.restore).
+
+    python snapshots.py list [--dir DIR]
+    python snapshots.py take [--data DIR] [--engine json] [--dir DIR]
+    python snapshots.py restore SNAPSHOT [--data DIR] [--engine json]
+"""
+
+import os
+import time
+import asyncio
+import zipfile
+import argparse
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import codec
+from storage import DATASETS, ENGINES, StorageEngine, create_engine
+
+logger = logging.getLogger(__name__)
+
+
+def load_snapshot(path: Path, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Datasets stored in a snapshot (all of them, or only `names`)"""
+    with zipfile.ZipFile(path) as archive:
+        manifest = codec.loads_json(archive.read("manifest.json"))
+        data = {}
+        for name in manifest["datasets"]:
+            if names is None or name in names:
+                data[name] = codec.loads_json(archive.read(f"{name}.json"))
+        return data
+
+
+def restore_snapshot(path: Path, engine: StorageEngine) -> Dict[str, int]:
+    """Replace the engine's datasets with a snapshot's and persist them (server stopped)"""
+    counts = {}
+    for name, data in load_snapshot(path).items():
+        engine.restore(name, data)
+        counts[name] = len(data)
+    engine.flush()
+    return counts
+
+
+class SnapshotManager:
+    def __init__(self, storage: StorageEngine, path: Path, keep: int = 5, level: int = 6):
+        self.storage = storage
+        self.path = Path(path)
+        self.keep = keep
+        self.level = level
+        self.last: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Snapshots on disk, newest first"""
+        if not self.path.exists():
+            return []
+        return [
+            {"file": path.name, "bytes": stat.st_size, "mtime": stat.st_mtime}
+            for path in sorted(self.path.glob("snapshot-*.zip"), reverse=True)
+            for stat in (path.stat(),)
+        ]
+
+    async def take(self) -> Dict[str, Any]:
+        """Capture the guild tables on the event loop, copy, encode and compress on a thread"""
+        async with self._lock:
+            start = time.perf_counter()
+            dump = self.storage.capture()
+            capture_ms = (time.perf_counter() - start) * 1000
+            info = await asyncio.to_thread(self.write, dump)
+            info["captureMs"] = round(capture_ms, 3)
+            info["durationMs"] = round((time.perf_counter() - start) * 1000, 3)
+            self.last = info
+            return info
+
+    async def run(self, interval: float, stop: asyncio.Event):
+        """Snapshot every `interval` seconds until `stop` is set"""
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                # Workers sharing the data: one snapshot per interval is enough
+                newest = self.list()[:1]
+                if newest and time.time() - newest[0]["mtime"] < interval / 2:
+                    continue
+                try:
+                    await self.take()
+                except Exception:
+                    # Retried on the next interval
+                    logger.exception("Snapshot failed")
+
+    def write(self, dump: Callable[[], Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        self.path.mkdir(parents=True, exist_ok=True)
+        created = datetime.now(timezone.utc)
+        target = self.path / f"snapshot-{created.strftime('%Y%m%dT%H%M%S%fZ')}.zip"
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        raw = 0
+        data = dump()
+        counts = {name: len(guilds) for name, guilds in data.items()}
+        try:
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=self.level) as archive:
+                for name, guilds in data.items():
+                    # One guild per dumps call (the encoder holds the GIL,
+                    # and so the event loop, for as long as a call runs),
+                    # each freed once written rather than all at the end
+                    with archive.open(f"{name}.json", "w", force_zip64=True) as member:
+                        member.write(b"{")
+                        for i, guild_id in enumerate(list(guilds)):
+                            value = guilds.pop(guild_id)
+                            blob = (b"," if i else b"") + codec.dumps(guild_id) + b":" + codec.dumps(value)
+                            raw += len(blob)
+                            member.write(blob)
+                        member.write(b"}")
+                        raw += 2
+                archive.writestr("manifest.json", codec.dumps({
+                    "engine": self.storage.name,
+                    "created": created.isoformat(),
+                    "datasets": counts,
+                }))
+            os.replace(tmp, target)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        self.prune()
+        return {
+            "file": target.name,
+            "created": created.isoformat(),
+            "bytes": target.stat().st_size,
+            "rawBytes": raw,
+            "guilds": counts,
+        }
+
+    def prune(self):
+        for path in sorted(self.path.glob("snapshot-*.zip"), reverse=True)[self.keep:]:
+            path.unlink()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Toothless dashboard snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="list the snapshots, newest first")
+    take = commands.add_parser("take", help="snapshot the datasets of a stopped server")
+    take.add_argument("--keep", type=int, default=5)
+    take.add_argument("--level", type=int, default=6, help="deflate level (1-9)")
+    restore = commands.add_parser("restore", help="replace the datasets with a snapshot")
+    restore.add_argument("snapshot", type=Path)
+    for command in (listing, take, restore):
+        command.add_argument("--data", type=Path, default=Path(__file__).parent / "data")
+        command.add_argument("--engine", choices=sorted(ENGINES), default="json")
+        command.add_argument("--dir", type=Path, help="snapshot folder (default: <data>/snapshots)")
+    args = parser.parse_args()
+    folder = args.dir or args.data / "snapshots"
+
+    if args.command == "list":
+        for entry in SnapshotManager(None, folder).list():
+            print(f"{entry['file']}  {entry['bytes'] / 1e6:.2f} MB")
+    else:
+        engine = create_engine(args.engine, args.data)
+        for name in DATASETS:
+            engine.load(name)
+        try:
+            if args.command == "take":
+                manager = SnapshotManager(engine, folder, keep=args.keep, level=args.level)
+                info = asyncio.run(manager.take())
+                print(f"{info['file']}: {info['bytes'] / 1e6:.2f} MB in {info['durationMs']:.0f} ms")
+            else:
+                for name, count in restore_snapshot(args.snapshot, engine).items():
+                    print(f"{name}: {count} guilds")
+        finally:
+            engine.close()
@@ -0,0 +1,1770 @@
+"""
+========================================
+🐉 TOOTHLESS Dashboard - Storage engines
+========================================
+Persistence of the dashboard datasets (welcome, log, tickets, levelSettings,
+economy, levels). Every dataset is a mapping guild_id -> value; handlers
+mutate it in memory and call `engine.save(name, guild_id)` to persist the
+change. With a BackgroundWriter attached, saves only mark the dataset dirty
+and a writer thread coalesces them into one write per staleness window, so
+request handlers never wait on the disk.
+
+Engines:
+- json: one JSON file per dataset, rewritten on every save (pretty-printed
+        by default; `file_format` selects compact JSON or msgpack, see codec.py)
+- log:  JSON snapshot + append-only change log replayed at startup and
+        compacted in the background once it grows past a threshold
+- sqlite: WAL-mode database with per-guild settings rows and per-user
+        economy/levels rows, loaded lazily per guild
+- sharded: one directory per guild holding a file per dataset, loaded on
+        first access and kept in an LRU, so startup does not read every guild
+
+With `shared=True` several processes (e.g. uvicorn workers) can use the same
+data: the json engine writes under a file lock, merging the guilds it saved
+into whatever the other processes wrote, and the sqlite engine records every
+write in a `changes` table. DatasetReloader / ChangeFeed then apply the other
+processes' changes, invalidating the cached guilds and notifying listeners.
+
+`python storage.py migrate-sqlite` imports the JSON files into SQLite,
+`python storage.py migrate-sharded` splits them into per-guild files.
+"""
+
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from urllib.parse import quote, unquote
+from typing import (
+    Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import codec
+from columnar import MEMBER_COLUMNS, SCORE_COLUMNS, ColumnarDataset, ColumnarGuild, plain
+from rankings import RankedList
+
+logger = logging.getLogger(__name__)
+
+DATASETS = ("welcome", "log", "tickets", "levelSettings", "economy", "levels")
+
+# Per-user datasets and the score their leaderboards are ranked by
+MEMBER_SCORES: Dict[str, Callable[[Dict[str, Any]], int]] = {
+    "economy": lambda record: record.get("wallet", 0) + record.get("bank", 0),
+    "levels": lambda record: record.get("totalXp", 0),
+}
+
+
+def load_json(filepath: Path, default=None):
+    """Read a dataset file (pretty/compact JSON or msgpack, see codec.py)"""
+    if filepath.exists():
+        try:
+            return codec.loads(filepath.read_bytes())
+        except (OSError, ValueError):
+            pass
+    return default if default is not None else {}
+
+
+# update(guild_id, user_id, record or None) -> new record
+MemberUpdate = Callable[[str, str, Optional[Mapping[str, Any]]], Dict[str, Any]]
+
+# What tells a file changed: (mtime_ns, size, inode). The inode catches a
+# replacement by rename within the mtime granularity with the same size.
+FileStat = Tuple[int, int, int]
+
+
+def file_stat(filepath: Path) -> FileStat:
+    st = filepath.stat()
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write(filepath: Path, content):
+    """Write to a temp file in the same directory and rename it over the target"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    tmp = filepath.with_name(f".{filepath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filepath)
+
+
+def snapshot(data: MutableMapping[str, Any]) -> Dict[str, Any]:
+    """Copy a dataset two levels deep so it can be serialized off the writer thread"""
+    return {
+        guild_id: dict(value) if isinstance(value, dict) else plain(value)
+        for guild_id, value in dict(data).items()
+    }
+
+
+def copy_guild(value):
+    """Copy of a guild's container; member records are shared"""
+    return value.copy() if isinstance(value, (dict, ColumnarGuild)) else value
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock held across processes for the duration of the block"""
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BackgroundWriter:
+    """
+    Writer thread for dirty datasets. Writes are keyed: marking a key that is
+    already pending replaces its callback, so a burst of saves costs one write.
+    Nothing stays dirty longer than `max_staleness` seconds.
+    """
+
+    def __init__(self, max_staleness: float = 0.5):
+        self.max_staleness = max_staleness
+        self.writes = 0
+        self.coalesced = 0
+        self._pending: Dict[Hashable, Callable[[], None]] = {}
+        self._deadline: Optional[float] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="storage-writer")
+        self._thread.start()
+
+    def mark_dirty(self, key: Hashable, write: Callable[[], None]):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BackgroundWriter is closed")
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = write
+            if self._deadline is None:
+                self._deadline = time.monotonic() + self.max_staleness
+                self._cond.notify()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything pending now (blocking)"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._deadline = None
+            for key, write in batch.items():
+                try:
+                    write()
+                    self.writes += 1
+                except Exception:
+                    logger.exception("Background write of %r failed, retrying", key)
+                    with self._cond:
+                        if not self._closed:
+                            self._pending.setdefault(key, write)
+                            if self._deadline is None:
+                                self._deadline = time.monotonic() + self.max_staleness
+                                self._cond.notify()
+
+    @contextmanager
+    def paused(self):
+        """Hold the writer back for the duration of the block (saves keep being queued)"""
+        with self._write_lock:
+            yield
+
+    def close(self):
+        """Flush pending writes and stop the thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class StorageEngine:
+    """Common interface of the persistence engines"""
+
+    name = "base"
+
+    def __init__(self, data_path: Path, writer: Optional[BackgroundWriter] = None, ranked_guilds: int = 1024):
+        self.data_path = Path(data_path)
+        self.data_path.mkdir(parents=True, exist_ok=True)
+        self.writer = writer
+        self.datasets: Dict[str, MutableMapping[str, Any]] = {}
+        # (dataset, guild_id) -> leaderboard index, built on first use
+        self.ranked_guilds = ranked_guilds
+        self.rankings: "OrderedDict[Tuple[str, str], RankedList]" = OrderedDict()
+        # Called as listener(name, guild_id, user_ids) after every change
+        self.listeners: List[Callable[[str, Optional[str], Optional[Iterable[str]]], None]] = []
+        # Keep economy/levels in the columnar layout (see columnar.py)
+        self.columnar = False
+        # Called as observer(operation, name, seconds) for writes, index builds...
+        self.observer: Optional[Callable[[str, str, float], None]] = None
+
+    def load(self, name: str) -> MutableMapping[str, Any]:
+        raise NotImplementedError
+
+    def wrap(self, name: str, data: Dict[str, Any]) -> MutableMapping[str, Any]:
+        """In-memory form of a freshly parsed dataset"""
+        if self.columnar and name in MEMBER_COLUMNS:
+            return ColumnarDataset(MEMBER_COLUMNS[name], data)
+        return data
+
+    def dirty_key(self, name: str, guild_id: Optional[str]) -> Hashable:
+        """Saves sharing a key are coalesced by the background writer"""
+        return name
+
+    def write(self, name: str, guild_id: Optional[str] = None):
+        raise NotImplementedError
+
+    def save(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        """
+        Persist the current value of one guild (or the whole dataset).
+        `user_ids` narrows a member dataset change down to those users.
+        """
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        self.changed(name, guild_id, user_ids)
+        write = lambda: self.timed("write", name, self.write, name, guild_id)
+        if self.writer is None:
+            write()
+        else:
+            self.writer.mark_dirty((self.name, self.dirty_key(name, guild_id)), write)
+
+    def save_many(self, name: str, guild_ids: Iterable[str]):
+        """Persist several guilds of one dataset with a single write"""
+        guild_ids = list(dict.fromkeys(guild_ids))
+        if not guild_ids:
+            return
+        for guild_id in guild_ids:
+            self.changed(name, guild_id)
+        write = lambda: self.timed("write", name, self.write_many, name, guild_ids)
+        if self.writer is None:
+            write()
+        else:
+            self.writer.mark_dirty((self.name, self.batch_key(name, guild_ids)), write)
+
+    def changed(self, name: str, guild_id: Optional[str], user_ids: Optional[List[str]] = None):
+        """Bring the indexes and listeners up to date with an in-memory change"""
+        if name in MEMBER_SCORES:
+            self.reindex(name, guild_id, user_ids)
+        self.notify(name, guild_id, user_ids)
+
+    def update_members(self, name: str, changes: Dict[str, Iterable[str]], update: MemberUpdate):
+        """
+        Read-modify-write of members: for each guild_id -> user_ids of
+        `changes`, update(guild_id, user_id, record) gets the member's record
+        (None if missing) and returns its new record, which is saved. Shared
+        engines apply it to the latest stored records, atomically across
+        processes, so concurrent increments from several workers add up.
+        """
+        data = self.datasets[name]
+        for guild_id, user_ids in changes.items():
+            user_ids = list(dict.fromkeys(user_ids))
+            if guild_id not in data:
+                data[guild_id] = {}
+            members = data[guild_id]
+            for user_id in user_ids:
+                members[user_id] = update(guild_id, user_id, members.get(user_id))
+            # Before the next guild: the lazy engines may evict this one
+            self.save(name, guild_id, user_ids)
+
+    def timed(self, operation: str, name: str, fn: Callable, *args):
+        if self.observer is None:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.observer(operation, name, time.perf_counter() - start)
+
+    def batch_key(self, name: str, guild_ids: List[str]) -> Hashable:
+        keys = {self.dirty_key(name, guild_id) for guild_id in guild_ids}
+        if len(keys) == 1:
+            return keys.pop()
+        return ("batch", name, frozenset(guild_ids))
+
+    def write_many(self, name: str, guild_ids: List[str]):
+        for guild_id in guild_ids:
+            self.write(name, guild_id)
+
+    def subscribe(self, listener: Callable[[str, Optional[str], Optional[Iterable[str]]], None]):
+        self.listeners.append(listener)
+
+    def notify(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        """Tell listeners a dataset changed (guild_id None: all of it)"""
+        for listener in self.listeners:
+            listener(name, guild_id, user_ids)
+
+    def ranking(self, name: str, guild_id: str) -> RankedList:
+        key = (name, guild_id)
+        index = self.rankings.get(key)
+        if index is None:
+            index = self.timed("index", name, lambda: RankedList(self.scores(name, guild_id)))
+            self.rankings[key] = index
+            while len(self.rankings) > self.ranked_guilds:
+                self.rankings.popitem(last=False)
+        else:
+            self.rankings.move_to_end(key)
+        return index
+
+    def scores(self, name: str, guild_id: str) -> Iterable[Tuple[str, int]]:
+        """(user_id, score) of every member, in insertion order"""
+        score = MEMBER_SCORES[name]
+        members = self.datasets[name].get(guild_id, {})
+        if isinstance(members, ColumnarGuild):
+            return members.scores(SCORE_COLUMNS[name])
+        return [(user_id, score(record)) for user_id, record in list(members.items())]
+
+    def reindex(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        """Bring leaderboard indexes up to date after a change"""
+        if guild_id is None:
+            for key in [key for key in self.rankings if key[0] == name]:
+                del self.rankings[key]
+            return
+        index = self.rankings.get((name, guild_id))
+        if index is None:
+            return
+        if user_ids is None:
+            # Unknown extent of the change: rebuild on next use
+            del self.rankings[(name, guild_id)]
+            return
+        score = MEMBER_SCORES[name]
+        members = self.datasets[name].get(guild_id, {})
+        for user_id in user_ids:
+            record = members.get(user_id)
+            if record is None:
+                index.remove(user_id)
+            else:
+                index.update(user_id, score(record))
+
+    def top(self, name: str, guild_id: str, limit: int, offset: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        """Members of a guild ordered by score (ties keep insertion order)"""
+        members = self.datasets[name].get(guild_id, {})
+        return [(user_id, members[user_id]) for user_id in self.ranking(name, guild_id).slice(offset, limit)]
+
+    def member_chunks(
+        self, name: str, guild_id: str, ranked: bool = True, size: int = 1000
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        All members of a guild, `size` at a time (by score if `ranked`,
+        otherwise in insertion order). Chunks are read lazily, so a change
+        between two chunks can shift members across the boundary.
+        """
+        if ranked:
+            offset = 0
+            while True:
+                chunk = self.top(name, guild_id, size, offset)
+                if not chunk:
+                    return
+                yield chunk
+                offset += len(chunk)
+        members = self.datasets[name].get(guild_id, {})
+        user_ids = list(members)
+        for start in range(0, len(user_ids), size):
+            chunk = [(user_id, members.get(user_id)) for user_id in user_ids[start:start + size]]
+            yield [(user_id, record) for user_id, record in chunk if record is not None]
+
+    def stored_chunks(
+        self, name: str, guild_id: str, ranked: bool = True, size: int = 1000
+    ) -> Optional[Iterator[List[Tuple[str, Dict[str, Any]]]]]:
+        """
+        member_chunks read from the database alone, so they can be iterated
+        on a thread; None when the guild is only current in memory (the
+        in-memory engines, or a write pending).
+        """
+        return None
+
+    def capture(self) -> Callable[[], Dict[str, Dict[str, Any]]]:
+        """
+        Point-in-time copy of every dataset, for snapshots. Call it on the
+        event loop, which it holds only to copy the guild tables; the returned
+        function runs on a thread and copies the guilds one at a time (member
+        records are replaced on change, never mutated in place, so they are
+        shared). Guilds saved meanwhile are copied again in one last step on
+        the loop: the snapshot is the state at that step.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        tables = {name: dict(data) for name, data in self.datasets.items()}
+        # name -> guilds saved since the capture started (None: all of them)
+        saved: Dict[str, Optional[Set[str]]] = {}
+
+        def on_change(name: str, guild_id: Optional[str], user_ids):
+            if guild_id is None:
+                saved[name] = None
+            elif saved.setdefault(name, set()) is not None:
+                saved[name].add(guild_id)
+
+        def settle(frozen: Dict[str, Dict[str, Any]]):
+            self.listeners.remove(on_change)
+            for name, guild_ids in saved.items():
+                data = self.datasets[name]
+                if guild_ids is None:
+                    frozen[name] = {guild_id: copy_guild(value) for guild_id, value in dict(data).items()}
+                    continue
+                guilds = frozen.setdefault(name, {})
+                for guild_id in guild_ids:
+                    if guild_id in data:
+                        guilds[guild_id] = copy_guild(data[guild_id])
+                    else:
+                        guilds.pop(guild_id, None)
+
+        async def settle_on_loop(frozen):
+            settle(frozen)
+
+        def dump():
+            frozen = {}
+            try:
+                for name, guilds in tables.items():
+                    frozen[name] = {guild_id: copy_guild(value) for guild_id, value in guilds.items()}
+            finally:
+                if loop is None:
+                    settle(frozen)
+                else:
+                    asyncio.run_coroutine_threadsafe(settle_on_loop(frozen), loop).result()
+            return {
+                name: {guild_id: plain(value) for guild_id, value in guilds.items()}
+                for name, guilds in frozen.items()
+            }
+
+        self.subscribe(on_change)
+        return dump
+
+    def restore(self, name: str, data: Dict[str, Any]) -> MutableMapping[str, Any]:
+        """
+        Replace a dataset with `data` (read from a snapshot) and persist it.
+        The in-memory engines take it as is, without reading their files.
+        """
+        if hasattr(self, "import_dataset"):
+            # Lazy engines: bulk write, then delete the guilds the snapshot lacks
+            current = self.datasets.get(name)
+            if current is None:
+                current = self.load(name)
+            self.import_dataset(name, data)
+            current.cache.clear()
+            for guild_id in [guild_id for guild_id in self.guild_ids(name) if guild_id not in data]:
+                del current[guild_id]
+                self.save(name, guild_id)
+            self.changed(name, None)
+            return current
+        dataset = self.datasets[name] = self.wrap(name, data)
+        self.save(name)
+        return dataset
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.flush()
+
+
+class JsonEngine(StorageEngine):
+    """One JSON file per dataset, rewritten whole on every save"""
+
+    name = "json"
+
+    def __init__(
+        self,
+        data_path: Path,
+        writer: Optional[BackgroundWriter] = None,
+        paths: Optional[Dict[str, Path]] = None,
+        file_format: str = "pretty",
+        columnar: bool = False,
+        shared: bool = False,
+    ):
+        super().__init__(data_path, writer)
+        self.file_format = file_format
+        self.columnar = columnar
+        # Datasets living outside data_path (e.g. the files the bot writes)
+        self.paths = {name: Path(path) for name, path in (paths or {}).items()}
+        # (mtime_ns, size, inode) of each file as last loaded or written by us
+        self.file_stats: Dict[str, FileStat] = {}
+        # Other processes write the same files: merge under a lock
+        self.shared = shared
+        # name -> guild_id -> members saved since the last write (None: the
+        # whole guild); None instead of the dict: the whole dataset
+        self._dirty: Dict[str, Optional[Dict[str, Optional[Set[str]]]]] = {}
+        self._dirty_lock = threading.Lock()
+        # Saves per dataset, and the save number of each guild's last save
+        # (key None: the whole dataset), so a reload parsed meanwhile keeps them
+        self.save_seq: Dict[str, int] = {}
+        self._saved: Dict[str, Dict[Optional[str], int]] = {}
+
+    def path(self, name: str) -> Path:
+        return self.paths.get(name, self.data_path / f"{name}.json")
+
+    def lock_path(self, name: str) -> Path:
+        path = self.path(name)
+        return path.with_name(path.name + ".lock")
+
+    def _remember_stat(self, name: str):
+        try:
+            self.file_stats[name] = file_stat(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def load(self, name: str) -> MutableMapping[str, Any]:
+        self._remember_stat(name)
+        data = self.wrap(name, load_json(self.path(name)))
+        self.datasets[name] = data
+        return data
+
+    def restore(self, name: str, data: Dict[str, Any]) -> MutableMapping[str, Any]:
+        self._remember_stat(name)
+        return super().restore(name, data)
+
+    def _mark(self, name: str, changes: Optional[Dict[str, Optional[Set[str]]]]):
+        with self._dirty_lock:
+            if changes is None:
+                self._dirty[name] = None
+                return
+            dirty = self._dirty.setdefault(name, {})
+            if dirty is None:
+                return
+            for guild_id, user_ids in changes.items():
+                if user_ids is None or dirty.get(guild_id, set()) is None:
+                    dirty[guild_id] = None
+                else:
+                    dirty[guild_id] = dirty.get(guild_id, set()) | user_ids
+
+    def _count_save(self, name: str, guild_ids: Iterable[Optional[str]]):
+        seq = self.save_seq[name] = self.save_seq.get(name, 0) + 1
+        saved = self._saved.setdefault(name, {})
+        for guild_id in guild_ids:
+            saved[guild_id] = seq
+
+    def saved_since(self, name: str, seq: int) -> Optional[Set[str]]:
+        """Guilds saved after save number `seq` (None: the whole dataset was)"""
+        saved = {guild_id for guild_id, last in self._saved.get(name, {}).items() if last > seq}
+        return None if None in saved else saved
+
+    def save(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        self._count_save(name, (guild_id,))
+        if self.shared:
+            self._mark(name, None if guild_id is None else {guild_id: None if user_ids is None else set(user_ids)})
+        super().save(name, guild_id, user_ids)
+
+    def save_many(self, name: str, guild_ids: Iterable[str]):
+        guild_ids = list(dict.fromkeys(guild_ids))
+        self._count_save(name, guild_ids)
+        if self.shared:
+            self._mark(name, dict.fromkeys(guild_ids))
+        super().save_many(name, guild_ids)
+
+    def write(self, name: str, guild_id: Optional[str] = None):
+        # Files shared with the bot stay in the format it reads
+        file_format = "pretty" if name in self.paths else self.file_format
+        if not self.shared:
+            atomic_write(self.path(name), codec.encode(snapshot(self.datasets[name]), file_format))
+            self._remember_stat(name)
+            return
+        # Coalesced saves: write every guild saved since the last write
+        with self._dirty_lock:
+            if name not in self._dirty:
+                # Written already (by update_members)
+                return
+            dirty = self._dirty.pop(name)
+        try:
+            with file_lock(self.lock_path(name)):
+                self._write_merged(name, dirty, file_format)
+        except BaseException:
+            self._mark(name, dirty)
+            raise
+
+    def _write_merged(
+        self,
+        name: str,
+        dirty: Optional[Dict[str, Optional[Set[str]]]],
+        file_format: str,
+        on_disk: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Write our saves over the current file. If another process wrote it
+        since we last read it, their changes are kept and our stat is left
+        stale, so the reloader brings them into memory. Saves naming their
+        user_ids only replace those members: workers updating different
+        members of one guild keep each other's updates. A save of a whole
+        guild replaces it. `on_disk`: the file, if the caller parsed it already.
+        """
+        path = self.path(name)
+        data = self.datasets[name]
+        try:
+            current = file_stat(path)
+        except FileNotFoundError:
+            current = None
+        if dirty is None or current is None or current == self.file_stats.get(name):
+            atomic_write(path, codec.encode(snapshot(data), file_format))
+            self._remember_stat(name)
+            return
+        merged = load_json(path) if on_disk is None else on_disk
+        for guild_id, user_ids in dirty.items():
+            value = data.get(guild_id)
+            if user_ids is None:
+                if value is None:
+                    merged.pop(guild_id, None)
+                else:
+                    merged[guild_id] = dict(value) if isinstance(value, dict) else plain(value)
+                continue
+            members = merged.setdefault(guild_id, {})
+            for user_id in user_ids:
+                record = None if value is None else value.get(user_id)
+                if record is None:
+                    members.pop(user_id, None)
+                else:
+                    members[user_id] = dict(record)
+            if not members and value is None:
+                del merged[guild_id]
+        atomic_write(path, codec.encode(merged, file_format))
+
+    def write_many(self, name: str, guild_ids: List[str]):
+        self.write(name)
+
+    def update_members(self, name: str, changes: Dict[str, Iterable[str]], update: MemberUpdate):
+        if not self.shared:
+            return super().update_members(name, changes, update)
+        # Under the lock: read what the other processes stored, update, and
+        # write it together with our pending saves
+        file_format = "pretty" if name in self.paths else self.file_format
+        path = self.path(name)
+        data = self.datasets[name]
+        changes = {guild_id: list(dict.fromkeys(user_ids)) for guild_id, user_ids in changes.items()}
+        with self._dirty_lock:
+            dirty = self._dirty.pop(name, {})
+        try:
+            with file_lock(self.lock_path(name)):
+                try:
+                    current = file_stat(path)
+                except FileNotFoundError:
+                    current = None
+                on_disk = None
+                if dirty is not None and current is not None and current != self.file_stats.get(name):
+                    on_disk = load_json(path)
+                for guild_id, user_ids in changes.items():
+                    if guild_id not in data:
+                        data[guild_id] = {}
+                    members = data[guild_id]
+                    # Members we saved and have not written yet are newer than
+                    # the file (None: the whole guild, or the file is unchanged)
+                    pending = dirty.get(guild_id, set()) if on_disk is not None else None
+                    stored = on_disk.get(guild_id, {}) if on_disk is not None else {}
+                    for user_id in user_ids:
+                        if pending is None or user_id in pending:
+                            record = members.get(user_id)
+                        else:
+                            record = stored.get(user_id)
+                        members[user_id] = update(guild_id, user_id, record)
+                if dirty is not None:
+                    for guild_id, user_ids in changes.items():
+                        if guild_id not in dirty:
+                            dirty[guild_id] = set(user_ids)
+                        elif dirty[guild_id] is not None:
+                            dirty[guild_id].update(user_ids)
+                self._write_merged(name, dirty, file_format, on_disk)
+        except BaseException:
+            self._mark(name, dirty)
+            raise
+        self._count_save(name, changes)
+        for guild_id, user_ids in changes.items():
+            self.changed(name, guild_id, user_ids)
+
+    def replace(self, name: str, data: MutableMapping[str, Any], stat: FileStat, seq: Optional[int] = None):
+        """
+        Swap in a freshly parsed dataset (readers keep the old dict they hold).
+        Guilds saved after save number `seq` (when the parse started) keep
+        their in-memory value: the pending write stores them over the file.
+        In shared mode the current dataset is updated in place instead, guild
+        by guild, also skipping the guilds we saved and have not written yet.
+        """
+        saved = set() if seq is None else self.saved_since(name, seq)
+        # Nothing older than this reload is needed by the next one
+        self._saved.pop(name, None)
+        if saved is None:
+            # The whole dataset was saved meanwhile: our write replaces the file
+            return
+        current = self.datasets[name]
+        if not self.shared:
+            for guild_id in saved:
+                if guild_id in current:
+                    data[guild_id] = current[guild_id]
+                else:
+                    data.pop(guild_id, None)
+            self.datasets[name] = data
+            self.file_stats[name] = stat
+            self.reindex(name)
+            self.notify(name)
+            return
+        with self._dirty_lock:
+            pending = self._dirty.get(name, {})
+        if pending is None:
+            return
+        pending = saved.union(pending)
+        changed = [guild_id for guild_id in list(current) if guild_id not in data and guild_id not in pending]
+        for guild_id in changed:
+            del current[guild_id]
+        for guild_id, value in data.items():
+            if guild_id not in pending and current.get(guild_id) != value:
+                current[guild_id] = value
+                changed.append(guild_id)
+        # Only now: a write comparing stats must not skip the merge too early
+        self.file_stats[name] = stat
+        for guild_id in changed:
+            if name in MEMBER_SCORES:
+                self.reindex(name, guild_id)
+            self.notify(name, guild_id)
+
+
+class DatasetReloader:
+    """
+    Change detection for JSON datasets rewritten by another process (the bot,
+    or other workers of a shared engine). poll() stats each file and re-parses
+    it only when (mtime_ns, size, inode) differs from what the engine last
+    loaded or wrote; apply() swaps the new dicts in. Run poll() off the event
+    loop and apply() on it, so a request never sees a half-loaded dataset.
+    """
+
+    def __init__(self, engine: JsonEngine, names: Iterable[str]):
+        self.engine = engine
+        self.names = tuple(names)
+        self.checks = 0
+        self.reloads = 0
+        self.failed = 0
+        self.last_reload_ms = 0.0
+        self.total_reload_ms = 0.0
+        self.last_reload_at: Optional[float] = None
+
+    def poll(self) -> Dict[str, Tuple[Dict[str, Any], FileStat, int]]:
+        self.checks += 1
+        changed = {}
+        for name in self.names:
+            path = self.engine.path(name)
+            try:
+                stat = file_stat(path)
+            except FileNotFoundError:
+                continue
+            if stat == self.engine.file_stats.get(name):
+                continue
+            writer = self.engine.writer
+            if writer is not None and writer.is_pending((self.engine.name, self.engine.dirty_key(name, None))):
+                # Our own pending write wins over the file
+                continue
+            # Saves made while we parse are kept by replace()
+            seq = self.engine.save_seq.get(name, 0)
+            start = time.perf_counter()
+            try:
+                data = self.engine.wrap(name, codec.loads(path.read_bytes()))
+            except (OSError, ValueError):
+                # The bot writes in place: retry once the file is complete
+                self.failed += 1
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            if self.engine.observer is not None:
+                self.engine.observer("reload", name, elapsed / 1000)
+            self.reloads += 1
+            self.last_reload_ms = elapsed
+            self.total_reload_ms += elapsed
+            self.last_reload_at = time.time()
+            changed[name] = (data, stat, seq)
+        return changed
+
+    def apply(self, changed: Dict[str, Tuple[Dict[str, Any], FileStat, int]]):
+        for name, (data, stat, seq) in changed.items():
+            self.engine.replace(name, data, stat, seq)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "datasets": list(self.names),
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "failedParses": self.failed,
+            "lastReloadMs": round(self.last_reload_ms, 3),
+            "avgReloadMs": round(self.total_reload_ms / self.reloads, 3) if self.reloads else 0.0,
+            "lastReloadAt": self.last_reload_at,
+        }
+
+
+class AppendLogEngine(StorageEngine):
+    """
+    `<name>.json` snapshot plus `<name>.log` of per-guild change records
+    (one JSON object per line). A save appends only the changed guild, or
+    only the changed members when it names its user_ids, so the write cost
+    depends on the size of the change, not on the dataset.
+    """
+
+    name = "log"
+
+    def __init__(
+        self,
+        data_path: Path,
+        writer: Optional[BackgroundWriter] = None,
+        compact_bytes: int = 1 << 20,
+        fsync: bool = False,
+        file_format: str = "pretty",
+        columnar: bool = False,
+    ):
+        super().__init__(data_path, writer)
+        self.file_format = file_format
+        self.columnar = columnar
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self._locks: Dict[str, threading.Lock] = {}
+        self._files: Dict[str, Any] = {}
+        self._compacting: Dict[str, threading.Thread] = {}
+        # (name, guild_id) -> members saved since the last write (None: the
+        # whole guild)
+        self._members: Dict[Tuple[str, str], Optional[Set[str]]] = {}
+        self._members_lock = threading.Lock()
+
+    def snapshot_path(self, name: str) -> Path:
+        return self.data_path / f"{name}.json"
+
+    def log_path(self, name: str) -> Path:
+        return self.data_path / f"{name}.log"
+
+    def load(self, name: str) -> MutableMapping[str, Any]:
+        data = load_json(self.snapshot_path(name))
+        # A crash during compaction can leave the rotated log behind: fold it
+        # into the snapshot before the next rotation overwrites it
+        rotated = self.log_path(name).with_suffix(".log.compacting")
+        if rotated.exists():
+            self._replay(rotated, data)
+            if self.log_path(name).exists():
+                self._replay(self.log_path(name), data)
+            atomic_write(self.snapshot_path(name), codec.encode(data, self.file_format))
+            rotated.unlink()
+        elif self.log_path(name).exists():
+            self._replay(self.log_path(name), data)
+        data = self.wrap(name, data)
+        self.datasets[name] = data
+        self._locks[name] = threading.Lock()
+        self._files[name] = open(self.log_path(name), "a", encoding="utf-8")
+        self._maybe_compact(name)
+        return data
+
+    def restore(self, name: str, data: Dict[str, Any]) -> MutableMapping[str, Any]:
+        # A compaction writes the restored data as the new snapshot file and
+        # drops the old log (records appended meanwhile go to a fresh one)
+        dataset = self.datasets[name] = self.wrap(name, data)
+        self._locks[name] = threading.Lock()
+        self._files[name] = open(self.log_path(name), "a", encoding="utf-8")
+        self.changed(name, None)
+        compact = lambda: self._maybe_compact(name, force=True)
+        if self.writer is None:
+            compact()
+        else:
+            self.writer.mark_dirty((self.name, ("restore", name)), compact)
+        return dataset
+
+    @staticmethod
+    def _replay(path: Path, data: Dict[str, Any]):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = codec.loads_json(line)
+                except ValueError:
+                    # Torn last line after a crash
+                    continue
+                if record.get("d"):
+                    data.pop(record["g"], None)
+                elif "m" in record:
+                    members = data.setdefault(record["g"], {})
+                    for user_id, value in record["m"].items():
+                        if value is None:
+                            members.pop(user_id, None)
+                        else:
+                            members[user_id] = value
+                else:
+                    data[record["g"]] = record["v"]
+
+    def dirty_key(self, name: str, guild_id: Optional[str]) -> Hashable:
+        return (name, guild_id)
+
+    def save(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        if guild_id is not None:
+            self._mark(name, guild_id, None if user_ids is None else set(user_ids))
+        super().save(name, guild_id, user_ids)
+
+    def save_many(self, name: str, guild_ids: Iterable[str]):
+        guild_ids = list(dict.fromkeys(guild_ids))
+        for guild_id in guild_ids:
+            self._mark(name, guild_id, None)
+        super().save_many(name, guild_ids)
+
+    def _mark(self, name: str, guild_id: str, user_ids: Optional[Set[str]]):
+        key = (name, guild_id)
+        with self._members_lock:
+            if user_ids is None or self._members.get(key, set()) is None:
+                self._members[key] = None
+            else:
+                self._members[key] = self._members.get(key, set()) | user_ids
+
+    def _record_line(self, name: str, guild_id: str) -> str:
+        with self._members_lock:
+            user_ids = self._members.pop((name, guild_id), None)
+        data = self.datasets[name]
+        if guild_id not in data:
+            record = {"g": guild_id, "d": True}
+        elif user_ids is None:
+            record = {"g": guild_id, "v": plain(data[guild_id])}
+        else:
+            members = data[guild_id]
+            record = {
+                "g": guild_id,
+                "m": {user_id: dict(members[user_id]) if user_id in members else None for user_id in user_ids},
+            }
+        return codec.dumps(record).decode("utf-8") + "\n"
+
+    def write(self, name: str, guild_id: Optional[str] = None):
+        data = self.datasets[name]
+        if guild_id is None:
+            with self._members_lock:
+                for key in [key for key in self._members if key[0] == name]:
+                    del self._members[key]
+            lines = "".join(
+                codec.dumps({"g": g, "v": v}).decode("utf-8") + "\n" for g, v in snapshot(data).items()
+            )
+        else:
+            lines = self._record_line(name, guild_id)
+        self._append(name, lines)
+
+    def write_many(self, name: str, guild_ids: List[str]):
+        self._append(name, "".join(self._record_line(name, guild_id) for guild_id in guild_ids))
+
+    def _append(self, name: str, lines: str):
+        with self._locks[name]:
+            f = self._files[name]
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._maybe_compact(name)
+
+    def _maybe_compact(self, name: str, force: bool = False):
+        thread = self._compacting.get(name)
+        if thread is not None and thread.is_alive():
+            return
+        if not force and self._files[name].tell() < self.compact_bytes:
+            return
+        thread = threading.Thread(target=self.compact, args=(name,), daemon=True, name=f"compact-{name}")
+        self._compacting[name] = thread
+        thread.start()
+
+    def compact(self, name: str):
+        """Fold the change log into the snapshot file"""
+        self.timed("compact", name, self._compact, name)
+
+    def _compact(self, name: str):
+        rotated = self.log_path(name).with_suffix(".log.compacting")
+        with self._locks[name]:
+            # New records go to a fresh log; replaying them on top of the new
+            # snapshot is idempotent, so the snapshot may already include them.
+            self._files[name].close()
+            os.replace(self.log_path(name), rotated)
+            self._files[name] = open(self.log_path(name), "a", encoding="utf-8")
+            data = snapshot(self.datasets[name])
+        atomic_write(self.snapshot_path(name), codec.encode(data, self.file_format))
+        rotated.unlink()
+
+    def flush(self):
+        super().flush()
+        # A restored dataset is only on disk once its compaction is done
+        for thread in list(self._compacting.values()):
+            thread.join()
+        for name, f in self._files.items():
+            with self._locks[name]:
+                f.flush()
+
+    def close(self):
+        super().close()
+        for name, f in self._files.items():
+            with self._locks[name]:
+                f.close()
+
+
+_MISSING = object()
+
+
+class LazyDataset(MutableMapping):
+    """
+    Lazy guild_id -> value view over one dataset of an engine providing
+    read(name, guild_id) and guild_ids(name) (SqliteEngine, ShardedEngine).
+    Guilds are read on first access and kept in a small LRU; assigned and
+    saved values stay pinned in `staged` until the writer has stored them.
+    With `columns`, assigned member dicts become ColumnarGuilds (as in
+    ColumnarDataset).
+    """
+
+    def __init__(self, engine: StorageEngine, name: str, cache_guilds: int, columns: Optional[Sequence[str]] = None):
+        self.engine = engine
+        self.name = name
+        self.cache_guilds = cache_guilds
+        self.columns = columns
+        self.cache: "OrderedDict[str, Any]" = OrderedDict()
+        # guild_id -> (stage sequence, value, changed user ids or None for
+        # the whole guild) waiting for the writer
+        self.staged: Dict[str, Tuple[int, Any, Optional[Set[str]]]] = {}
+        self._stage_seq = 0
+        # Staged on the event loop, unstaged by the writer thread
+        self._staged_lock = threading.Lock()
+
+    def __getitem__(self, guild_id: str):
+        if guild_id in self.cache:
+            value = self.cache[guild_id]
+            self.cache.move_to_end(guild_id)
+        elif guild_id in self.staged:
+            # Evicted while waiting for the writer: the staged value is current
+            value = self.staged[guild_id][1]
+            self._remember(guild_id, value)
+        else:
+            value = self.engine.read(self.name, guild_id)
+            self._remember(guild_id, value)
+        if value is _MISSING:
+            raise KeyError(guild_id)
+        return value
+
+    def __setitem__(self, guild_id: str, value):
+        if self.columns is not None and isinstance(value, Mapping) and not isinstance(value, ColumnarGuild):
+            value = ColumnarGuild(self.columns, value)
+        self._remember(guild_id, value)
+        # The LRU may evict it before the save does (e.g. a batch of guilds)
+        self.stage(guild_id)
+
+    def __delitem__(self, guild_id: str):
+        self[guild_id]
+        self._remember(guild_id, _MISSING)
+        self.stage(guild_id)
+
+    def __iter__(self) -> Iterator[str]:
+        # From the keys alone (reading the values would load every guild
+        # through the LRU): held in memory as __getitem__ resolves them, the
+        # cache over the staged values, then whatever else is stored
+        with self._staged_lock:
+            held = {guild_id: entry[1] for guild_id, entry in self.staged.items()}
+        held.update(self.cache)
+        seen = set()
+        for guild_id in self.engine.guild_ids(self.name):
+            seen.add(guild_id)
+            if held.get(guild_id) is not _MISSING:
+                yield guild_id
+        for guild_id, value in held.items():
+            if guild_id not in seen and value is not _MISSING:
+                yield guild_id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, guild_id) -> bool:
+        try:
+            self[guild_id]
+        except KeyError:
+            return False
+        return True
+
+    def _remember(self, guild_id: str, value):
+        self.cache[guild_id] = value
+        self.cache.move_to_end(guild_id)
+        while len(self.cache) > self.cache_guilds:
+            self.cache.popitem(last=False)
+
+    def stage(self, guild_id: str, user_ids: Optional[Iterable[str]] = None):
+        users = None if user_ids is None else set(user_ids)
+        with self._staged_lock:
+            self._stage_seq += 1
+            previous = self.staged.get(guild_id)
+            if previous is not None and users is not None:
+                users = None if previous[2] is None else previous[2] | users
+            value = self.cache.get(guild_id, _MISSING if previous is None else previous[1])
+            self.staged[guild_id] = (self._stage_seq, value, users)
+
+    def stage_all(self) -> List[str]:
+        """Stage every guild held in memory (the others are stored already)"""
+        for guild_id in list(self.cache):
+            self.stage(guild_id)
+        with self._staged_lock:
+            return list(self.staged)
+
+    def staged_entries(self, guild_ids: Iterable[str]) -> List[Tuple[str, int, Any, Optional[Set[str]]]]:
+        """(guild_id, seq, value, user_ids) of the given guilds that are staged"""
+        with self._staged_lock:
+            return [(guild_id, *self.staged[guild_id]) for guild_id in guild_ids if guild_id in self.staged]
+
+    def forget(self, guild_id: str):
+        """Drop a cached guild so the next read goes to the database"""
+        self.cache.pop(guild_id, None)
+
+    def unstage(self, guild_id: str, seq: int):
+        # A newer save of the same guild keeps its own entry
+        with self._staged_lock:
+            entry = self.staged.get(guild_id)
+            if entry is not None and entry[0] == seq:
+                del self.staged[guild_id]
+
+
+class SqliteEngine(StorageEngine):
+    """
+    Single SQLite database in WAL mode. Settings are one JSON row per guild;
+    economy and levels are one row per member with the numeric fields in
+    columns, indexed by (guild_id, score) so leaderboards never load a guild.
+    Saves naming their user_ids only rewrite those members' rows.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settings (
+            dataset TEXT NOT NULL,
+            guild_id TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (dataset, guild_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS economy (
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            wallet INTEGER NOT NULL DEFAULT 0,
+            bank INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            extra TEXT,
+            UNIQUE (guild_id, user_id)
+        );
+        DROP INDEX IF EXISTS economy_guild_total;
+        CREATE INDEX IF NOT EXISTS economy_guild_rank ON economy (guild_id, total DESC);
+        CREATE INDEX IF NOT EXISTS economy_guild ON economy (guild_id);
+        CREATE TABLE IF NOT EXISTS levels (
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            xp INTEGER NOT NULL DEFAULT 0,
+            level INTEGER NOT NULL DEFAULT 0,
+            totalXp INTEGER NOT NULL DEFAULT 0,
+            extra TEXT,
+            UNIQUE (guild_id, user_id)
+        );
+        DROP INDEX IF EXISTS levels_guild_totalXp;
+        CREATE INDEX IF NOT EXISTS levels_guild_rank ON levels (guild_id, totalXp DESC);
+        CREATE INDEX IF NOT EXISTS levels_guild ON levels (guild_id);
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset TEXT NOT NULL,
+            guild_id TEXT NOT NULL,
+            user_ids TEXT,
+            origin TEXT NOT NULL,
+            at REAL NOT NULL
+        );
+    """
+
+    # Numeric columns of the member tables and the column leaderboards sort on
+    MEMBER_TABLES = {
+        "economy": (("wallet", "bank"), "total"),
+        "levels": (("xp", "level", "totalXp"), "totalXp"),
+    }
+
+    def __init__(
+        self,
+        data_path: Path,
+        writer: Optional[BackgroundWriter] = None,
+        db_file: str = "toothless.db",
+        cache_guilds: int = 256,
+        shared: bool = False,
+    ):
+        super().__init__(data_path, writer)
+        self.db_path = self.data_path / db_file
+        self.cache_guilds = cache_guilds
+        # Record writes in `changes` for the other processes (see ChangeFeed)
+        self.shared = shared
+        self.origin = uuid.uuid4().hex
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread (WAL lets readers run alongside the writer)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def load(self, name: str) -> MutableMapping[str, Any]:
+        data = LazyDataset(self, name, self.cache_guilds)
+        self.datasets[name] = data
+        return data
+
+    def dirty_key(self, name: str, guild_id: Optional[str]) -> Hashable:
+        return (name, guild_id)
+
+    def save(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        if guild_id is not None:
+            self.datasets[name].stage(guild_id, user_ids if name in self.MEMBER_TABLES else None)
+        super().save(name, guild_id, user_ids)
+
+    def save_many(self, name: str, guild_ids: Iterable[str]):
+        guild_ids = list(dict.fromkeys(guild_ids))
+        for guild_id in guild_ids:
+            self.datasets[name].stage(guild_id)
+        super().save_many(name, guild_ids)
+
+    def guild_ids(self, name: str) -> List[str]:
+        if name in self.MEMBER_TABLES:
+            rows = self.connection().execute(f"SELECT DISTINCT guild_id FROM {name}")
+        else:
+            rows = self.connection().execute("SELECT guild_id FROM settings WHERE dataset = ?", (name,))
+        return [row[0] for row in rows]
+
+    def read(self, name: str, guild_id: str):
+        conn = self.connection()
+        if name not in self.MEMBER_TABLES:
+            row = conn.execute(
+                "SELECT value FROM settings WHERE dataset = ? AND guild_id = ?", (name, guild_id)
+            ).fetchone()
+            return json.loads(row[0]) if row else _MISSING
+        columns, _ = self.MEMBER_TABLES[name]
+        rows = conn.execute(
+            f"SELECT user_id, {', '.join(columns)}, extra FROM {name} WHERE guild_id = ? ORDER BY rowid",
+            (guild_id,),
+        ).fetchall()
+        if not rows:
+            return _MISSING
+        return {row[0]: self._record(columns, row[1:]) for row in rows}
+
+    @staticmethod
+    def _record(columns, row) -> Dict[str, Any]:
+        record = dict(zip(columns, row[:len(columns)]))
+        if row[len(columns)]:
+            record.update(json.loads(row[len(columns)]))
+        return record
+
+    def _member_row(self, name: str, guild_id: str, user_id: str, record: Dict[str, Any]):
+        columns, _ = self.MEMBER_TABLES[name]
+        extra = {k: v for k, v in record.items() if k not in columns}
+        values = [record.get(column, 0) for column in columns]
+        if name == "economy":
+            values.append(MEMBER_SCORES[name](record))
+        return (guild_id, user_id, *values, json.dumps(extra) if extra else None)
+
+    def write(self, name: str, guild_id: Optional[str] = None):
+        if guild_id is None:
+            self.write_many(name, self.datasets[name].stage_all())
+            return
+        self.write_many(name, [guild_id])
+
+    def write_many(self, name: str, guild_ids: List[str]):
+        """Staged guilds of one dataset, in a single transaction"""
+        data = self.datasets[name]
+        staged = data.staged_entries(guild_ids)
+        if not staged:
+            return
+        conn = self.connection()
+        with conn:
+            for guild_id, _, value, user_ids in staged:
+                if name not in self.MEMBER_TABLES:
+                    if value is _MISSING:
+                        conn.execute("DELETE FROM settings WHERE dataset = ? AND guild_id = ?", (name, guild_id))
+                    else:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO settings (dataset, guild_id, value) VALUES (?, ?, ?)",
+                            (name, guild_id, json.dumps(value)),
+                        )
+                elif user_ids is not None and value is not _MISSING:
+                    self._write_users(conn, name, guild_id, value, user_ids)
+                else:
+                    self._write_members(conn, name, guild_id, {} if value is _MISSING else dict(value))
+            if self.shared:
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO changes (dataset, guild_id, user_ids, origin, at) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (name, guild_id, None if user_ids is None else json.dumps(sorted(user_ids)), self.origin, now)
+                        for guild_id, _, _, user_ids in staged
+                    ],
+                )
+        for guild_id, seq, _, _ in staged:
+            data.unstage(guild_id, seq)
+
+    def _write_members(self, conn: sqlite3.Connection, name: str, guild_id: str, members: Dict[str, Any]):
+        columns, _ = self.MEMBER_TABLES[name]
+        all_columns = ["guild_id", "user_id", *columns] + (["total"] if name == "economy" else []) + ["extra"]
+        conn.execute(f"DELETE FROM {name} WHERE guild_id = ?", (guild_id,))
+        conn.executemany(
+            f"INSERT INTO {name} ({', '.join(all_columns)}) VALUES ({', '.join('?' * len(all_columns))})",
+            [self._member_row(name, guild_id, user_id, record) for user_id, record in members.items()],
+        )
+
+    def update_members(self, name: str, changes: Dict[str, Iterable[str]], update: MemberUpdate):
+        if not self.shared:
+            return super().update_members(name, changes, update)
+        # One IMMEDIATE transaction: no other process writes between our
+        # reads of the stored rows and the writes of the updated ones
+        data = self.datasets[name]
+        columns, _ = self.MEMBER_TABLES[name]
+        changes = {guild_id: list(dict.fromkeys(user_ids)) for guild_id, user_ids in changes.items()}
+        updated: Dict[str, Dict[str, Any]] = {}
+        conn = self.connection()
+        with self.writer.paused() if self.writer is not None else nullcontext():
+            # Our pending saves of these guilds predate the update
+            self.write_many(name, [guild_id for guild_id in changes if guild_id in data.staged])
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for guild_id, user_ids in changes.items():
+                    stored = {}
+                    for start in range(0, len(user_ids), 500):
+                        chunk = user_ids[start:start + 500]
+                        rows = conn.execute(
+                            f"SELECT user_id, {', '.join(columns)}, extra FROM {name} "
+                            f"WHERE guild_id = ? AND user_id IN ({', '.join('?' * len(chunk))})",
+                            (guild_id, *chunk),
+                        )
+                        stored.update((row[0], self._record(columns, row[1:])) for row in rows)
+                    members = updated[guild_id] = {
+                        user_id: update(guild_id, user_id, stored.get(user_id)) for user_id in user_ids
+                    }
+                    self._write_users(conn, name, guild_id, members, members.keys())
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO changes (dataset, guild_id, user_ids, origin, at) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (name, guild_id, json.dumps(sorted(user_ids)), self.origin, now)
+                        for guild_id, user_ids in changes.items()
+                    ],
+                )
+        for guild_id, members in updated.items():
+            cached = data.cache.get(guild_id, _MISSING)
+            if cached is _MISSING:
+                # Not in memory, or missing before the update: read on next use
+                data.forget(guild_id)
+            else:
+                for user_id, record in members.items():
+                    cached[user_id] = record
+            self.changed(name, guild_id, changes[guild_id])
+
+    def _write_users(self, conn: sqlite3.Connection, name: str, guild_id: str, members, user_ids: Iterable[str]):
+        # Upsert keeps the rowid, i.e. the member's position among score ties
+        columns, _ = self.MEMBER_TABLES[name]
+        all_columns = [*columns] + (["total"] if name == "economy" else []) + ["extra"]
+        rows, removed = [], []
+        for user_id in user_ids:
+            record = members.get(user_id)
+            if record is None:
+                removed.append((guild_id, user_id))
+            else:
+                rows.append(self._member_row(name, guild_id, user_id, dict(record)))
+        conn.executemany(f"DELETE FROM {name} WHERE guild_id = ? AND user_id = ?", removed)
+        conn.executemany(
+            f"INSERT INTO {name} (guild_id, user_id, {', '.join(all_columns)}) "
+            f"VALUES ({', '.join('?' * (len(all_columns) + 2))}) "
+            f"ON CONFLICT (guild_id, user_id) DO UPDATE SET "
+            + ", ".join(f"{column} = excluded.{column}" for column in all_columns),
+            rows,
+        )
+
+    def last_change(self) -> int:
+        return self.connection().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def scores(self, name: str, guild_id: str) -> Iterable[Tuple[str, int]]:
+        # Only the indexed columns, without materializing the member records
+        if guild_id in self.datasets[name].staged:
+            return super().scores(name, guild_id)
+        _, score_column = self.MEMBER_TABLES[name]
+        return self.connection().execute(
+            f"SELECT user_id, {score_column} FROM {name} WHERE guild_id = ? ORDER BY rowid", (guild_id,)
+        ).fetchall()
+
+    def top(self, name: str, guild_id: str, limit: int, offset: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        if guild_id in self.datasets[name].staged:
+            # Pending write: the rows are behind the in-memory guild
+            return super().top(name, guild_id, limit, offset)
+        columns, score_column = self.MEMBER_TABLES[name]
+        rows = self.connection().execute(
+            f"SELECT user_id, {', '.join(columns)}, extra FROM {name} WHERE guild_id = ? "
+            f"ORDER BY {score_column} DESC, rowid LIMIT ? OFFSET ?",
+            (guild_id, limit, offset),
+        ).fetchall()
+        return [(row[0], self._record(columns, row[1:])) for row in rows]
+
+    def member_chunks(
+        self, name: str, guild_id: str, ranked: bool = True, size: int = 1000
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        chunks = self.stored_chunks(name, guild_id, ranked, size)
+        if chunks is None:
+            # Pending write: the rows are behind the in-memory guild
+            chunks = super().member_chunks(name, guild_id, ranked, size)
+        yield from chunks
+
+    def stored_chunks(
+        self, name: str, guild_id: str, ranked: bool = True, size: int = 1000
+    ) -> Optional[Iterator[List[Tuple[str, Dict[str, Any]]]]]:
+        if guild_id in self.datasets[name].staged:
+            return None
+        return self._query_chunks(name, guild_id, ranked, size)
+
+    def _query_chunks(
+        self, name: str, guild_id: str, ranked: bool, size: int
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        # Keyset pagination, every query a seek in <name>_guild_rank (score
+        # descending, then rowid) or <name>_guild (rowid): the rest of the
+        # rows tied with the last score, then the rows below it
+        columns, score_column = self.MEMBER_TABLES[name]
+        select = f"SELECT user_id, {', '.join(columns)}, extra, {score_column}, rowid FROM {name} WHERE guild_id = ?"
+        ties = f"{select} AND {score_column} = ? AND rowid > ? ORDER BY rowid LIMIT ?"
+        below = f"{select} AND {score_column} < ? ORDER BY {score_column} DESC, rowid LIMIT ?"
+        after = f"{select} AND rowid > ? ORDER BY rowid LIMIT ?"
+        if ranked:
+            rows = self.connection().execute(
+                f"{select} ORDER BY {score_column} DESC, rowid LIMIT ?", (guild_id, size)
+            ).fetchall()
+        else:
+            rows = self.connection().execute(after, (guild_id, 0, size)).fetchall()
+        while rows:
+            yield [(row[0], self._record(columns, row[1:-2])) for row in rows]
+            score, rowid = rows[-1][-2:]
+            conn = self.connection()
+            if not ranked:
+                rows = conn.execute(after, (guild_id, rowid, size)).fetchall()
+                continue
+            rows = conn.execute(ties, (guild_id, score, rowid, size)).fetchall()
+            if len(rows) < size:
+                rows += conn.execute(below, (guild_id, score, size - len(rows))).fetchall()
+
+    def capture(self) -> Callable[[], Dict[str, Dict[str, Any]]]:
+        # Everything saved so far, read in one transaction: WAL readers see a
+        # consistent state without blocking the writer
+        def dump():
+            self.flush()
+            conn = self.connection()
+            data: Dict[str, Dict[str, Any]] = {name: {} for name in self.datasets}
+            conn.execute("BEGIN")
+            try:
+                for name, guild_id, value in conn.execute("SELECT dataset, guild_id, value FROM settings"):
+                    if name in data:
+                        data[name][guild_id] = json.loads(value)
+                for name, (columns, _) in self.MEMBER_TABLES.items():
+                    if name not in data:
+                        continue
+                    rows = conn.execute(f"SELECT guild_id, user_id, {', '.join(columns)}, extra FROM {name} ORDER BY rowid")
+                    for row in rows:
+                        data[name].setdefault(row[0], {})[row[1]] = self._record(columns, row[2:])
+            finally:
+                conn.execute("COMMIT")
+            return data
+        return dump
+
+    def import_dataset(self, name: str, data: Dict[str, Any]):
+        """Bulk-load a whole dataset in one transaction (used by the migrator)"""
+        conn = self.connection()
+        with conn:
+            for guild_id, value in data.items():
+                if name in self.MEMBER_TABLES:
+                    self._write_members(conn, name, guild_id, value)
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO settings (dataset, guild_id, value) VALUES (?, ?, ?)",
+                        (name, guild_id, json.dumps(value)),
+                    )
+
+    def close(self):
+        super().close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class ShardedEngine(StorageEngine):
+    """
+    guilds/<guild_id>/<dataset>.json under data_path. Nothing is read at
+    startup: a guild's file is parsed on first access and kept in the
+    per-dataset LRU of a LazyDataset, and a save rewrites only that file.
+    """
+
+    name = "sharded"
+
+    def __init__(
+        self,
+        data_path: Path,
+        writer: Optional[BackgroundWriter] = None,
+        file_format: str = "pretty",
+        columnar: bool = False,
+        cache_guilds: int = 256,
+    ):
+        super().__init__(data_path, writer)
+        self.file_format = file_format
+        self.columnar = columnar
+        self.cache_guilds = cache_guilds
+        self.guilds_path = self.data_path / "guilds"
+        self.guilds_path.mkdir(exist_ok=True)
+
+    @staticmethod
+    def shard_name(guild_id: str) -> str:
+        # Guild ids come from URLs: never let one name another directory
+        return quote(guild_id, safe="").replace(".", "%2E")
+
+    def guild_path(self, name: str, guild_id: str) -> Path:
+        return self.guilds_path / self.shard_name(guild_id) / f"{name}.json"
+
+    def load(self, name: str) -> MutableMapping[str, Any]:
+        columns = MEMBER_COLUMNS[name] if self.columnar and name in MEMBER_COLUMNS else None
+        data = LazyDataset(self, name, self.cache_guilds, columns)
+        self.datasets[name] = data
+        return data
+
+    def dirty_key(self, name: str, guild_id: Optional[str]) -> Hashable:
+        return (name, guild_id)
+
+    def save(self, name: str, guild_id: Optional[str] = None, user_ids: Optional[Iterable[str]] = None):
+        if guild_id is not None:
+            self.datasets[name].stage(guild_id)
+        super().save(name, guild_id, user_ids)
+
+    def save_many(self, name: str, guild_ids: Iterable[str]):
+        guild_ids = list(dict.fromkeys(guild_ids))
+        for guild_id in guild_ids:
+            self.datasets[name].stage(guild_id)
+        super().save_many(name, guild_ids)
+
+    def guild_ids(self, name: str) -> List[str]:
+        filename = f"{name}.json"
+        with os.scandir(self.guilds_path) as entries:
+            return [
+                unquote(entry.name) for entry in entries
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, filename))
+            ]
+
+    def read(self, name: str, guild_id: str):
+        path = self.guild_path(name, guild_id)
+        if not path.exists():
+            return _MISSING
+        value = load_json(path)
+        if self.columnar and name in MEMBER_COLUMNS:
+            return ColumnarGuild(MEMBER_COLUMNS[name], value)
+        return value
+
+    def write(self, name: str, guild_id: Optional[str] = None):
+        if guild_id is None:
+            self.write_many(name, self.datasets[name].stage_all())
+            return
+        self.write_many(name, [guild_id])
+
+    def write_many(self, name: str, guild_ids: List[str]):
+        data = self.datasets[name]
+        staged = data.staged_entries(guild_ids)
+        for guild_id, seq, value, _ in staged:
+            self._write_guild(name, guild_id, value)
+            data.unstage(guild_id, seq)
+
+    def _write_guild(self, name: str, guild_id: str, value):
+        path = self.guild_path(name, guild_id)
+        if value is _MISSING:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return
+        path.parent.mkdir(exist_ok=True)
+        value = dict(value) if isinstance(value, dict) else plain(value)
+        atomic_write(path, codec.encode(value, self.file_format))
+
+    def capture(self) -> Callable[[], Dict[str, Dict[str, Any]]]:
+        # The shard files while the writer is held back
+        def dump():
+            self.flush()
+            data: Dict[str, Dict[str, Any]] = {}
+            with self.writer.paused() if self.writer is not None else nullcontext():
+                for name in self.datasets:
+                    guilds = data[name] = {}
+                    for guild_id in self.guild_ids(name):
+                        value = self.read(name, guild_id)
+                        if value is not _MISSING:
+                            guilds[guild_id] = plain(value)
+            return data
+        return dump
+
+    def import_dataset(self, name: str, data: Dict[str, Any]):
+        """Write every guild of a whole dataset (used by the migrator)"""
+        for guild_id, value in data.items():
+            self._write_guild(name, guild_id, value)
+
+
+class ChangeFeed:
+    """
+    Cross-process change notification for a shared SqliteEngine. poll() reads
+    the `changes` rows other processes committed since the last call; apply()
+    drops the cached guilds and leaderboard indexes they touch and notifies
+    the listeners. Same poll()/apply() split as DatasetReloader. Rows older
+    than `retention` seconds are deleted; a process that fell further behind
+    invalidates everything.
+    """
+
+    TRIM_EVERY = 100
+
+    def __init__(self, engine: SqliteEngine, retention: float = 600.0):
+        self.engine = engine
+        self.names = tuple(engine.datasets)
+        self.retention = retention
+        self.last_seq = engine.last_change()
+        self.checks = 0
+        self.changes = 0
+        self.resets = 0
+        self.last_change_at: Optional[float] = None
+
+    def poll(self) -> List[Tuple[str, Optional[str], Optional[List[str]]]]:
+        self.checks += 1
+        conn = self.engine.connection()
+        if self.checks % self.TRIM_EVERY == 0:
+            with conn:
+                conn.execute("DELETE FROM changes WHERE at < ?", (time.time() - self.retention,))
+        rows = conn.execute(
+            "SELECT seq, dataset, guild_id, user_ids, origin FROM changes WHERE seq > ? ORDER BY seq",
+            (self.last_seq,),
+        ).fetchall()
+        if not rows:
+            return []
+        missed = rows[0][0] > self.last_seq + 1
+        self.last_seq = rows[-1][0]
+        if missed:
+            # Trimmed before we saw them: the extent of the changes is unknown
+            self.resets += 1
+            return [(name, None, None) for name in self.engine.datasets]
+        changed = [
+            (name, guild_id, None if user_ids is None else json.loads(user_ids))
+            for _, name, guild_id, user_ids, origin in rows
+            if origin != self.engine.origin
+        ]
+        if changed:
+            self.changes += len(changed)
+            self.last_change_at = time.time()
+        return changed
+
+    def apply(self, changed: List[Tuple[str, Optional[str], Optional[List[str]]]]):
+        for name, guild_id, user_ids in changed:
+            data = self.engine.datasets.get(name)
+            if data is None:
+                continue
+            if guild_id is None:
+                data.cache.clear()
+            else:
+                # A staged value of ours is still written over theirs
+                data.forget(guild_id)
+            if name in MEMBER_SCORES:
+                self.engine.reindex(name, guild_id)
+            self.engine.notify(name, guild_id, user_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "datasets": list(self.names),
+            "checks": self.checks,
+            "changes": self.changes,
+            "resets": self.resets,
+            "lastSeq": self.last_seq,
+            "lastChangeAt": self.last_change_at,
+        }
+
+
+ENGINES = {
+    JsonEngine.name: JsonEngine,
+    AppendLogEngine.name: AppendLogEngine,
+    SqliteEngine.name: SqliteEngine,
+    ShardedEngine.name: ShardedEngine,
+}
+
+
+def create_engine(kind: str, data_path: Path, **options) -> StorageEngine:
+    if kind not in ENGINES:
+        raise ValueError(f"Unknown storage engine '{kind}' (available: {', '.join(ENGINES)})")
+    return ENGINES[kind](data_path, **options)
+
+
+def migrate_json_to_sqlite(data_path: Path, db_file: str = "toothless.db") -> Dict[str, int]:
+    """One-shot import of the <dataset>.json files into the SQLite engine"""
+    engine = SqliteEngine(data_path, db_file=db_file)
+    counts = {}
+    try:
+        for name in DATASETS:
+            data = load_json(Path(data_path) / f"{name}.json")
+            engine.import_dataset(name, data)
+            counts[name] = len(data)
+    finally:
+        engine.close()
+    return counts
+
+
+def migrate_json_to_sharded(data_path: Path, file_format: str = "pretty") -> Dict[str, int]:
+    """One-shot split of the <dataset>.json files into per-guild files"""
+    engine = ShardedEngine(data_path, file_format=file_format)
+    counts = {}
+    for name in DATASETS:
+        data = load_json(Path(data_path) / f"{name}.json")
+        engine.import_dataset(name, data)
+        counts[name] = len(data)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Toothless dashboard storage tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate-sqlite", help="import the JSON datasets into SQLite")
+    migrate.add_argument("--data", type=Path, default=Path(__file__).parent / "data")
+    migrate.add_argument("--db-file", default="toothless.db")
+    shard = commands.add_parser("migrate-sharded", help="split the JSON datasets into per-guild files")
+    shard.add_argument("--data", type=Path, default=Path(__file__).parent / "data")
+    shard.add_argument("--format", choices=codec.FORMATS, default="pretty")
+    args = parser.parse_args()
+
+    if args.command == "migrate-sqlite":
+        counts = migrate_json_to_sqlite(args.data, args.db_file)
+    else:
+        counts = migrate_json_to_sharded(args.data, args.format)
+    for name, count in counts.items():
+        print(f"{name}: {count} guilds")
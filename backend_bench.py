@@ -0,0 +1,963 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the Toothless Dashboard backend
+Runs in-process against the modules in backend/ on synthetic guild data
+
+    python backend_bench.py --only routes --guilds 5 --members 20000 --output bench.json
+    python backend_bench.py --only routes --guilds 5 --members 20000 --baseline bench.json
+
+With --baseline the exit status is 1 when a latency or throughput metric is
+worse than the saved run by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import tempfile
+import asyncio
+import argparse
+import multiprocessing
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from rankings import RankedList  # noqa: E402
+from storage import MEMBER_SCORES  # noqa: E402
+
+
+def timed(fn, repeat=1):
+    """Best wall time of `repeat` runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def synthetic_economy(members, seed=0):
+    rng = random.Random(seed)
+    return {
+        str(10**17 + i): {"wallet": rng.randint(0, 50000), "bank": rng.randint(0, 200000), "inventory": []}
+        for i in range(members)
+    }
+
+
+def synthetic_levels(members, seed=0):
+    rng = random.Random(seed)
+    guild = {}
+    for i in range(members):
+        total_xp = rng.randint(0, 500000)
+        guild[str(10**17 + i)] = {"xp": total_xp % 1000, "level": total_xp // 5000, "totalXp": total_xp}
+    return guild
+
+
+def full_sort_top(guild, score, limit, offset=0):
+    """The pre-index leaderboard: build every entry, sort, slice"""
+    entries = [(uid, score(data)) for uid, data in guild.items()]
+    entries.sort(key=lambda x: x[1], reverse=True)
+    return [uid for uid, _ in entries[offset:offset + limit]]
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "mean_ms": statistics.fmean(ordered)}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockDiscord:
+    """
+    Minimal Discord REST API on a local uvicorn, with a fixed per-request delay.
+    With rate_limit=(limit, window_s) every (route, token) pair is a bucket
+    that answers with X-RateLimit-* headers and 429 + retry_after once spent.
+    """
+
+    def __init__(self, latency_ms=20.0, guilds=50, rate_limit=None):
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/api"
+        self.guilds = [
+            {"id": str(10**17 + i), "name": f"Guild {i}", "icon": None, "permissions": "8" if i % 2 else "0"}
+            for i in range(guilds)
+        ]
+        # Shared with the server process
+        self.hits = multiprocessing.Value("i", 0)
+        self.throttled = multiprocessing.Value("i", 0)
+        self._buckets = {}
+
+    def routes(self, method, path, body):
+        if method == "POST" and path == "/api/oauth2/token":
+            code = dict(part.split("=", 1) for part in body.decode().split("&") if "=" in part).get("code", "x")
+            return 200, {"access_token": f"token-{code}", "token_type": "Bearer", "expires_in": 604800}
+        if path == "/api/users/@me":
+            return 200, {"id": "1", "username": "bench", "discriminator": "0", "avatar": None}
+        if path == "/api/users/@me/guilds":
+            return 200, self.guilds
+        if path.startswith("/api/guilds/"):
+            guild_id = path.split("/")[3]
+            if path.endswith("/channels"):
+                return 200, [
+                    {"id": f"{guild_id}{i}", "name": f"channel-{i}", "type": 4 if i % 10 == 0 else 0, "position": i}
+                    for i in range(50)
+                ]
+            roles = [{"id": guild_id, "name": "@everyone", "color": 0, "position": 0}] + [
+                {"id": f"{guild_id}{i}", "name": f"role-{i}", "color": 0x3498DB, "position": i} for i in range(1, 20)
+            ]
+            return 200, {"id": guild_id, "name": f"Guild {guild_id}", "icon": None, "roles": roles,
+                         "approximate_member_count": 1000}
+        return 404, {"message": "404: Not Found", "code": 0}
+
+    def limit(self, scope):
+        """(status override, rate limit headers) for this request"""
+        if self.rate_limit is None:
+            return None, []
+        limit, window = self.rate_limit
+        auth = dict(scope["headers"]).get(b"authorization", b"")
+        key = (scope["method"], scope["path"], auth)
+        now = time.monotonic()
+        start, used = self._buckets.get(key, (now, 0))
+        if now - start >= window:
+            start, used = now, 0
+        reset_after = window - (now - start)
+        headers = [
+            (b"x-ratelimit-limit", str(limit).encode()),
+            (b"x-ratelimit-remaining", str(max(limit - used - 1, 0)).encode()),
+            (b"x-ratelimit-reset-after", f"{reset_after:.3f}".encode()),
+            (b"x-ratelimit-bucket", f"{scope['method']}{scope['path']}".encode()),
+        ]
+        if used >= limit:
+            with self.throttled.get_lock():
+                self.throttled.value += 1
+            return {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}, headers
+        self._buckets[key] = (start, used + 1)
+        return None, headers
+
+    async def app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        with self.hits.get_lock():
+            self.hits.value += 1
+        await asyncio.sleep(self.latency)
+        limited, headers = self.limit(scope)
+        status, payload = (429, limited) if limited else self.routes(scope["method"], scope["path"], body)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")] + headers})
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+    def serve(self):
+        import uvicorn
+        uvicorn.run(self.app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="off", interface="asgi3")
+
+    def __enter__(self):
+        # Separate process, so the mock does not share the GIL with the code under test
+        self._process = multiprocessing.get_context("fork").Process(target=self.serve, daemon=True)
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.02)
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+
+def load_server(**env):
+    """Import backend/server.py with the given environment overrides"""
+    os.environ.update({k: str(v) for k, v in env.items()})
+    # Never touch backend/data: benchmarks persist to a throwaway folder
+    os.environ.setdefault("DATA_PATH", tempfile.mkdtemp(prefix="toothless-bench-"))
+    import server
+    return server
+
+
+# Metrics where a higher value is better; every other *_ms / *_us is a latency
+HIGHER_IS_BETTER = ("throughput_rps", "speedup", "load_speedup", "memory_ratio", "batched_events_per_s",
+                    "acquire_ops_per_s", "lookup_keys_per_s")
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """Metrics that got worse than the baseline by more than `tolerance` (relative)"""
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        for metric, value in result.items():
+            before = old.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or before <= 0:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change = (before - value) / before
+            elif metric.endswith(("_ms", "_us")):
+                change = (value - before) / before
+            else:
+                continue
+            if change > tolerance:
+                regressions.append({"name": result["name"], "metric": metric,
+                                    "baseline": before, "current": value, "change": change})
+    return regressions
+
+
+class ToothlessBenchmark:
+    def __init__(self, members=100000, seed=0, guilds=5, requests=500, concurrency=20):
+        self.members = members
+        self.seed = seed
+        self.guilds = guilds
+        self.requests = requests
+        self.concurrency = concurrency
+        self.results = []
+
+    def log_result(self, name, **metrics):
+        """Record one benchmark result"""
+        self.results.append({"name": name, **metrics})
+        details = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+        print(f"⏱️  {name}")
+        print(f"    {details}")
+
+    def bench_leaderboard(self):
+        """Full sort per request vs incrementally maintained RankedList"""
+        for dataset, make in (("economy", synthetic_economy), ("levels", synthetic_levels)):
+            guild = make(self.members, self.seed)
+            score = MEMBER_SCORES[dataset]
+
+            build_ms = timed(lambda: RankedList((uid, score(r)) for uid, r in guild.items()))
+            index = RankedList((uid, score(r)) for uid, r in guild.items())
+            assert index.slice(0, 20) == full_sort_top(guild, score, 20)
+            assert index.slice(self.members // 2, 20) == full_sort_top(guild, score, 20, self.members // 2)
+
+            sort_ms = timed(lambda: full_sort_top(guild, score, 20), repeat=3)
+            top_ms = timed(lambda: index.slice(0, 20), repeat=100)
+            page_ms = timed(lambda: index.slice(self.members // 2, 20), repeat=100)
+
+            rng = random.Random(self.seed)
+            user_ids = list(guild)
+            probes = [rng.choice(user_ids) for _ in range(1000)]
+            rank_us = timed(lambda: [index.rank(uid) for uid in probes]) / len(probes) * 1000
+            updates = 10000
+            start = time.perf_counter()
+            for _ in range(updates):
+                index.update(rng.choice(user_ids), rng.randint(0, 250000))
+            update_us = (time.perf_counter() - start) / updates * 1e6
+
+            self.log_result(
+                f"{dataset} leaderboard top-20",
+                members=self.members,
+                full_sort_ms=sort_ms,
+                index_top_ms=top_ms,
+                index_page_mid_ms=page_ms,
+                index_build_ms=build_ms,
+                index_update_us=update_us,
+                index_rank_us=rank_us,
+                speedup=sort_ms / max(top_ms, 1e-6),
+            )
+
+    def bench_login(self, logins=200, concurrency=10, latency_ms=20.0):
+        """OAuth callback: per-login client + sequential fetches vs pooled client + concurrent fetches"""
+        import httpx
+
+        with MockDiscord(latency_ms=latency_ms) as mock:
+            server = load_server(CLIENT_ID="bench", CLIENT_SECRET="bench", DISCORD_API_URL=mock.base_url)
+            # Pooling and concurrency only: no response cache
+            server.discord = server.DiscordClient(base_url=mock.base_url)
+            server.DISCORD_CACHE_TTL = 0
+
+            async def legacy_login():
+                # The original auth_callback flow
+                async with httpx.AsyncClient() as client:
+                    token = (await client.post(f"{mock.base_url}/oauth2/token", data={"code": "x"})).json()
+                    headers = {"Authorization": f"Bearer {token['access_token']}"}
+                    await client.get(f"{mock.base_url}/users/@me", headers=headers)
+                    await client.get(f"{mock.base_url}/users/@me/guilds", headers=headers)
+
+            async def run(login):
+                samples = []
+                semaphore = asyncio.Semaphore(concurrency)
+
+                async def one():
+                    async with semaphore:
+                        start = time.perf_counter()
+                        await login()
+                        samples.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(logins)))
+                return samples, logins / (time.perf_counter() - start)
+
+            async def main():
+                legacy, legacy_rps = await run(legacy_login)
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as api:
+                    async def pooled_login():
+                        response = await api.post("/api/auth/callback", json={"code": "x"})
+                        assert response.status_code == 200, response.text
+                    await pooled_login()
+                    pooled, pooled_rps = await run(pooled_login)
+                await server.discord.close()
+                return legacy, legacy_rps, pooled, pooled_rps
+
+            legacy, legacy_rps, pooled, pooled_rps = asyncio.run(main())
+
+        self.log_result("login (legacy: new client, sequential)", logins=logins, mock_latency_ms=latency_ms,
+                        throughput_rps=legacy_rps, **percentiles(legacy))
+        self.log_result("login (pooled client, concurrent fetches)", logins=logins, mock_latency_ms=latency_ms,
+                        throughput_rps=pooled_rps, **percentiles(pooled))
+
+    def bench_discord_spike(self, users=20, reloads=5, latency_ms=20.0, rate_limit=(20, 1.0)):
+        """Login/reload spike against a rate-limited mock: no failures, few upstream calls"""
+        import httpx
+
+        with MockDiscord(latency_ms=latency_ms, rate_limit=rate_limit) as mock:
+            server = load_server(CLIENT_ID="bench", CLIENT_SECRET="bench", DISCORD_API_URL=mock.base_url)
+            server.discord = server.DiscordClient(base_url=mock.base_url)
+            server.DISCORD_CACHE_TTL = 60
+
+            async def main():
+                samples, failures = [], 0
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as api:
+                    async def login(user):
+                        nonlocal failures
+                        start = time.perf_counter()
+                        response = await api.post("/api/auth/callback", json={"code": f"user{user}"})
+                        samples.append((time.perf_counter() - start) * 1000)
+                        failures += response.status_code != 200
+
+                    start = time.perf_counter()
+                    await asyncio.gather(*(login(u) for u in range(users) for _ in range(reloads)))
+                    elapsed = time.perf_counter() - start
+                await server.discord.close()
+                return samples, failures, elapsed
+
+            samples, failures, elapsed = asyncio.run(main())
+            stats = dict(server.discord.stats)
+            self.log_result(
+                "discord login spike (rate-limited mock)",
+                logins=users * reloads,
+                failures=failures,
+                upstream_requests=mock.hits.value,
+                upstream_429=mock.throttled.value,
+                cache_hits=server.discord.cache.hits,
+                coalesced=stats["coalesced"],
+                queued_s=stats["queuedSeconds"],
+                throughput_rps=users * reloads / elapsed,
+                **percentiles(samples),
+            )
+
+    def bench_routes(self, latency_ms=20.0):
+        """Every API route in-process (ASGI transport): throughput and latency percentiles"""
+        import httpx
+
+        with MockDiscord(latency_ms=latency_ms) as mock:
+            server = load_server(CLIENT_ID="bench", CLIENT_SECRET="bench", DISCORD_API_URL=mock.base_url)
+            server.discord = server.DiscordClient(base_url=mock.base_url)
+            # Guild metadata comes from the mock through the SWR cache
+            server.TOKEN = "bench"
+
+            rng = random.Random(self.seed)
+            guild_ids = [str(10**17 + i) for i in range(self.guilds)]
+            members = {}
+            for i, guild_id in enumerate(guild_ids):
+                server.economy_data[guild_id] = synthetic_economy(self.members, self.seed + i)
+                server.levels_data[guild_id] = synthetic_levels(self.members, self.seed + i)
+                members[guild_id] = list(server.economy_data[guild_id])
+                server.storage.save("economy", guild_id)
+                server.storage.save("levels", guild_id)
+            server.flush_storage()
+
+            guild = lambda: rng.choice(guild_ids)
+            member = lambda guild_id: rng.choice(members[guild_id])
+            page = lambda: rng.randrange(0, max(self.members - 100, 1))
+            settings = {
+                "welcomer": lambda: {"enabled": True, "channelId": str(rng.randrange(10**17)), "message": "Hi {user}"},
+                "log": lambda: {"enabled": rng.random() < 0.5, "channelId": str(rng.randrange(10**17))},
+                "tickets": lambda: {"enabled": True, "categoryId": str(rng.randrange(10**17))},
+                "levels": lambda: {"enabled": True, "announceChannelId": "", "xpPerMessage": {"min": 15, "max": 25}},
+            }
+
+            def batch():
+                items = [
+                    {"guild_id": guild(), "section": section, "settings": make()}
+                    for section, make in settings.items() for _ in range(5)
+                ]
+                return "/api/guilds/settings/batch", {"json": {"items": items}}
+
+            def rank(board):
+                def request():
+                    guild_id = guild()
+                    return f"/api/guild/{guild_id}/{board}/rank/{member(guild_id)}?neighbours=3", {}
+                return request
+
+            def ingest():
+                guild_id = guild()
+                events = [
+                    {"guild_id": guild_id, "user_id": member(guild_id), "xp_delta": rng.randint(15, 25),
+                     "wallet_delta": rng.randint(0, 10)}
+                    for _ in range(100)
+                ]
+                return "/api/ingest/events", {"json": {"events": events}}
+
+            cooldown_keys = [f"work:{rng.randrange(10**17)}" for _ in range(1000)]
+
+            etags = {}
+
+            def conditional():
+                guild_id = guild()
+                return f"/api/guild/{guild_id}", {"headers": {"If-None-Match": etags.get(guild_id, "")}}
+
+            # (label, method, share of --requests, request factory). Not run:
+            # GET /api/guild/{id}/events, a stream that never ends by itself
+            routes = [
+                ("GET /api/health", "GET", 1, lambda: ("/api/health", {})),
+                ("GET /api/storage/reloads", "GET", 1, lambda: ("/api/storage/reloads", {})),
+                ("GET /api/auth/discord", "GET", 1, lambda: ("/api/auth/discord", {})),
+                ("GET /api/bot/info", "GET", 1, lambda: ("/api/bot/info", {})),
+                ("GET /api/bot/commands", "GET", 1, lambda: ("/api/bot/commands", {})),
+                ("GET /api/bot/invite", "GET", 1, lambda: ("/api/bot/invite", {})),
+                ("GET /api/guild/{id}", "GET", 1, lambda: (f"/api/guild/{guild()}", {})),
+                ("GET /api/guild/{id} (If-None-Match)", "GET", 1, conditional),
+                ("GET /api/guild/{id}/economy/leaderboard", "GET", 1,
+                 lambda: (f"/api/guild/{guild()}/economy/leaderboard?offset={page()}&limit=100", {})),
+                ("GET /api/guild/{id}/levels/leaderboard", "GET", 1,
+                 lambda: (f"/api/guild/{guild()}/levels/leaderboard?offset={page()}&limit=100", {})),
+                ("GET /api/guild/{id}/economy/rank/{user}", "GET", 1, rank("economy")),
+                ("GET /api/guild/{id}/levels/rank/{user}", "GET", 1, rank("levels")),
+                ("GET /api/guild/{id}/economy/export", "GET", 0.01,
+                 lambda: (f"/api/guild/{guild()}/economy/export?format=csv", {})),
+                ("GET /api/guild/{id}/stats", "GET", 1, lambda: (f"/api/guild/{guild()}/stats", {})),
+                ("GET /api/live/stats", "GET", 1, lambda: ("/api/live/stats", {})),
+                ("POST /api/ingest/events (100 events)", "POST", 0.2, ingest),
+                ("POST /api/cooldowns/acquire", "POST", 1,
+                 lambda: ("/api/cooldowns/acquire", {"json": {"key": rng.choice(cooldown_keys), "ttl": 60}})),
+                ("POST /api/cooldowns/lookup (100 keys)", "POST", 1,
+                 lambda: ("/api/cooldowns/lookup", {"json": {"keys": rng.sample(cooldown_keys, 100)}})),
+                ("DELETE /api/cooldowns/{key}", "DELETE", 1,
+                 lambda: (f"/api/cooldowns/{rng.choice(cooldown_keys)}", {})),
+                ("GET /api/cooldowns/stats", "GET", 1, lambda: ("/api/cooldowns/stats", {})),
+                ("GET /api/snapshots", "GET", 1, lambda: ("/api/snapshots", {})),
+                ("POST /api/snapshots", "POST", 0.01, lambda: ("/api/snapshots", {})),
+                ("GET /api/metrics", "GET", 0.2, lambda: ("/api/metrics", {})),
+                *[
+                    (f"POST /api/guild/{{id}}/{section}", "POST", 1,
+                     lambda section=section, make=make: (f"/api/guild/{guild()}/{section}", {"json": make()}))
+                    for section, make in settings.items()
+                ],
+                ("POST /api/guilds/settings/batch (20 items)", "POST", 0.2, batch),
+                ("POST /api/auth/callback", "POST", 0.2,
+                 lambda: ("/api/auth/callback", {"json": {"code": f"user{rng.randrange(50)}"}})),
+                # Last: every following GET /api/guild/{id} refetches from the mock
+                ("DELETE /api/guild/{id}/cache", "DELETE", 0.2, lambda: (f"/api/guild/{guild()}/cache", {})),
+            ]
+
+            async def drive(api, method, make, count):
+                samples, errors = [], 0
+                semaphore = asyncio.Semaphore(self.concurrency)
+
+                async def one():
+                    nonlocal errors
+                    path, kwargs = make()
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await api.request(method, path, **kwargs)
+                        samples.append((time.perf_counter() - start) * 1000)
+                    errors += response.status_code >= 400
+
+                start = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(count)))
+                return samples, errors, count / (time.perf_counter() - start)
+
+            async def main():
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as api:
+                    for guild_id in guild_ids:
+                        etags[guild_id] = (await api.get(f"/api/guild/{guild_id}")).headers.get("etag", "")
+                    for label, method, share, make in routes:
+                        count = max(int(self.requests * share), 1)
+                        # Warm caches and indexes outside the measurement
+                        path, kwargs = make()
+                        await api.request(method, path, **kwargs)
+                        samples, errors, rps = await drive(api, method, make, count)
+                        self.log_result(f"route {label}", requests=count, concurrency=self.concurrency,
+                                        errors=errors, throughput_rps=rps, **percentiles(samples))
+
+                    # Reads while settings are being written
+                    by_label = {route[0]: route for route in routes}
+                    reads = [by_label[label] for label in (
+                        "GET /api/guild/{id}", "GET /api/guild/{id}/economy/leaderboard",
+                        "GET /api/guild/{id}/economy/rank/{user}",
+                    )]
+                    writes = [route for route in routes if route[0].startswith("POST /api/guild/{id}/")]
+                    count = self.requests
+                    start = time.perf_counter()
+                    results = await asyncio.gather(
+                        *(drive(api, method, make, count // len(reads)) for _, method, _, make in reads),
+                        *(drive(api, method, make, count // len(writes)) for _, method, _, make in writes),
+                    )
+                    samples = [sample for result in results for sample in result[0]]
+                    self.log_result("route mix (reads + concurrent settings writes)", requests=len(samples),
+                                    concurrency=self.concurrency * len(results),
+                                    errors=sum(result[1] for result in results),
+                                    throughput_rps=len(samples) / (time.perf_counter() - start),
+                                    **percentiles(samples))
+                await server.discord.close()
+
+            asyncio.run(main())
+            server.flush_storage()
+
+    def bench_ingest(self, events=20000, batch_size=1000, legacy_events=50):
+        """XP/economy events: bot-style full levels.json rewrite per event vs batched /api/ingest/events"""
+        import httpx
+
+        server = load_server()
+        rng = random.Random(self.seed)
+        guild_ids = [str(2 * 10**17 + i) for i in range(self.guilds)]
+        members = {}
+        for i, guild_id in enumerate(guild_ids):
+            server.economy_data[guild_id] = synthetic_economy(self.members, self.seed + i)
+            server.levels_data[guild_id] = synthetic_levels(self.members, self.seed + i)
+            members[guild_id] = list(server.levels_data[guild_id])
+            server.storage.save("economy", guild_id)
+            server.storage.save("levels", guild_id)
+        server.flush_storage()
+
+        def event():
+            guild_id = rng.choice(guild_ids)
+            return {"guild_id": guild_id, "user_id": rng.choice(members[guild_id]),
+                    "xp_delta": rng.randint(15, 25), "wallet_delta": rng.randint(0, 50)}
+
+        # What messageCreate.js does per message: update one member, then
+        # saveJSON('levels.json') of every guild
+        levels = {guild_id: dict(server.levels_data[guild_id]) for guild_id in guild_ids}
+        path = Path(tempfile.mkdtemp(prefix="toothless-ingest-")) / "levels.json"
+        start = time.perf_counter()
+        for _ in range(legacy_events):
+            e = event()
+            record = dict(levels[e["guild_id"]][e["user_id"]])
+            record["xp"] += e["xp_delta"]
+            record["totalXp"] += e["xp_delta"]
+            levels[e["guild_id"]][e["user_id"]] = record
+            path.write_text(json.dumps(levels, indent=2))
+        legacy_eps = legacy_events / (time.perf_counter() - start)
+        shutil.rmtree(path.parent, ignore_errors=True)
+
+        batches = [[event() for _ in range(batch_size)] for _ in range(max(events // batch_size, 1))]
+
+        async def main():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as api:
+                samples, level_ups = [], 0
+                start = time.perf_counter()
+                for batch in batches:
+                    sent = time.perf_counter()
+                    response = await api.post("/api/ingest/events", json={"events": batch})
+                    samples.append((time.perf_counter() - sent) * 1000)
+                    level_ups += len(response.json()["levelUps"])
+                # Include persisting the last batch
+                await asyncio.to_thread(server.flush_storage)
+                return samples, level_ups, time.perf_counter() - start
+
+        samples, level_ups, elapsed = asyncio.run(main())
+        batched_eps = len(batches) * batch_size / elapsed
+        self.log_result(
+            "event ingestion (per-event rewrite vs batched endpoint)",
+            guilds=self.guilds,
+            members=self.members * self.guilds,
+            batch_size=batch_size,
+            legacy_events_per_s=legacy_eps,
+            batched_events_per_s=batched_eps,
+            level_ups=level_ups,
+            speedup=batched_eps / max(legacy_eps, 1e-6),
+            **{f"batch_{key}": value for key, value in percentiles(samples).items()},
+        )
+
+    def bench_codec(self, guilds=10):
+        """Dataset load/dump per on-disk format and response encoding, stdlib vs codec.py"""
+        import codec
+        from fastapi.responses import JSONResponse
+
+        members = max(self.members // guilds, 1)
+        economy = {str(g): synthetic_economy(members, self.seed + g) for g in range(guilds)}
+        legacy_text = json.dumps(economy, indent=2)
+        legacy_load_ms = timed(lambda: json.loads(legacy_text), repeat=3)
+        self.log_result(
+            "dataset stdlib json (indent=2)",
+            members=members * guilds,
+            dump_ms=timed(lambda: json.dumps(economy, indent=2), repeat=3),
+            load_ms=legacy_load_ms,
+            size_mb=len(legacy_text.encode()) / 1e6,
+        )
+        for fmt in codec.FORMATS:
+            if fmt == "msgpack" and codec.msgpack is None:
+                print("⏭️  msgpack not installed, skipping that format")
+                continue
+            blob = codec.encode(economy, fmt)
+            assert codec.loads(blob) == economy
+            load_ms = timed(lambda: codec.loads(blob), repeat=3)
+            self.log_result(
+                f"dataset codec {fmt}",
+                members=members * guilds,
+                orjson=codec.orjson is not None,
+                dump_ms=timed(lambda: codec.encode(economy, fmt), repeat=3),
+                load_ms=load_ms,
+                size_mb=len(blob) / 1e6,
+                load_speedup=legacy_load_ms / max(load_ms, 1e-6),
+            )
+
+        score = MEMBER_SCORES["economy"]
+        guild = economy["0"]
+        page = {"leaderboard": [
+            {"userId": uid, "total": score(r), "wallet": r["wallet"], "bank": r["bank"]}
+            for uid in full_sort_top(guild, score, 100)
+            for r in (guild[uid],)
+        ]}
+        renders = 2000
+        stdlib_us = timed(lambda: [JSONResponse(page) for _ in range(renders)]) / renders * 1000
+        fast_us = timed(lambda: [codec.FastJSONResponse(page) for _ in range(renders)]) / renders * 1000
+        self.log_result(
+            "response encoding (leaderboard page of 100)",
+            jsonresponse_us=stdlib_us,
+            fastjsonresponse_us=fast_us,
+            speedup=stdlib_us / max(fast_us, 1e-6),
+        )
+
+    def bench_memory(self):
+        """Dict-per-member vs columnar layout: memory, build time, aggregates"""
+        import gc
+        import tracemalloc
+        from columnar import MEMBER_COLUMNS, SCORE_COLUMNS, ColumnarGuild
+
+        for dataset, make in (("economy", synthetic_economy), ("levels", synthetic_levels)):
+            gc.collect()
+            tracemalloc.start()
+            guild = make(self.members, self.seed)
+            dict_mb = tracemalloc.get_traced_memory()[0] / 1e6
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            columnar = ColumnarGuild(MEMBER_COLUMNS[dataset], guild)
+            build_ms = (time.perf_counter() - start) * 1000
+            del columnar
+            gc.collect()
+            tracemalloc.start()
+            columnar = ColumnarGuild(MEMBER_COLUMNS[dataset], guild)
+            columnar_mb = tracemalloc.get_traced_memory()[0] / 1e6
+            tracemalloc.stop()
+
+            score = MEMBER_SCORES[dataset]
+            column = SCORE_COLUMNS[dataset][-1]
+            assert columnar.scores(SCORE_COLUMNS[dataset]) == [(uid, score(r)) for uid, r in guild.items()]
+            dict_sum_ms = timed(lambda: sum(r.get(column, 0) for r in guild.values()), repeat=3)
+            columnar_sum_ms = timed(lambda: columnar.total(column), repeat=3)
+            self.log_result(
+                f"{dataset} member store",
+                members=self.members,
+                dict_mb=dict_mb,
+                columnar_mb=columnar_mb,
+                memory_ratio=dict_mb / max(columnar_mb, 1e-6),
+                columnar_build_ms=build_ms,
+                dict_sum_ms=dict_sum_ms,
+                columnar_sum_ms=columnar_sum_ms,
+            )
+
+    def bench_startup(self, guilds=1000):
+        """Cold start: eager load of the monolithic JSON files vs the sharded layout"""
+        import gc
+        import tracemalloc
+        import codec
+        from storage import DATASETS, JsonEngine, ShardedEngine, migrate_json_to_sharded
+
+        members = max(self.members // guilds, 1)
+        path = Path(tempfile.mkdtemp(prefix="toothless-startup-"))
+        settings = {"enabled": True, "channelId": "123456789012345678", "message": "Welcome {user}!"}
+        for name in DATASETS:
+            if name == "economy":
+                data = {str(g): synthetic_economy(members, self.seed + g) for g in range(guilds)}
+            elif name == "levels":
+                data = {str(g): synthetic_levels(members, self.seed + g) for g in range(guilds)}
+            else:
+                data = {str(g): dict(settings) for g in range(guilds)}
+            (path / f"{name}.json").write_bytes(codec.encode(data))
+            del data
+        start = time.perf_counter()
+        migrate_json_to_sharded(path)
+        migrate_ms = (time.perf_counter() - start) * 1000
+
+        def cold_start(engine_class, trace=False):
+            gc.collect()
+            if trace:
+                tracemalloc.start()
+            start = time.perf_counter()
+            engine = engine_class(path)
+            datasets = {name: engine.load(name) for name in DATASETS}
+            startup_ms = (time.perf_counter() - start) * 1000
+            # First request of one guild: its settings and leaderboard
+            guild = str(guilds // 2)
+            [datasets[name].get(guild) for name in DATASETS]
+            engine.top("economy", guild, 10)
+            first_ms = (time.perf_counter() - start) * 1000 - startup_ms
+            resident_mb = 0.0
+            if trace:
+                resident_mb = tracemalloc.get_traced_memory()[0] / 1e6
+                tracemalloc.stop()
+            engine.close()
+            return startup_ms, first_ms, resident_mb
+
+        # Timings without tracemalloc, which slows every allocation down
+        eager = cold_start(JsonEngine)[:2] + cold_start(JsonEngine, trace=True)[2:]
+        lazy = cold_start(ShardedEngine)[:2] + cold_start(ShardedEngine, trace=True)[2:]
+        shutil.rmtree(path, ignore_errors=True)
+        self.log_result(
+            "cold start (json eager vs sharded lazy)",
+            guilds=guilds,
+            members=members * guilds,
+            eager_startup_ms=eager[0],
+            eager_first_guild_ms=eager[1],
+            eager_mb=eager[2],
+            sharded_startup_ms=lazy[0],
+            sharded_first_guild_ms=lazy[1],
+            sharded_mb=lazy[2],
+            migrate_ms=migrate_ms,
+            speedup=(eager[0] + eager[1]) / max(lazy[0] + lazy[1], 1e-6),
+            memory_ratio=eager[2] / max(lazy[2], 1e-6),
+        )
+
+    def bench_snapshot(self):
+        """Snapshots per engine: event loop pause, total time, size, and startup from a snapshot vs the data files"""
+        import gc
+        import codec
+        from storage import DATASETS, BackgroundWriter, create_engine
+        from snapshots import SnapshotManager, load_snapshot
+
+        economy = {str(g): synthetic_economy(self.members, self.seed + g) for g in range(self.guilds)}
+        levels = {str(g): synthetic_levels(self.members, self.seed + g) for g in range(self.guilds)}
+        files = [codec.encode(data) for data in (economy, levels)]
+        pretty = sum(len(blob) for blob in files)
+
+        async def take(manager):
+            # Longest gap between ticks of a task running alongside the snapshot
+            pause = [0.0]
+
+            async def ticker():
+                last = time.perf_counter()
+                while True:
+                    await asyncio.sleep(0)
+                    now = time.perf_counter()
+                    pause[0] = max(pause[0], now - last)
+                    last = now
+
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0)
+            info = await manager.take()
+            task.cancel()
+            return info, pause[0] * 1000
+
+        def start(kind, path, snapshot=None):
+            # What the server does at startup: load every dataset, or restore the snapshot's
+            gc.collect()
+            engine = create_engine(kind, path, writer=BackgroundWriter(max_staleness=60))
+            began = time.perf_counter()
+            restored = load_snapshot(snapshot) if snapshot is not None else {}
+            for name in DATASETS:
+                if name in restored:
+                    engine.restore(name, restored.pop(name))
+                else:
+                    engine.load(name)
+            elapsed = (time.perf_counter() - began) * 1000
+            engine.close()
+            return elapsed
+
+        for kind in ("json", "log", "sqlite", "sharded"):
+            path = Path(tempfile.mkdtemp(prefix="toothless-snapshot-"))
+            engine = create_engine(kind, path)
+            for name in DATASETS:
+                engine.load(name)
+            for name, data in (("economy", economy), ("levels", levels)):
+                for guild_id, members in data.items():
+                    engine.datasets[name][guild_id] = dict(members)
+                engine.save_many(name, list(data))
+            manager = SnapshotManager(engine, path / "snapshots", keep=1)
+            info, pause_ms = asyncio.run(take(manager))
+            snapshot = path / "snapshots" / info["file"]
+            assert load_snapshot(snapshot, ["economy"])["economy"] == economy
+            engine.close()
+            startup_ms = min(start(kind, path) for _ in range(3))
+            restore_ms = min(start(kind, path, snapshot) for _ in range(3))
+            shutil.rmtree(path, ignore_errors=True)
+            self.log_result(
+                f"snapshot ({kind} engine)",
+                members=self.members * self.guilds * 2,
+                capture_ms=info["captureMs"],
+                loop_pause_ms=pause_ms,
+                duration_ms=info["durationMs"],
+                size_mb=info["bytes"] / 1e6,
+                raw_mb=info["rawBytes"] / 1e6,
+                pretty_mb=pretty / 1e6,
+                startup_ms=startup_ms,
+                restore_ms=restore_ms,
+            )
+
+    def bench_cooldowns(self, keys=2000000, lookup_batch=100, legacy_ops=3):
+        """Cooldown store: check-and-set and lookups, then memory once every key has expired"""
+        import gc
+        import tracemalloc
+        from cooldowns import CooldownStore
+
+        path = Path(tempfile.mkdtemp(prefix="toothless-cooldowns-"))
+        now = [1.7e9]
+
+        def fill(store):
+            # One acquire per key, 1 ms of fake time apart, TTLs of a minute to a day
+            for i in range(keys):
+                store.acquire(f"work_{i % 1000}_{10**17 + i}", 60 + i % 86400)
+                now[0] += 0.001
+
+        store = CooldownStore(path / "cooldowns.log", clock=lambda: now[0])
+        start = time.perf_counter()
+        fill(store)
+        acquire_s = time.perf_counter() - start
+        sample = [f"work_{i % 1000}_{10**17 + i}" for i in range(0, keys, max(keys // 10000, 1))]
+        batches = [sample[i:i + lookup_batch] for i in range(0, len(sample), lookup_batch)]
+        start = time.perf_counter()
+        for batch in batches:
+            store.lookup(batch)
+        lookup_s = time.perf_counter() - start
+        journal_mb = (path / "cooldowns.log").stat().st_size / 1e6
+        now[0] += 2 * 86400
+        start = time.perf_counter()
+        expired = store.sweep()
+        sweep_ms = (time.perf_counter() - start) * 1000
+        store.compact()
+        compacted_kb = (path / "cooldowns.log").stat().st_size / 1e3
+        store.close()
+        (path / "cooldowns.log").unlink()
+
+        # Memory, without journal: all keys live, then after they expired
+        gc.collect()
+        tracemalloc.start()
+        store = CooldownStore(clock=lambda: now[0])
+        fill(store)
+        live_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        now[0] += 2 * 86400
+        store.sweep()
+        gc.collect()
+        expired_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del store
+
+        # The bot's cooldowns.json: read and rewritten whole on every use,
+        # expired keys included
+        legacy = {f"work_{i % 1000}_{10**17 + i}": int(1.7e12) + i for i in range(keys)}
+        legacy_path = path / "cooldowns.json"
+        legacy_path.write_text(json.dumps(legacy, indent=2))
+        del legacy
+        start = time.perf_counter()
+        for i in range(legacy_ops):
+            cooldowns = json.loads(legacy_path.read_text())
+            cooldowns[f"daily_{i}"] = int(time.time() * 1000)
+            legacy_path.write_text(json.dumps(cooldowns, indent=2))
+        legacy_s = time.perf_counter() - start
+        del cooldowns
+        shutil.rmtree(path, ignore_errors=True)
+        self.log_result(
+            "cooldowns (check-and-set, lookups, expiry)",
+            keys=keys,
+            acquire_ops_per_s=keys / acquire_s,
+            lookup_keys_per_s=len(sample) / max(lookup_s, 1e-9),
+            legacy_ops_per_s=legacy_ops / legacy_s,
+            live_mb=live_mb,
+            expired_mb=expired_mb,
+            expired=expired,
+            sweep_ms=sweep_ms,
+            journal_mb=journal_mb,
+            compacted_kb=compacted_kb,
+        )
+
+    SECTIONS = {
+        "leaderboard": bench_leaderboard,
+        "login": bench_login,
+        "discord": bench_discord_spike,
+        "codec": bench_codec,
+        "memory": bench_memory,
+        "routes": bench_routes,
+        "startup": bench_startup,
+        "ingest": bench_ingest,
+        "snapshot": bench_snapshot,
+        "cooldowns": bench_cooldowns,
+    }
+
+    def run_all(self, sections=None):
+        """Run the selected benchmark sections"""
+        print("=" * 60)
+        print("🐉 TOOTHLESS BACKEND BENCHMARKS")
+        print("=" * 60)
+        print(f"Members per guild: {self.members}")
+        print()
+        for name in sections or self.SECTIONS:
+            self.SECTIONS[name](self)
+        print("=" * 60)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=100000, help="synthetic members per guild")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", action="append", choices=sorted(ToothlessBenchmark.SECTIONS), help="sections to run")
+    parser.add_argument("--guilds", type=int, default=5, help="synthetic guilds for the routes section")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight per route")
+    parser.add_argument("--output", type=Path, help="write machine-readable results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="compare with a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs the baseline")
+    args = parser.parse_args()
+
+    bench = ToothlessBenchmark(members=args.members, seed=args.seed, guilds=args.guilds,
+                               requests=args.requests, concurrency=args.concurrency)
+    bench.run_all(args.only)
+
+    if args.output:
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "members": args.members,
+            "seed": args.seed,
+            "results": bench.results,
+        }
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare_results(bench.results, json.loads(args.baseline.read_text()), args.tolerance)
+        for r in regressions:
+            print(f"❌ {r['name']}: {r['metric']} {r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.0%})")
+        if regressions:
+            return 1
+        print(f"✅ No regression above {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
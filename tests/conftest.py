@@ -0,0 +1,87 @@
+import sys
+import importlib
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from storage import DATASETS, BackgroundWriter, create_engine  # noqa: E402
+
+
+@pytest.fixture
+def open_engine(tmp_path):
+    """Factory for engines on tmp_path; every engine opened is closed at teardown"""
+    opened = []
+
+    def factory(kind, writer=False, **options):
+        if writer:
+            options["writer"] = BackgroundWriter(max_staleness=60)
+        engine = create_engine(kind, tmp_path, **options)
+        for name in DATASETS:
+            engine.load(name)
+        close = engine.close
+
+        def close_once():
+            if engine in opened:
+                opened.remove(engine)
+                close()
+
+        engine.close = close_once
+        opened.append(engine)
+        return engine
+
+    yield factory
+    for engine in list(opened):
+        engine.close()
+
+
+@pytest.fixture
+def load_server(tmp_path, monkeypatch):
+    """
+    Factory importing a fresh backend/server.py (one "worker") with the given
+    environment, started under a TestClient; returns (module, client).
+    """
+    from fastapi.testclient import TestClient
+
+    clients = []
+
+    def factory(**env):
+        env = {"DATA_PATH": tmp_path / "data", "RELOAD_INTERVAL": 0, "TOKEN": "", **env}
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        sys.modules.pop("server", None)
+        server = importlib.import_module("server")
+        client = TestClient(server.app)
+        client.__enter__()
+        clients.append(client)
+        return server, client
+
+    yield factory
+    for client in reversed(clients):
+        client.__exit__(None, None, None)
+    sys.modules.pop("server", None)
+
+
+@pytest.fixture
+def mock_discord():
+    """
+    Routes a server's Discord calls to handler(request) -> httpx.Response;
+    returns the list the requests are recorded in.
+    """
+    import httpx
+
+    def install(server, handler):
+        requests = []
+
+        def record(request):
+            requests.append(request)
+            return handler(request)
+
+        server.discord._client = httpx.AsyncClient(
+            base_url=server.discord.base_url, transport=httpx.MockTransport(record)
+        )
+        return requests
+
+    return install
@@ -0,0 +1,41 @@
+import httpx
+
+
+def discord_oauth(request):
+    if request.url.path == "/api/oauth2/token":
+        if b"code=good" not in request.content:
+            return httpx.Response(400, json={"error_description": "Invalid code"})
+        return httpx.Response(200, json={"access_token": "user-token"})
+    assert request.headers["Authorization"] == "Bearer user-token"
+    if request.url.path == "/api/users/@me":
+        return httpx.Response(200, json={"id": "7", "username": "hiccup", "discriminator": "0", "avatar": None})
+    if request.url.path == "/api/users/@me/guilds":
+        return httpx.Response(200, json=[
+            {"id": "1", "name": "Berk", "icon": None, "permissions": "8"},
+            {"id": "2", "name": "Outcast", "icon": None, "permissions": "1024"},
+        ])
+    return httpx.Response(404, json={"message": "Unknown route"})
+
+
+def test_callback_returns_the_user_and_admin_guilds(load_server, mock_discord):
+    server, client = load_server(CLIENT_ID="id", CLIENT_SECRET="secret")
+    requests = mock_discord(server, discord_oauth)
+    response = client.post("/api/auth/callback", json={"code": "good"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "user": {"id": "7", "username": "hiccup", "discriminator": "0", "avatar": None},
+        "guilds": [{"id": "1", "name": "Berk", "icon": None, "hasBot": True}],
+        "accessToken": "user-token",
+    }
+    assert sorted(request.url.path for request in requests) == [
+        "/api/oauth2/token", "/api/users/@me", "/api/users/@me/guilds",
+    ]
+
+
+def test_callback_errors(load_server, mock_discord):
+    server, client = load_server(CLIENT_ID="id", CLIENT_SECRET="secret")
+    mock_discord(server, discord_oauth)
+    assert client.post("/api/auth/callback", json={}).status_code == 400
+    response = client.post("/api/auth/callback", json={"code": "bad"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid code"
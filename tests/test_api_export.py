@@ -0,0 +1,52 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def api(request, load_server, monkeypatch):
+    server, client = load_server(STORAGE_ENGINE=request.param)
+    # Several chunks for a small guild
+    monkeypatch.setattr(server, "EXPORT_CHUNK", 2)
+    server.storage.datasets["economy"]["1"] = {
+        str(10 + i): {"wallet": i * 7 % 5, "bank": i, "inventory": []} for i in range(5)
+    }
+    server.storage.save("economy", "1")
+    # sqlite: exported from the rows, on a thread
+    server.flush_storage()
+    return server, client
+
+
+def test_ndjson_export_is_ranked(api):
+    _, client = api
+    response = client.get("/api/guild/1/economy/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"] == 'attachment; filename="economy-1.ndjson"'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["rank"] for row in rows] == [1, 2, 3, 4, 5]
+    leaderboard = client.get("/api/guild/1/economy/leaderboard").json()["leaderboard"]
+    assert [{k: v for k, v in row.items() if k != "rank"} for row in rows] == leaderboard
+
+
+def test_csv_export_has_one_header(api):
+    _, client = api
+    response = client.get("/api/guild/1/economy/export", params={"format": "csv", "sort": "none"})
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert sorted(row["userId"] for row in rows) == ["10", "11", "12", "13", "14"]
+    assert "rank" not in rows[0]
+    assert response.text.count("userId") == 1
+
+
+def test_gzip_export(api):
+    _, client = api
+    plain = client.get("/api/guild/1/economy/export").content
+    response = client.get("/api/guild/1/economy/export", params={"gzip": True})
+    assert response.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(response.content) == plain
+
+
+def test_export_of_an_unknown_guild_is_empty(api):
+    _, client = api
+    assert client.get("/api/guild/404/levels/export").content == b""
@@ -0,0 +1,55 @@
+import httpx
+
+
+def discord_guilds(request):
+    assert request.headers["Authorization"] == "Bot bot-token"
+    if request.url.path == "/api/guilds/1":
+        return httpx.Response(200, json={
+            "id": "1", "name": "Berk", "icon": None, "approximate_member_count": 42,
+            "roles": [
+                {"id": "1", "name": "@everyone", "position": 0, "color": 0},
+                {"id": "r1", "name": "Chief", "position": 2, "color": 0xED4245},
+                {"id": "r2", "name": "Rider", "position": 1, "color": 0},
+            ],
+        })
+    if request.url.path == "/api/guilds/1/channels":
+        return httpx.Response(200, json=[
+            {"id": "c2", "name": "arena", "type": 0, "position": 2},
+            {"id": "k1", "name": "ACADEMY", "type": 4, "position": 0},
+            {"id": "c1", "name": "great-hall", "type": 5, "position": 1},
+            {"id": "v1", "name": "voice", "type": 2, "position": 3},
+        ])
+    return httpx.Response(404, json={"message": "Unknown Guild"})
+
+
+def test_guild_metadata_is_fetched_once_and_cached(load_server, mock_discord):
+    server, client = load_server(TOKEN="bot-token")
+    requests = mock_discord(server, discord_guilds)
+    guild = client.get("/api/guild/1").json()
+    assert guild["name"] == "Berk"
+    assert guild["memberCount"] == 42
+    assert guild["channels"] == [{"id": "c1", "name": "great-hall"}, {"id": "c2", "name": "arena"}]
+    assert guild["categories"] == [{"id": "k1", "name": "ACADEMY"}]
+    assert guild["roles"] == [
+        {"id": "r1", "name": "Chief", "color": "#ED4245"},
+        {"id": "r2", "name": "Rider", "color": "#000000"},
+    ]
+    assert client.get("/api/guild/1").json() == guild
+    assert len(requests) == 2
+
+    assert client.delete("/api/guild/1/cache").json() == {"success": True}
+    assert client.get("/api/guild/1").json() == guild
+    assert len(requests) == 4
+
+
+def test_unknown_guild_is_not_found(load_server, mock_discord):
+    server, client = load_server(TOKEN="bot-token")
+    mock_discord(server, discord_guilds)
+    assert client.get("/api/guild/2").status_code == 404
+
+
+def test_demo_metadata_without_a_bot_token(load_server):
+    server, client = load_server()
+    guild = client.get("/api/guild/1").json()
+    assert guild["name"] == server.DEMO_GUILD["name"]
+    assert guild["settings"] == {"welcome": None, "log": None, "tickets": None, "levels": None}
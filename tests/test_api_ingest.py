@@ -0,0 +1,58 @@
+import pytest
+
+
+def ingest(client, *events):
+    response = client.post("/api/ingest/events", json={"events": list(events)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def rank(client, board, guild_id, user_id):
+    return client.get(f"/api/guild/{guild_id}/{board}/rank/{user_id}").json()["entry"]
+
+
+@pytest.mark.parametrize("kind", ["json", "log", "sqlite", "sharded"])
+def test_ingest_levels_up_and_pays(load_server, kind):
+    server, client = load_server(STORAGE_ENGINE=kind)
+    result = ingest(
+        client,
+        {"guild_id": "1", "user_id": "7", "xp_delta": 60, "wallet_delta": 5},
+        {"guild_id": "1", "user_id": "7", "xp_delta": 60},
+        {"guild_id": "2", "user_id": "7", "xp_delta": 350, "bank_delta": -3},
+    )
+    assert result["levelUps"] == [
+        {"index": 1, "guildId": "1", "userId": "7", "previousLevel": 0, "level": 1},
+        {"index": 2, "guildId": "2", "userId": "7", "previousLevel": 0, "level": 2},
+    ]
+    assert result["updated"] == {"levels": 2, "economy": 2}
+    server.flush_storage()
+
+    _, restarted = load_server(STORAGE_ENGINE=kind)
+    entry = rank(restarted, "levels", "1", "7")
+    assert (entry["level"], entry["xp"], entry["totalXp"]) == (1, 20, 120)
+    entry = rank(restarted, "levels", "2", "7")
+    assert (entry["level"], entry["xp"], entry["totalXp"]) == (2, 50, 350)
+    assert rank(restarted, "economy", "2", "7")["bank"] == -3
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_shared_workers_add_up_their_increments(load_server, kind):
+    env = {"STORAGE_ENGINE": kind, "STORAGE_SHARED": 1, "RELOAD_INTERVAL": 3600}
+    first, first_client = load_server(**env)
+    second, second_client = load_server(**env)
+    # Both workers hold guild 1 in memory before either writes
+    ingest(second_client, {"guild_id": "1", "user_id": "9", "wallet_delta": 1})
+    second.flush_storage()
+    ingest(first_client, {"guild_id": "1", "user_id": "7", "xp_delta": 60, "wallet_delta": 10})
+    ingest(first_client, {"guild_id": "1", "user_id": "8", "wallet_delta": 1})
+    first.flush_storage()
+    # The second worker has not reloaded what the first one wrote
+    result = ingest(second_client, {"guild_id": "1", "user_id": "7", "xp_delta": 60, "wallet_delta": 10})
+    assert result["levelUps"] == [{"index": 0, "guildId": "1", "userId": "7", "previousLevel": 0, "level": 1}]
+    second.flush_storage()
+
+    _, client = load_server(STORAGE_ENGINE=kind)
+    assert rank(client, "economy", "1", "7")["wallet"] == 20
+    assert rank(client, "economy", "1", "8")["wallet"] == 1
+    assert rank(client, "economy", "1", "9")["wallet"] == 1
+    assert rank(client, "levels", "1", "7")["totalXp"] == 120
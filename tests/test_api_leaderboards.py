@@ -0,0 +1,60 @@
+import pytest
+
+ENGINES = ["json", "log", "sqlite", "sharded"]
+
+
+def member(wallet, bank=0):
+    return {"wallet": wallet, "bank": bank, "inventory": []}
+
+
+@pytest.fixture(params=ENGINES)
+def api(request, load_server):
+    server, client = load_server(STORAGE_ENGINE=request.param)
+    server.storage.datasets["economy"]["1"] = {
+        "10": member(5), "11": member(50), "12": member(20, 30), "13": member(1),
+    }
+    server.storage.save("economy", "1")
+    server.storage.datasets["levels"]["1"] = {
+        "10": {"xp": 10, "level": 1, "totalXp": 110}, "11": {"xp": 0, "level": 0, "totalXp": 0},
+    }
+    server.storage.save("levels", "1")
+    return server, client
+
+
+def test_leaderboard_pages(api):
+    _, client = api
+    page = client.get("/api/guild/1/economy/leaderboard", params={"limit": 2}).json()["leaderboard"]
+    assert page == [
+        {"userId": "11", "total": 50, "wallet": 50, "bank": 0},
+        {"userId": "12", "total": 50, "wallet": 20, "bank": 30},
+    ]
+    page = client.get("/api/guild/1/economy/leaderboard", params={"limit": 2, "offset": 2}).json()["leaderboard"]
+    assert [entry["userId"] for entry in page] == ["10", "13"]
+    levels = client.get("/api/guild/1/levels/leaderboard").json()["leaderboard"]
+    assert [entry["userId"] for entry in levels] == ["10", "11"]
+    assert client.get("/api/guild/404/economy/leaderboard").json() == {"leaderboard": []}
+
+
+def test_leaderboard_follows_member_updates(api):
+    server, client = api
+    members = server.storage.datasets["economy"]["1"]
+    members["13"] = member(100)
+    server.storage.save("economy", "1", ["13"])
+    top = client.get("/api/guild/1/economy/leaderboard", params={"limit": 1}).json()["leaderboard"]
+    assert top[0]["userId"] == "13"
+    del server.storage.datasets["economy"]["1"]["13"]
+    server.storage.save("economy", "1", ["13"])
+    server.storage.flush()
+    top = client.get("/api/guild/1/economy/leaderboard", params={"limit": 1}).json()["leaderboard"]
+    assert top[0]["userId"] == "11"
+
+
+def test_member_rank(api):
+    _, client = api
+    rank = client.get("/api/guild/1/economy/rank/12", params={"neighbours": 1}).json()
+    assert rank["rank"] == 2 and rank["members"] == 4
+    assert rank["percentile"] == round(100 * 2 / 3, 2)
+    assert [entry["userId"] for entry in rank["above"] + [rank["entry"]] + rank["below"]] == ["11", "12", "10"]
+    assert [entry["rank"] for entry in rank["above"] + rank["below"]] == [1, 3]
+    assert client.get("/api/guild/1/economy/rank/999").status_code == 404
+    assert client.get("/api/guild/1/other/rank/12").status_code == 422
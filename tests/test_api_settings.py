@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite", "sharded"])
+def test_settings_batch_saves_more_guilds_than_the_cache_holds(load_server, kind):
+    server, client = load_server(STORAGE_ENGINE=kind, CACHE_GUILDS=2)
+    items = [
+        {"guild_id": str(i), "section": section, "settings": {"enabled": True, "channelId": str(i)}}
+        for i in range(6) for section in ("log", "tickets")
+    ]
+    response = client.post("/api/guilds/settings/batch", json={"items": items})
+    assert response.status_code == 200
+    assert response.json()["saved"] == {"log": 6, "tickets": 6}
+    server.flush_storage()
+
+    _, restarted = load_server(STORAGE_ENGINE=kind, CACHE_GUILDS=2)
+    for i in range(6):
+        settings = restarted.get(f"/api/guild/{i}").json()["settings"]
+        assert settings["log"]["channelId"] == str(i)
+        assert settings["tickets"]["enabled"] is True
+
+
+def test_settings_batch_is_all_or_nothing(load_server):
+    _, client = load_server()
+    items = [
+        {"guild_id": "1", "section": "welcomer", "settings": {"message": "hi"}},
+        {"guild_id": "1", "section": "levels", "settings": {"xpPerMessage": "many"}},
+    ]
+    response = client.post("/api/guilds/settings/batch", json={"items": items})
+    assert response.status_code == 422
+    results = response.json()["detail"]["results"]
+    assert results[0]["skipped"] is True
+    assert results[1]["success"] is False
+    assert client.get("/api/guild/1").json()["settings"]["welcome"] is None
@@ -0,0 +1,49 @@
+import threading
+
+from storage import BackgroundWriter
+
+
+def test_saves_of_one_key_coalesce_into_one_write():
+    writer = BackgroundWriter(max_staleness=60)
+    calls = []
+    for i in range(5):
+        writer.mark_dirty("a", lambda i=i: calls.append(("a", i)))
+    writer.mark_dirty("b", lambda: calls.append(("b", 0)))
+    assert writer.pending == 2 and writer.coalesced == 4
+    writer.flush()
+    assert sorted(calls) == [("a", 4), ("b", 0)]
+    assert writer.pending == 0 and writer.writes == 2
+    writer.close()
+
+
+def test_close_flushes_pending_writes():
+    writer = BackgroundWriter(max_staleness=60)
+    done = threading.Event()
+    writer.mark_dirty("a", done.set)
+    writer.close()
+    assert done.is_set()
+
+
+def test_staleness_bounds_the_delay():
+    writer = BackgroundWriter(max_staleness=0.01)
+    done = threading.Event()
+    writer.mark_dirty("a", done.set)
+    assert done.wait(5)
+    writer.close()
+
+
+def test_failed_write_is_retried():
+    writer = BackgroundWriter(max_staleness=60)
+    attempts = []
+
+    def write():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("disk full")
+
+    writer.mark_dirty("a", write)
+    writer.flush()
+    assert writer.pending == 1
+    writer.flush()
+    assert len(attempts) == 2 and writer.pending == 0
+    writer.close()
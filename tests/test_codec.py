@@ -0,0 +1,26 @@
+import pytest
+
+import codec
+
+DATA = {"1": {"10": {"wallet": 5, "bank": 0, "inventory": ["égg"]}}, "2": {}}
+
+
+@pytest.mark.parametrize("fmt", codec.FORMATS)
+def test_every_format_round_trips(fmt):
+    if fmt == "msgpack" and codec.msgpack is None:
+        pytest.skip("msgpack is not installed")
+    assert codec.loads(codec.encode(DATA, fmt)) == DATA
+
+
+def test_compact_and_pretty_json():
+    assert codec.dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'.encode()
+    assert codec.dumps({"a": 1}, pretty=True) == b'{\n  "a": 1\n}'
+
+
+def test_integers_beyond_64_bits():
+    assert codec.loads(codec.dumps({"bank": 2 ** 70})) == {"bank": 2 ** 70}
+
+
+def test_invalid_json_raises_value_error():
+    with pytest.raises(ValueError):
+        codec.loads(b'{"1": ')
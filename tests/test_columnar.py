@@ -0,0 +1,136 @@
+import pytest
+
+from columnar import MEMBER_COLUMNS, ColumnarGuild
+
+ECONOMY = MEMBER_COLUMNS["economy"]
+# Not plain snowflakes: letters, past uint64, empty (and "007" below)
+ODD_IDS = ["abc", str(1 << 64), ""]
+
+
+def member(wallet, bank=0, **extra):
+    return {"wallet": wallet, "bank": bank, **extra}
+
+
+def test_set_delete_and_re_add_members():
+    guild = ColumnarGuild(ECONOMY, {"10": member(5), "007": member(7, inventory=["sword"])})
+    for user_id in ["11", "0", *ODD_IDS]:
+        guild[user_id] = member(len(user_id), 1)
+    assert guild["007"].to_dict() == member(7, inventory=["sword"])
+    assert guild["abc"]["wallet"] == 3
+    # "007" and "7" are different members
+    assert "7" not in guild
+
+    for user_id in ["10", "007", "abc", ""]:
+        del guild[user_id]
+        assert user_id not in guild
+        with pytest.raises(KeyError):
+            guild[user_id]
+    assert list(guild) == ["11", "0", str(1 << 64)]
+    assert guild.total("wallet") == 2 + 1 + 20
+
+    guild["007"] = member(70)
+    guild["10"] = {"wallet": 2.5, "bank": 1 << 70, "note": "kept as is"}
+    assert guild["007"].to_dict() == member(70)
+    assert guild["10"].to_dict() == {"wallet": 2.5, "bank": 1 << 70, "note": "kept as is"}
+    assert list(guild) == ["11", "0", str(1 << 64), "007", "10"]
+    assert len(guild) == 5
+
+
+def test_member_row_writes_through():
+    guild = ColumnarGuild(ECONOMY, {"10": member(5, inventory=[])})
+    row = guild["10"]
+    row["wallet"] += 10
+    row["inventory"] = ["shield"]
+    row["level"] = 3
+    del row["bank"]
+    assert guild["10"].to_dict() == {"wallet": 15, "inventory": ["shield"], "level": 3}
+    # Extra fields are copies: mutating one changes nothing stored
+    row["inventory"].append("bow")
+    assert row["inventory"] == ["shield"]
+    del guild["10"]
+    with pytest.raises(KeyError):
+        row["wallet"]
+
+
+def test_compaction_renumbers_rows_and_rows_follow():
+    guild = ColumnarGuild(ECONOMY)
+    for i in range(1100):
+        guild[str(i)] = member(i)
+    guild["abc"] = member(-1)
+    kept = guild["1099"]
+    odd = guild["abc"]
+    epoch = guild.epoch
+    for i in range(1025):
+        del guild[str(i)]
+    # More dead rows than live ones (and than 1024): compacted on the last delete
+    assert guild.epoch == epoch + 1
+    assert len(guild._flags) == len(guild) == 76
+    assert kept["wallet"] == 1099 and odd["wallet"] == -1
+    assert kept._epoch == guild.epoch
+    kept["bank"] = 5
+    assert guild["1099"].to_dict() == member(1099, 5)
+    assert list(guild)[:2] == ["1025", "1026"] and list(guild)[-1] == "abc"
+    assert guild.total("wallet") == sum(range(1025, 1100)) - 1
+
+    # Column reads compact the few rows deleted since
+    del guild["1025"]
+    epoch = guild.epoch
+    assert guild.column("wallet")[0] == 1026
+    assert guild.epoch == epoch + 1
+    assert guild.user_ids()[-1] == "abc"
+    assert guild.scores(["wallet", "bank"])[-2] == ("1099", 1104)
+
+
+def test_copy_is_independent():
+    guild = ColumnarGuild(ECONOMY, {"10": member(5, inventory=["sword"]), "abc": member(1)})
+    clone = guild.copy()
+    clone["10"]["wallet"] = 50
+    clone["11"] = member(11)
+    clone["xyz"] = member(2)
+    del clone["abc"]
+    assert guild.to_dict() == {"10": member(5, inventory=["sword"]), "abc": member(1)}
+    assert clone.to_dict() == {"10": member(50, inventory=["sword"]), "11": member(11), "xyz": member(2)}
+
+    guild["12"] = member(12)
+    del guild["10"]
+    assert "12" not in clone and clone["10"]["wallet"] == 50
+    assert guild.to_dict() == {"abc": member(1), "12": member(12)}
+
+
+@pytest.mark.parametrize("kind", ["json", "log", "sharded"])
+def test_endpoints_match_the_dict_store(load_server, tmp_path, kind):
+    economy = {
+        "10": member(5), "11": member(50, inventory=["sword"]), "12": member(20, 30),
+        "007": member(50), "abc": {"wallet": 3}, "13": member(1),
+    }
+    levels = {
+        "10": {"xp": 10, "level": 1, "totalXp": 110}, "abc": {"xp": 0, "level": 0, "totalXp": 0},
+        "11": {"xp": 5, "level": 2, "totalXp": 205},
+    }
+    requests = [
+        "/api/guild/1/economy/leaderboard?limit=100",
+        "/api/guild/1/economy/leaderboard?limit=2&offset=1",
+        "/api/guild/1/levels/leaderboard",
+        "/api/guild/1/stats",
+        "/api/guild/1/economy/export",
+        "/api/guild/1/economy/export?format=csv&sort=none",
+        "/api/guild/1/levels/export?format=csv",
+    ] + [f"/api/guild/1/economy/rank/{user_id}?neighbours=2" for user_id in ["10", "11", "007", "abc", "12", "13"]]
+
+    responses = {}
+    for store in ["dict", "columnar"]:
+        server, client = load_server(STORAGE_ENGINE=kind, MEMBER_STORE=store, DATA_PATH=tmp_path / store)
+        server.storage.datasets["economy"]["1"] = dict(economy)
+        server.storage.datasets["levels"]["1"] = dict(levels)
+        server.storage.save_many("economy", ["1"])
+        server.storage.save("levels", "1")
+        # Deleted and re-added: goes last in the unranked export
+        members = server.storage.datasets["economy"]["1"]
+        assert isinstance(members, ColumnarGuild) == (store == "columnar")
+        del members["12"]
+        members["12"] = member(20, 30)
+        server.storage.save("economy", "1", ["12"])
+        responses[store] = [client.get(url) for url in requests]
+
+    assert all(response.status_code == 200 for response in responses["dict"])
+    assert [r.content for r in responses["columnar"]] == [r.content for r in responses["dict"]]
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import pytest
+
+from cooldowns import CooldownStore
+
+
+class Clock:
+    def __init__(self, now=1.7e9):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def open_store(tmp_path, clock):
+    """Factory for stores on tmp_path/cooldowns.log; closed at teardown"""
+    opened = []
+
+    def factory(**options):
+        store = CooldownStore(tmp_path / "cooldowns.log", clock=clock, **options)
+        opened.append(store)
+        return store
+
+    yield factory
+    for store in opened:
+        store.close()
+
+
+def test_acquire_rejects_until_the_cooldown_ends(clock):
+    store = CooldownStore(clock=clock)
+    assert store.acquire("work_1_7", 60) == (True, 60)
+    clock.now += 20
+    assert store.acquire("work_1_7", 60) == (False, pytest.approx(40))
+    assert store.acquire("work_1_8", 60)[0]
+    clock.now += 40
+    assert store.acquire("work_1_7", 30) == (True, 30)
+    assert (store.stats["acquired"], store.stats["rejected"]) == (3, 1)
+
+
+def test_lookup_and_reset(clock):
+    store = CooldownStore(clock=clock)
+    store.acquire("daily_1_7", 86400)
+    clock.now += 400
+    assert store.lookup(["daily_1_7", "daily_1_8"]) == {"daily_1_7": pytest.approx(86000), "daily_1_8": 0.0}
+    assert store.reset("daily_1_7")
+    assert not store.reset("daily_1_7")
+    assert store.lookup(["daily_1_7"]) == {"daily_1_7": 0.0}
+    assert store.acquire("daily_1_7", 10)[0]
+
+
+def test_sweep_drops_only_the_keys_that_are_due(clock):
+    store = CooldownStore(clock=clock)
+    for i in range(100):
+        store.acquire(f"work_{i}", 10 + i)
+    # Reset and acquired again: its old bucket must not drop it
+    store.reset("work_0")
+    store.acquire("work_0", 1000)
+    clock.now += 50
+    assert store.sweep() == 40
+    assert len(store) == 60
+    assert "work_0" in store.expires and "work_41" in store.expires and "work_40" not in store.expires
+    clock.now += 100
+    assert store.sweep() == 59
+    assert list(store.expires) == ["work_0"]
+    assert store.stats["expired"] == 99
+
+
+def test_journal_is_replayed_on_restart(open_store, clock, tmp_path):
+    store = open_store()
+    store.acquire("work_1", 60)
+    store.acquire("work_2", 600)
+    store.acquire("work_3", 600)
+    store.reset("work_3")
+    store.close()
+    clock.now += 100
+    with open(tmp_path / "cooldowns.log", "ab") as f:
+        f.write(b'["work_4", 17')
+    reopened = open_store()
+    assert reopened.expires == {"work_2": pytest.approx(clock.now + 500)}
+    # The torn line was cut off: the next change starts a line of its own
+    reopened.acquire("work_5", 60)
+    reopened.close()
+    assert set(open_store().expires) == {"work_2", "work_5"}
+
+
+def test_journal_is_compacted_to_the_live_keys(open_store, clock, tmp_path):
+    store = open_store(compact_min=10, compact_ratio=2)
+    for i in range(200):
+        store.acquire(f"work_{i % 5}", 1)
+        clock.now += 1
+    assert store.stats["compactions"] > 0
+    assert len((tmp_path / "cooldowns.log").read_bytes().splitlines()) <= 10
+    store.acquire("daily_1", 3600)
+    store.compact()
+    assert (tmp_path / "cooldowns.log").read_bytes().count(b"\n") == 1
+    store.close()
+    assert set(open_store().expires) == {"daily_1"}
+
+
+def test_shared_stores_see_each_other(open_store, clock):
+    first = open_store(shared=True)
+    second = open_store(shared=True)
+    assert first.acquire("work_1", 60)[0]
+    assert second.acquire("work_1", 60) == (False, 60)
+    assert second.reset("work_1")
+    assert first.lookup(["work_1"]) == {"work_1": 0.0}
+    first.acquire("work_2", 60)
+    # Compacted by the second store: the first one follows the new journal
+    second.compact()
+    second.acquire("work_3", 60)
+    assert first.lookup(["work_2", "work_3"]) == {"work_2": 60, "work_3": 60}
+    assert first.acquire("work_3", 60)[0] is False
+
+
+def test_acquire_is_atomic_across_threads(tmp_path, clock):
+    class SlowStore(CooldownStore):
+        # Widens the window between the check and the set
+        def _set(self, key, expires):
+            time.sleep(0.005)
+            super()._set(key, expires)
+
+    store = SlowStore(tmp_path / "cooldowns.log", clock=clock)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.acquire("work_1", 60)[0])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False] * 7 + [True]
+    assert store.stats["acquired"] == 1
+    store.close()
+
+
+def test_cooldown_endpoints(load_server, tmp_path):
+    _, client = load_server(COOLDOWN_BATCH_MAX=2)
+    acquire = {"key": "work_1_7", "ttl": 60}
+    assert client.post("/api/cooldowns/acquire", json=acquire).json() == {
+        "key": "work_1_7", "acquired": True, "remaining": 60,
+    }
+    second = client.post("/api/cooldowns/acquire", json=acquire).json()
+    assert not second["acquired"] and 0 < second["remaining"] <= 60
+    assert client.post("/api/cooldowns/acquire", json={"key": "work_1_7", "ttl": 0}).status_code == 422
+
+    cooldowns = client.post("/api/cooldowns/lookup", json={"keys": ["work_1_7", "work_1_8"]}).json()["cooldowns"]
+    assert cooldowns["work_1_8"] == 0 and cooldowns["work_1_7"] > 0
+    assert client.post("/api/cooldowns/lookup", json={"keys": ["a", "b", "c"]}).status_code == 413
+
+    assert client.delete("/api/cooldowns/work_1_7").json() == {"key": "work_1_7", "reset": True}
+    assert client.delete("/api/cooldowns/work_1_7").json()["reset"] is False
+    stats = client.get("/api/cooldowns/stats").json()
+    assert (stats["active"], stats["acquired"], stats["rejected"], stats["resets"]) == (0, 1, 1, 1)
+
+    # The journal outlives the worker
+    client.post("/api/cooldowns/acquire", json={"key": "daily_1_7", "ttl": 3600})
+    _, restarted = load_server(COOLDOWN_BATCH_MAX=2)
+    assert restarted.post("/api/cooldowns/acquire", json={"key": "daily_1_7", "ttl": 3600}).json()["acquired"] is False
@@ -0,0 +1,141 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from discord_client import DiscordAPIError, DiscordClient, route_key
+
+
+def run(handler, scenario):
+    """Runs scenario(client) against a client whose calls go to handler; returns its result"""
+    async def main():
+        client = DiscordClient(base_url="https://discord.test/api")
+        client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(main())
+
+
+def test_rate_limited_requests_are_retried():
+    responses = [
+        httpx.Response(429, json={"retry_after": 0.01, "global": False}),
+        httpx.Response(200, json={"id": "1"}),
+    ]
+    result = run(lambda request: responses.pop(0), lambda client: client.get_json("/users/@me", "Bot t"))
+    assert result == {"id": "1"}
+    assert not responses
+
+
+def test_requests_wait_for_an_exhausted_bucket():
+    headers = {"X-RateLimit-Limit": "1", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.1"}
+    sent = []
+
+    def handler(request):
+        sent.append(time.monotonic())
+        return httpx.Response(200, json={}, headers=headers)
+
+    async def scenario(client):
+        for _ in range(2):
+            await client.request("GET", "/gateway", authorization="Bot t")
+        return client.stats
+
+    stats = run(handler, scenario)
+    assert sent[1] - sent[0] >= 0.09
+    assert stats["rateLimited"] == 0
+
+
+def test_concurrent_identical_gets_share_one_request():
+    sent = []
+
+    async def handler(request):
+        sent.append(request.url.path)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"id": "1"})
+
+    async def scenario(client):
+        results = await asyncio.gather(*(client.get_json("/guilds/1", "Bot t") for _ in range(5)))
+        return results, client.stats["coalesced"]
+
+    results, coalesced = run(handler, scenario)
+    assert results == [{"id": "1"}] * 5
+    assert sent == ["/api/guilds/1"]
+    assert coalesced == 4
+
+
+def test_ttl_cache_is_per_token():
+    sent = []
+
+    def handler(request):
+        sent.append(request.headers["Authorization"])
+        return httpx.Response(200, json={"id": request.headers["Authorization"]})
+
+    async def scenario(client):
+        first = await client.get_user("/users/@me", "a", ttl=60)
+        again = await client.get_user("/users/@me", "a", ttl=60)
+        other = await client.get_user("/users/@me", "b", ttl=60)
+        client.invalidate("/users/@me", "Bearer a")
+        await client.get_user("/users/@me", "a", ttl=60)
+        return first, again, other
+
+    first, again, other = run(handler, scenario)
+    assert first == again == {"id": "Bearer a"}
+    assert other == {"id": "Bearer b"}
+    assert sent == ["Bearer a", "Bearer b", "Bearer a"]
+
+
+def test_errors_are_raised_and_not_cached():
+    statuses = [403, 200]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), json={"message": "Missing Access"})
+
+    async def scenario(client):
+        with pytest.raises(DiscordAPIError) as error:
+            await client.get_json("/guilds/1", "Bot t", ttl=60)
+        assert error.value.status_code == 403
+        return await client.get_json("/guilds/1", "Bot t", ttl=60)
+
+    assert run(handler, scenario) == {"message": "Missing Access"}
+
+
+def test_routes_are_keyed_on_the_major_parameter():
+    assert route_key("GET", "/guilds/123?with_counts=true") == "GET /guilds/123"
+    assert route_key("GET", "/guilds/123/members/456") == "GET /guilds/123/members/{id}"
+    assert route_key("PATCH", "/channels/9/messages/8") == "PATCH /channels/9/messages/{id}"
+    assert route_key("GET", "/users/@me/guilds") == "GET /users/@me/guilds"
+    assert route_key("GET", "/users/456") == "GET /users/{id}"
+
+
+def test_idle_buckets_are_bounded():
+    headers = {"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": "4", "X-RateLimit-Reset-After": "0"}
+
+    async def scenario(client):
+        client.max_buckets = 10
+        # One login per token, each with its own buckets
+        for i in range(50):
+            await client.request("GET", f"/users/@me/guilds?after={i}", authorization=f"Bearer {i}")
+            await client.request("GET", f"/guilds/{i}", authorization="Bot t")
+        return client
+
+    client = run(lambda request: httpx.Response(200, json={}, headers=headers), scenario)
+    assert len(client._buckets) <= 10
+    assert len(client._routes) <= 10
+
+
+def test_buckets_in_their_window_are_kept():
+    headers = {"X-RateLimit-Limit": "1", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "60"}
+
+    async def scenario(client):
+        client.max_buckets = 2
+        for i in range(5):
+            await client.request("GET", f"/guilds/{i}", authorization="Bot t")
+        return client
+
+    client = run(lambda request: httpx.Response(200, json={}, headers=headers), scenario)
+    # Dropping them would let the next request through before the reset
+    assert len(client._buckets) == 5
+    assert all(bucket.remaining == 0 for bucket in client._buckets.values())
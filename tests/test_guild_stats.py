@@ -0,0 +1,142 @@
+import asyncio
+import random
+import threading
+
+from guild_stats import ACCURACY, ALPHA, PERCENTILES, GuildStats, LogHistogram
+
+
+def seed(engine):
+    rng = random.Random(7)
+    engine.datasets["economy"]["1"] = {
+        str(100 + i): {"wallet": rng.randrange(-50, 5000), "bank": rng.randrange(0, 10 ** 6), "inventory": []}
+        for i in range(500)
+    }
+    engine.save("economy", "1")
+    engine.datasets["levels"]["1"] = {
+        str(100 + i): {"xp": rng.randrange(100), "level": rng.randrange(30), "totalXp": rng.randrange(10 ** 5)}
+        for i in range(500)
+    }
+    engine.save("levels", "1")
+
+
+def test_columnar_guilds_give_the_same_stats(open_engine, monkeypatch):
+    dicts = open_engine("json")
+    seed(dicts)
+    columns = open_engine("json", columnar=True)
+    for engine in (dicts, columns):
+        del engine.datasets["economy"]["1"]["100"]
+    expected = {name: GuildStats(dicts).get(name, "1").to_dict() for name in GuildStats.KINDS}
+
+    # Read column by column, not member by member
+    monkeypatch.setattr(columns, "member_chunks", None)
+    stats = GuildStats(columns)
+    assert {name: stats.get(name, "1").to_dict() for name in GuildStats.KINDS} == expected
+
+
+def exact_gini(values):
+    values = sorted(values)
+    n, total = len(values), sum(values)
+    return sum((2 * i - n + 1) * value for i, value in enumerate(values)) / (n * total)
+
+
+def test_histogram_accuracy_bounds():
+    rng = random.Random(3)
+    values = [int(rng.paretovariate(1.2) * 100) for _ in range(20000)] + [0] * 500
+    histogram = LogHistogram()
+    for value in values:
+        histogram.add(value)
+    ordered = sorted(values)
+    for p in PERCENTILES:
+        exact = ordered[int(p / 100 * (len(ordered) - 1))]
+        assert abs(histogram.quantile(p / 100) - exact) <= ALPHA * exact + 1
+    gini = histogram.gini()
+    assert exact_gini(values) - ACCURACY["giniMaxUnderestimate"] <= gini <= exact_gini(values) + 1e-12
+    for value in values[:10000]:
+        histogram.remove(value)
+    assert histogram.count == len(values) - 10000
+    assert histogram.total == sum(values[10000:])
+
+
+def test_incremental_updates_match_a_rebuild(open_engine):
+    engine = open_engine("json")
+    seed(engine)
+    stats = GuildStats(engine)
+    engine.subscribe(stats.on_change)
+    stats.get("economy", "1")
+    stats.get("levels", "1")
+
+    members = engine.datasets["economy"]["1"]
+    members["100"] = {"wallet": 10 ** 9, "bank": 0}
+    members["999"] = {"wallet": 1, "bank": 1}
+    del members["101"]
+    engine.save("economy", "1", ["100", "999", "101"])
+    engine.datasets["levels"]["1"]["100"] = {"xp": 0, "level": 99, "totalXp": 10 ** 7}
+    engine.save("levels", "1", ["100"])
+
+    assert stats.stats["builds"] == 2
+    assert stats.stats["updates"] == 2
+    rebuilt = GuildStats(engine)
+    for name in GuildStats.KINDS:
+        assert stats.get(name, "1").to_dict() == rebuilt.get(name, "1").to_dict()
+
+    # A whole-guild save cannot be applied member by member
+    engine.save("economy", "1")
+    assert ("economy", "1") not in stats._guilds
+
+
+def test_stats_endpoint(load_server):
+    server, client = load_server()
+    server.storage.datasets["economy"]["1"] = {"10": {"wallet": 5, "bank": 10}, "11": {"wallet": 0, "bank": 0}}
+    server.storage.save("economy", "1")
+    server.storage.datasets["levels"]["1"] = {"10": {"xp": 0, "level": 2, "totalXp": 300}}
+    server.storage.save("levels", "1")
+
+    stats = client.get("/api/guild/1/stats").json()
+    assert stats["economy"]["members"] == 2
+    assert stats["economy"]["total"] == 15
+    assert stats["economy"]["average"] == 7.5
+    assert stats["levels"]["levelDistribution"] == [{"level": 2, "members": 1}]
+    assert stats["accuracy"] == ACCURACY
+
+    client.post("/api/ingest/events", json={"events": [{"guild_id": "1", "user_id": "12", "wallet_delta": 5}]})
+    assert client.get("/api/guild/1/stats").json()["economy"]["total"] == 20
+
+
+def test_database_scan_runs_on_a_thread_and_keeps_saves_made_meanwhile(open_engine):
+    engine = open_engine("sqlite", writer=True)
+    seed(engine)
+    engine.flush()
+    stats = GuildStats(engine)
+    engine.subscribe(stats.on_change)
+    scan_started, saved = threading.Event(), threading.Event()
+    stored_chunks = engine.stored_chunks
+
+    def gated_chunks(*args, **kwargs):
+        chunks = stored_chunks(*args, **kwargs)
+
+        def scan():
+            scan_started.set()
+            saved.wait(5)
+            yield from chunks
+        return scan()
+
+    engine.stored_chunks = gated_chunks
+
+    async def scenario():
+        load = asyncio.create_task(stats.load("economy", "1"))
+        while not scan_started.is_set():
+            await asyncio.sleep(0.001)
+        # On the loop while the scan waits: not in the rows it reads
+        members = engine.datasets["economy"]["1"]
+        members["100"] = {"wallet": 123456, "bank": 0, "inventory": []}
+        members["900"] = {"wallet": 1, "bank": 2, "inventory": []}
+        del members["101"]
+        engine.save("economy", "1", ["100", "900", "101"])
+        saved.set()
+        await load
+
+    asyncio.run(scenario())
+    engine.stored_chunks = stored_chunks
+    assert stats.stats["builds"] == 1
+    engine.flush()
+    assert stats.get("economy", "1").to_dict() == GuildStats(engine).get("economy", "1").to_dict()
@@ -0,0 +1,41 @@
+import pytest
+
+from http_cache import etag_matches
+
+
+def test_etag_matches_weakly():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches("", '"a"')
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_guild_etag_changes_with_its_settings(load_server, kind):
+    _, client = load_server(STORAGE_ENGINE=kind)
+    response = client.get("/api/guild/1")
+    etag = response.headers["ETag"]
+    assert client.get("/api/guild/1", headers={"If-None-Match": etag}).status_code == 304
+    # Another guild's settings do not change this guild's response
+    client.post("/api/guild/2/welcomer", json={"message": "hi"})
+    assert client.get("/api/guild/1", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/guild/1/welcomer", json={"message": "hi"})
+    response = client.get("/api/guild/1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["settings"]["welcome"]["message"] == "hi"
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_leaderboard_etag_changes_after_an_ingest(load_server, kind):
+    _, client = load_server(STORAGE_ENGINE=kind)
+    url = "/api/guild/1/economy/leaderboard"
+    etag = client.get(url).headers["ETag"]
+    client.post("/api/ingest/events", json={"events": [{"guild_id": "1", "user_id": "7", "wallet_delta": 5}]})
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["leaderboard"] == [{"userId": "7", "total": 5, "wallet": 5, "bank": 0}]
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
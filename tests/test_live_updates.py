@@ -0,0 +1,86 @@
+import json
+import asyncio
+
+from live_updates import LiveHub
+
+
+def events(chunks):
+    """(event, data) of each SSE message"""
+    parsed = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n"))
+        parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+async def subscribe(hub, guild_id):
+    stream = hub.stream(guild_id)
+    assert events([await stream.__anext__()]) == [("ready", {"guildId": guild_id})]
+    return stream
+
+
+async def receive(stream, count):
+    return events([await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)])
+
+
+def test_events_reach_the_guild_subscribers_only():
+    async def main():
+        hub = LiveHub()
+        hub.start()
+        first, second, other = [await subscribe(hub, guild_id) for guild_id in ("1", "1", "2")]
+        hub.publish("1", "settings", {"section": "welcome"})
+        hub.publish(None, "reload", {"dataset": "log"})
+        assert await receive(first, 2) == await receive(second, 2) == [
+            ("settings", {"section": "welcome"}), ("reload", {"dataset": "log"}),
+        ]
+        assert await receive(other, 1) == [("reload", {"dataset": "log"})]
+        assert hub.subscribers == 3
+        await first.aclose()
+        assert hub.subscribers == 2
+
+    asyncio.run(main())
+
+
+def test_a_lagging_subscriber_is_asked_to_resync():
+    async def main():
+        hub = LiveHub(queue_size=2)
+        hub.start()
+        stream = await subscribe(hub, "1")
+        for n in range(5):
+            hub.publish("1", "settings", {"n": n})
+        assert await receive(stream, 1) == [("resync", {"guildId": "1"})]
+        hub.publish("1", "settings", {"n": 5})
+        assert await receive(stream, 1) == [("settings", {"n": 5})]
+        assert hub.stats["resyncs"] == 2
+
+    asyncio.run(main())
+
+
+def test_member_saves_are_published_with_their_rank(load_server):
+    server, _ = load_server()
+
+    async def main():
+        server.live = LiveHub()
+        server.live.start()
+        stream = await subscribe(server.live, "1")
+        server.storage.datasets["economy"]["1"] = {"10": {"wallet": 5, "bank": 0}, "11": {"wallet": 9, "bank": 0}}
+        server.storage.save("economy", "1", ["10", "11"])
+        members = dict(server.storage.datasets["economy"]["1"])
+        del members["11"]
+        server.storage.datasets["economy"]["1"] = members
+        server.storage.save("economy", "1", ["11"])
+        received = await receive(stream, 2)
+        received[0][1]["members"].sort(key=lambda entry: entry["userId"])
+        return received
+
+    assert asyncio.run(main()) == [
+        ("economy", {
+            "guildId": "1",
+            "members": [
+                {"userId": "10", "total": 5, "wallet": 5, "bank": 0, "rank": 2},
+                {"userId": "11", "total": 9, "wallet": 9, "bank": 0, "rank": 1},
+            ],
+            "removed": [],
+        }),
+        ("economy", {"guildId": "1", "members": [], "removed": ["11"]}),
+    ]
@@ -0,0 +1,34 @@
+def families(text):
+    """name -> (type, {series: value}) of a Prometheus text exposition"""
+    parsed = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            parsed[name] = (kind, {})
+        elif line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            name = series.split("{", 1)[0]
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name not in parsed and name.endswith(suffix):
+                    name = name[:-len(suffix)]
+            parsed[name][1][series] = float(value)
+    return parsed
+
+
+def test_metrics_families_have_one_type(load_server):
+    _, client = load_server(RELOAD_INTERVAL=60)
+    client.post("/api/cooldowns/acquire", json={"key": "work:1", "ttl": 60})
+    client.post("/api/guild/1/welcomer", json={"message": "hi"})
+    client.get("/api/guild/1/economy/leaderboard")
+    metrics = families(client.get("/api/metrics").text)
+
+    for name, (kind, _) in metrics.items():
+        assert kind in ("counter", "gauge", "histogram")
+        assert (kind == "counter") == name.endswith("_total"), name
+    assert metrics["toothless_cooldowns_active"] == ("gauge", {"toothless_cooldowns_active": 1})
+    assert metrics["toothless_cooldowns_total"][1]['toothless_cooldowns_total{stat="acquired"}'] == 1
+    assert metrics["toothless_storage_writes_total"][0] == "counter"
+    assert 'toothless_storage{stat="pendingWrites"}' in metrics["toothless_storage"][1]
+    assert metrics["toothless_reloader_total"][1]['toothless_reloader_total{stat="reloads"}'] == 0
+    requests = metrics["toothless_http_request_duration_seconds"][1]
+    assert any('route="/api/guild/{guild_id}/welcomer"' in series for series in requests)
@@ -0,0 +1,86 @@
+import os
+import json
+
+from storage import DatasetReloader, plain
+
+
+def contents(engine, name):
+    return {guild_id: plain(value) for guild_id, value in engine.datasets[name].items()}
+
+
+def test_reload_picks_up_an_external_write(open_engine):
+    engine = open_engine("json")
+    reloader = DatasetReloader(engine, ["welcome"])
+    engine.path("welcome").write_text(json.dumps({"1": {"enabled": True}}))
+    reloader.apply(reloader.poll())
+    assert contents(engine, "welcome") == {"1": {"enabled": True}}
+    assert reloader.poll() == {}
+
+
+def test_reload_keeps_saves_made_while_parsing(open_engine):
+    engine = open_engine("json", writer=True)
+    engine.datasets["welcome"]["2"] = {"enabled": False}
+    engine.save("welcome", "2")
+    engine.writer.flush()
+    reloader = DatasetReloader(engine, ["welcome"])
+    # The bot adds guild 1 while this worker sets up guild 3 mid-reload
+    engine.path("welcome").write_text(json.dumps({"1": {"enabled": True}, "2": {"enabled": False}}))
+    changed = reloader.poll()
+    engine.datasets["welcome"]["3"] = {"enabled": True, "message": "hi"}
+    engine.save("welcome", "3")
+    del engine.datasets["welcome"]["2"]
+    engine.save("welcome", "2")
+    reloader.apply(changed)
+
+    expected = {"1": {"enabled": True}, "3": {"enabled": True, "message": "hi"}}
+    assert contents(engine, "welcome") == expected
+    engine.close()
+    assert contents(open_engine("json"), "welcome") == expected
+
+
+def test_reload_is_skipped_when_the_whole_dataset_was_saved(open_engine):
+    engine = open_engine("json", writer=True)
+    reloader = DatasetReloader(engine, ["welcome"])
+    engine.path("welcome").write_text(json.dumps({"1": {"enabled": True}}))
+    changed = reloader.poll()
+    engine.datasets["welcome"]["2"] = {"enabled": True}
+    engine.save("welcome")
+    reloader.apply(changed)
+    assert contents(engine, "welcome") == {"2": {"enabled": True}}
+
+
+def test_shared_workers_keep_each_others_members(open_engine):
+    first, second = open_engine("json", shared=True), open_engine("json", shared=True)
+    first.datasets["economy"]["1"] = {"10": {"wallet": 5, "bank": 0}}
+    first.save("economy", "1", ["10"])
+    # The second worker has not reloaded: its guild 1 predates the first's save
+    second.datasets["economy"]["1"] = {"11": {"wallet": 7, "bank": 0}}
+    second.save("economy", "1", ["11"])
+    first.datasets["economy"]["1"] = {}
+    first.save("economy", "1", ["10"])
+    first.datasets["welcome"]["2"] = {"enabled": True}
+    first.save("welcome", "2")
+    second.datasets["welcome"]["3"] = {"enabled": False}
+    second.save("welcome", "3")
+
+    reopened = open_engine("json")
+    assert contents(reopened, "economy") == {"1": {"11": {"wallet": 7, "bank": 0}}}
+    assert contents(reopened, "welcome") == {"2": {"enabled": True}, "3": {"enabled": False}}
+    reloader = DatasetReloader(first, ["economy"])
+    reloader.apply(reloader.poll())
+    assert contents(first, "economy") == {"1": {"11": {"wallet": 7, "bank": 0}}}
+
+
+def test_reload_sees_a_file_replaced_with_the_same_size_and_mtime(open_engine):
+    engine = open_engine("json")
+    reloader = DatasetReloader(engine, ["welcome"])
+    path = engine.path("welcome")
+    path.write_text(json.dumps({"1": {"enabled": True}}))
+    reloader.apply(reloader.poll())
+    mtime = path.stat().st_mtime_ns
+    replacement = path.with_name("welcome.json.new")
+    replacement.write_text(json.dumps({"2": {"enabled": True}}))
+    os.utime(replacement, ns=(mtime, mtime))
+    os.replace(replacement, path)
+    reloader.apply(reloader.poll())
+    assert contents(engine, "welcome") == {"2": {"enabled": True}}
@@ -0,0 +1,120 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from snapshots import SnapshotManager, load_snapshot
+from storage import plain
+
+ENGINES = ["json", "log", "sqlite", "sharded"]
+
+
+def member(wallet):
+    return {"wallet": wallet, "bank": 0, "inventory": []}
+
+
+def ingest(client, guild_id, user_id, wallet_delta):
+    event = {"guild_id": guild_id, "user_id": user_id, "wallet_delta": wallet_delta}
+    assert client.post("/api/ingest/events", json={"events": [event]}).status_code == 200
+
+
+def wallet(client, guild_id, user_id):
+    response = client.get(f"/api/guild/{guild_id}/economy/rank/{user_id}")
+    return response.json()["entry"]["wallet"] if response.status_code == 200 else None
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_capture_holds_the_state_when_the_copy_settles(open_engine, columnar):
+    engine = open_engine("json", columnar=columnar)
+    economy = engine.datasets["economy"]
+    for guild_id in "123":
+        economy[guild_id] = {"10": member(1), "11": member(2)}
+    engine.save_many("economy", ["1", "2", "3"])
+
+    async def scenario():
+        dump = engine.capture()
+        # Saved after the guild tables were taken, before the copy settles
+        economy["1"]["10"] = member(5)
+        engine.save("economy", "1", ["10"])
+        del economy["2"]
+        engine.save("economy", "2")
+        economy["4"] = {"12": member(7)}
+        engine.save("economy", "4")
+        data = await asyncio.to_thread(dump)
+        # Later changes are not in it
+        economy["3"]["11"] = member(9)
+        engine.save("economy", "3", ["11"])
+        return data
+
+    data = asyncio.run(scenario())
+    assert data["economy"] == {
+        "1": {"10": member(5), "11": member(2)},
+        "3": {"10": member(1), "11": member(2)},
+        "4": {"12": member(7)},
+    }
+    assert engine.listeners == []
+    assert plain(engine.datasets["economy"]["3"])["11"] == member(9)
+
+
+def test_capture_follows_a_whole_dataset_replacement(open_engine):
+    engine = open_engine("json")
+    engine.datasets["welcome"]["1"] = {"enabled": True}
+    engine.save("welcome", "1")
+
+    async def scenario():
+        dump = engine.capture()
+        engine.datasets["welcome"] = {"2": {"enabled": False}}
+        engine.notify("welcome")
+        return await asyncio.to_thread(dump)
+
+    assert asyncio.run(scenario())["welcome"] == {"2": {"enabled": False}}
+
+
+def test_periodic_snapshots_survive_a_failed_one(tmp_path, caplog):
+    manager = SnapshotManager(None, tmp_path)
+    calls = []
+
+    async def scenario():
+        stop = asyncio.Event()
+
+        async def take():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise ValueError("not a file system error")
+            stop.set()
+
+        manager.take = take
+        await asyncio.wait_for(manager.run(0.01, stop), 5)
+
+    asyncio.run(scenario())
+    assert calls == [0, 1]
+    assert "Snapshot failed" in caplog.text
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_server_starts_from_a_snapshot(load_server, kind):
+    server, client = load_server(STORAGE_ENGINE=kind)
+    ingest(client, "1", "7", 10)
+    ingest(client, "1", "8", 3)
+    server.flush_storage()
+    info = client.post("/api/snapshots").json()
+    snapshot = Path(server.SNAPSHOT_PATH) / info["file"]
+    assert load_snapshot(snapshot, ["economy"])["economy"]["1"]["7"]["wallet"] == 10
+    # Changes after the snapshot: undone by the restore
+    ingest(client, "1", "7", 5)
+    ingest(client, "2", "9", 1)
+    server.flush_storage()
+
+    restored, client = load_server(STORAGE_ENGINE=kind, SNAPSHOT_RESTORE=snapshot)
+    assert (wallet(client, "1", "7"), wallet(client, "1", "8"), wallet(client, "2", "9")) == (10, 3, None)
+    restored.flush_storage()
+
+    _, client = load_server(STORAGE_ENGINE=kind, SNAPSHOT_RESTORE="")
+    assert (wallet(client, "1", "7"), wallet(client, "1", "8"), wallet(client, "2", "9")) == (10, 3, None)
+    ingest(client, "1", "7", 1)
+    assert wallet(client, "1", "7") == 11
+
+
+def test_snapshot_restore_needs_a_single_worker(load_server, tmp_path):
+    with pytest.raises(ValueError):
+        load_server(STORAGE_SHARED=1, SNAPSHOT_RESTORE=tmp_path / "snapshot.zip")
@@ -0,0 +1,323 @@
+import threading
+
+import pytest
+
+import codec
+
+from storage import AppendLogEngine, plain
+
+ENGINES = ["json", "log", "sqlite", "sharded"]
+
+
+def member(wallet, bank=0):
+    return {"wallet": wallet, "bank": bank, "inventory": []}
+
+
+def contents(engine, name):
+    return {guild_id: plain(value) for guild_id, value in engine.datasets[name].items()}
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+@pytest.mark.parametrize("writer", [False, True])
+def test_saves_survive_a_restart(open_engine, kind, writer):
+    engine = open_engine(kind, writer=writer)
+    engine.datasets["welcome"]["1"] = {"enabled": True, "message": "hi"}
+    engine.save("welcome", "1")
+    engine.datasets["welcome"]["2"] = {"enabled": False}
+    engine.save("welcome", "2")
+    engine.datasets["economy"]["1"] = {"10": member(5), "11": member(7, 3)}
+    engine.save("economy", "1")
+    del engine.datasets["welcome"]["2"]
+    engine.save("welcome", "2")
+    engine.close()
+
+    reopened = open_engine(kind)
+    assert contents(reopened, "welcome") == {"1": {"enabled": True, "message": "hi"}}
+    assert contents(reopened, "economy") == {"1": {"10": member(5), "11": member(7, 3)}}
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_save_many_writes_every_guild(open_engine, kind):
+    engine = open_engine(kind, writer=True)
+    for guild_id in map(str, range(20)):
+        engine.datasets["log"][guild_id] = {"enabled": True, "channelId": guild_id}
+    engine.save_many("log", [str(i) for i in range(20)])
+    engine.close()
+    assert contents(open_engine(kind), "log") == {str(i): {"enabled": True, "channelId": str(i)} for i in range(20)}
+
+
+def test_log_compaction_keeps_every_guild(open_engine, tmp_path):
+    engine = open_engine("log", compact_bytes=1)
+    for i in range(50):
+        engine.datasets["tickets"][str(i % 7)] = {"enabled": True, "n": i}
+        engine.save("tickets", str(i % 7))
+    engine.close()
+    assert not (tmp_path / "tickets.log.compacting").exists()
+    assert contents(open_engine("log"), "tickets") == {str(i % 7): {"enabled": True, "n": i} for i in range(50)}
+
+
+def test_log_rotated_by_a_crashed_compaction_is_kept(open_engine, tmp_path):
+    engine = open_engine("log")
+    engine.datasets["welcome"]["1"] = {"enabled": True}
+    engine.save("welcome", "1")
+    engine.close()
+    # Crash right after the rotation: records only in the rotated log
+    (tmp_path / "welcome.log").rename(tmp_path / "welcome.log.compacting")
+
+    reopened = open_engine("log")
+    assert contents(reopened, "welcome") == {"1": {"enabled": True}}
+    assert not (tmp_path / "welcome.log.compacting").exists()
+    reopened.datasets["welcome"]["2"] = {"enabled": False}
+    reopened.save("welcome", "2")
+    reopened.compact("welcome")
+    reopened.close()
+    assert contents(open_engine("log"), "welcome") == {"1": {"enabled": True}, "2": {"enabled": False}}
+
+
+def test_log_torn_last_line_is_skipped(open_engine, tmp_path):
+    engine = open_engine("log")
+    engine.datasets["welcome"]["1"] = {"enabled": True}
+    engine.save("welcome", "1")
+    engine.close()
+    with open(tmp_path / "welcome.log", "a") as f:
+        f.write('{"g": "2", "v": {"ena')
+    assert isinstance(open_engine("log"), AppendLogEngine)
+    assert contents(open_engine("log"), "welcome") == {"1": {"enabled": True}}
+
+
+def test_log_appends_only_the_changed_members(open_engine, tmp_path):
+    engine = open_engine("log")
+    engine.datasets["economy"]["1"] = {"10": member(5), "11": member(7), "12": member(9)}
+    engine.save("economy", "1")
+    members = engine.datasets["economy"]["1"]
+    members["11"] = member(8)
+    del members["12"]
+    engine.save("economy", "1", ["11", "12"])
+    engine.close()
+    last = codec.loads_json((tmp_path / "economy.log").read_bytes().splitlines()[-1])
+    assert last == {"g": "1", "m": {"11": member(8), "12": None}}
+    assert contents(open_engine("log"), "economy") == {"1": {"10": member(5), "11": member(8)}}
+
+
+def seed_economy(engine, guild_id="1"):
+    engine.datasets["economy"][guild_id] = {
+        "10": member(5), "11": member(50), "12": member(20, 30), "13": member(1),
+    }
+    engine.save("economy", guild_id)
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+@pytest.mark.parametrize("flushed", [False, True])
+def test_leaderboard_follows_saves(open_engine, kind, flushed):
+    engine = open_engine(kind, writer=True)
+    seed_economy(engine)
+    if flushed:
+        engine.flush()
+    assert [uid for uid, _ in engine.top("economy", "1", 3)] == ["11", "12", "10"]
+
+    # A member update, before and after the writer stored it
+    members = engine.datasets["economy"]["1"]
+    members["13"] = member(100)
+    engine.save("economy", "1", ["13"])
+    top = engine.top("economy", "1", 2)
+    assert top == [("13", member(100)), ("11", member(50))]
+    engine.flush()
+    assert engine.top("economy", "1", 2) == top
+    assert [uid for uid, _ in engine.top("economy", "1", 2, offset=2)] == ["12", "10"]
+    ranked = [uid for chunk in engine.member_chunks("economy", "1", size=3) for uid, _ in chunk]
+    assert ranked == ["13", "11", "12", "10"]
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_member_chunks_page_through_ties(open_engine, kind):
+    engine = open_engine(kind)
+    # Runs of equal totals across the chunk boundaries
+    members = {str(100 + i): member(i // 4 * 10) for i in range(23)}
+    engine.datasets["economy"]["1"] = members
+    engine.save("economy", "1")
+    ranked = [uid for chunk in engine.member_chunks("economy", "1", size=3) for uid, _ in chunk]
+    assert ranked == [uid for uid, _ in engine.top("economy", "1", 100)]
+    assert ranked == sorted(members, key=lambda uid: (-members[uid]["wallet"], uid))
+    unranked = [uid for chunk in engine.member_chunks("economy", "1", ranked=False, size=3) for uid, _ in chunk]
+    assert unranked == list(members)
+
+
+def test_sqlite_member_chunks_seek_the_indexes(open_engine):
+    engine = open_engine("sqlite")
+    seed_economy(engine)
+    queries = []
+    engine.connection().set_trace_callback(queries.append)
+    for ranked in (True, False):
+        list(engine.member_chunks("economy", "1", ranked=ranked, size=1))
+    engine.connection().set_trace_callback(None)
+    selects = {query for query in queries if query.startswith("SELECT")}
+    assert selects
+    for query in selects:
+        plan = " ".join(row[3] for row in engine.connection().execute(f"EXPLAIN QUERY PLAN {query}"))
+        assert "INDEX economy_guild" in plan and "TEMP B-TREE" not in plan, (query, plan)
+
+
+@pytest.mark.parametrize("kind", ENGINES)
+def test_leaderboard_after_restart(open_engine, kind):
+    engine = open_engine(kind, writer=True)
+    seed_economy(engine)
+    engine.close()
+    reopened = open_engine(kind)
+    assert [uid for uid, _ in reopened.top("economy", "1", 10)] == ["11", "12", "10", "13"]
+    assert reopened.top("economy", "404", 10) == []
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "sharded"])
+@pytest.mark.parametrize("whole", [False, True])
+def test_lazy_engines_keep_guilds_evicted_before_the_save(open_engine, kind, whole):
+    engine = open_engine(kind, writer=True, cache_guilds=2)
+    engine.datasets["welcome"]["0"] = {"enabled": False}
+    engine.save("welcome", "0")
+    engine.flush()
+    expected = {str(i): {"enabled": True, "n": i} for i in range(10)}
+    for guild_id, value in expected.items():
+        engine.datasets["welcome"][guild_id] = value
+    if whole:
+        engine.save("welcome")
+    else:
+        engine.save_many("welcome", list(expected))
+    assert contents(engine, "welcome") == expected
+    engine.close()
+    assert contents(open_engine(kind), "welcome") == expected
+
+
+class RacingDict(dict):
+    """Runs `racer` on another thread right before the next deletion (waits up to 0.2 s for it)"""
+
+    racer = None
+    thread = None
+
+    def __delitem__(self, key):
+        racer, self.racer = self.racer, None
+        if racer is not None:
+            self.thread = threading.Thread(target=racer)
+            self.thread.start()
+            self.thread.join(0.2)
+        super().__delitem__(key)
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "sharded"])
+def test_lazy_engines_keep_a_save_staged_during_the_write(open_engine, kind):
+    engine = open_engine(kind, writer=True, cache_guilds=1)
+    data = engine.datasets["welcome"]
+    data.staged = RacingDict()
+    data["1"] = {"enabled": True, "n": 1}
+    engine.save("welcome", "1")
+
+    def save_again():
+        data["1"] = {"enabled": True, "n": 2}
+        engine.save("welcome", "1")
+
+    unstage = data.unstage
+
+    def racing_unstage(guild_id, seq):
+        # The event loop saves the guild again as the writer unstages it
+        data.staged.racer = save_again
+        unstage(guild_id, seq)
+
+    data.unstage = racing_unstage
+    engine.flush()
+    data.unstage = unstage
+    data.staged.thread.join()
+    # Evicted: read back from what was stored or is still staged
+    data["2"] = {"enabled": False}
+    assert data["1"] == {"enabled": True, "n": 2}
+    engine.close()
+    assert contents(open_engine(kind), "welcome")["1"] == {"enabled": True, "n": 2}
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "sharded"])
+def test_lazy_engines_iterate_without_reading_the_guilds(open_engine, kind):
+    engine = open_engine(kind, cache_guilds=2)
+    data = engine.datasets["log"]
+    for guild_id in map(str, range(5)):
+        data[guild_id] = {"enabled": True, "channelId": guild_id}
+        engine.save("log", guild_id)
+    engine.flush()
+    data.cache.clear()
+    assert data["1"]["channelId"] == "1"
+    # Deleted and added on top of what is stored, not written yet
+    del data["2"]
+    engine.save("log", "2")
+    data["7"] = {"enabled": False}
+    engine.save("log", "7")
+    cached = list(data.cache)
+
+    reads = []
+    read = engine.read
+    engine.read = lambda name, guild_id: reads.append(guild_id) or read(name, guild_id)
+    assert sorted(data) == ["0", "1", "3", "4", "7"]
+    assert len(data) == 5
+    assert reads == []
+    assert list(data.cache) == cached
+
+
+def test_sharded_engine_reads_guilds_lazily(open_engine, tmp_path):
+    engine = open_engine("sharded", cache_guilds=2)
+    for guild_id in map(str, range(5)):
+        engine.datasets["log"][guild_id] = {"enabled": True, "channelId": guild_id}
+        engine.save("log", guild_id)
+    engine.close()
+
+    reopened = open_engine("sharded", cache_guilds=2)
+    assert not reopened.datasets["log"].cache
+    assert reopened.datasets["log"]["3"] == {"enabled": True, "channelId": "3"}
+    assert list(reopened.datasets["log"].cache) == ["3"]
+    assert sorted(reopened.datasets["log"]) == ["0", "1", "2", "3", "4"]
+    assert list(reopened.datasets["log"].cache) == ["3"]
+
+
+def test_sharded_guild_ids_stay_inside_the_data_path(open_engine, tmp_path):
+    engine = open_engine("sharded")
+    for guild_id in ("../escape", ".", "a/b"):
+        engine.datasets["welcome"][guild_id] = {"enabled": True}
+        engine.save("welcome", guild_id)
+    assert not (tmp_path / "escape").exists()
+    assert all(path.parent.parent == tmp_path / "guilds" for path in (tmp_path / "guilds").glob("*/welcome.json"))
+    engine.close()
+    assert sorted(contents(open_engine("sharded"), "welcome")) == [".", "../escape", "a/b"]
+
+
+def test_migrate_json_to_sqlite(open_engine, tmp_path):
+    from storage import DATASETS, migrate_json_to_sqlite
+
+    engine = open_engine("json")
+    seed_economy(engine)
+    engine.datasets["economy"]["2"] = {
+        "10": {"wallet": 7, "bank": 1, "inventory": ["sword", {"id": 3}], "title": "dragon"},
+        "abc": {"wallet": 1, "bank": 0},
+    }
+    engine.datasets["levels"]["1"] = {
+        "10": {"xp": 10, "level": 1, "totalXp": 110, "lastMessage": 1.7e9},
+        "11": {"xp": 0, "level": 0, "totalXp": 0},
+    }
+    engine.datasets["welcome"]["1"] = {"enabled": True, "channelId": "5", "message": "Hi {user}"}
+    engine.datasets["log"]["2"] = {"enabled": False}
+    engine.datasets["tickets"]["1"] = {"categoryId": "9", "open": {"20": "30"}}
+    engine.datasets["levelSettings"]["1"] = {"multiplier": 1.5, "roles": {"5": "77"}}
+    engine.save_many("economy", ["1", "2"])
+    for name in DATASETS:
+        engine.save(name)
+    expected = {name: contents(engine, name) for name in DATASETS}
+    engine.close()
+
+    assert migrate_json_to_sqlite(tmp_path) == {name: len(data) for name, data in expected.items()}
+    migrated = open_engine("sqlite")
+    assert {name: contents(migrated, name) for name in DATASETS} == expected
+    assert [uid for uid, _ in migrated.top("economy", "2", 10)] == ["10", "abc"]
+
+
+def test_migrate_json_to_sharded(open_engine, tmp_path):
+    from storage import migrate_json_to_sharded
+
+    engine = open_engine("json")
+    seed_economy(engine)
+    expected = contents(engine, "economy")
+    engine.close()
+    assert migrate_json_to_sharded(tmp_path)["economy"] == len(expected)
+    assert contents(open_engine("sharded"), "economy") == expected